@@ -1,8 +1,21 @@
+import os
+
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
+from plotly.subplots import make_subplots
+
+from veridi_auditor.attribution import category_weights_path
+from veridi_auditor.engine import MIN_CITY_ORDERS, TOP_N, AuditEngine
+from veridi_auditor.figcache import FigureCache
+from veridi_auditor.figures import build_figure, figure_key, get_premium_layout
+from veridi_auditor.profiling import HISTORY, PROFILER
+from veridi_auditor.sketch import Summaries, summaries_path
+from veridi_auditor.sql import SQLEngine
+from veridi_auditor.storage import MASTER_COLUMNAR, MASTER_CSV
+from veridi_auditor.stream import EVENTS_JSONL, RETAIN, StreamMonitor
+from veridi_auditor.warmup import Warmer, default_filters
 
 # Page configuration
 st.set_page_config(
@@ -181,95 +194,196 @@ def render_kpi(title, value, col_obj, subtitle=None, positive=False):
     """
     col_obj.markdown(html, unsafe_allow_html=True)
 
-# Shared Plotly Layout Template
-def get_premium_layout(title=""):
-    return dict(
-        title=dict(text=title, font=dict(family="Outfit", size=20, color="#f8fafc")),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="Outfit", color="#cbd5e1"),
-        hoverlabel=dict(bgcolor="rgba(15, 23, 42, 0.9)", font=dict(family="Outfit", color="white"), bordercolor="rgba(255,255,255,0.2)"),
-        margin=dict(l=20, r=20, t=50, b=20),
-        xaxis=dict(gridcolor="rgba(255,255,255,0.05)", zerolinecolor="rgba(255,255,255,0.1)"),
-        yaxis=dict(gridcolor="rgba(255,255,255,0.05)", zerolinecolor="rgba(255,255,255,0.1)")
-    )
-
-# Premium Color Palettes
-COLORS = {
-    'primary': '#38bdf8',
-    'secondary': '#818cf8',
-    'accent': '#c084fc',
-    'success': '#34d399',
-    'warning': '#fbbf24',
-    'danger': '#f43f5e',
-    'status': {'On Time': '#34d399', 'Late': '#fbbf24', 'Super Late': '#f43f5e'}
-}
+# Built figures kept across reruns and sessions, evicted LRU beyond this size.
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Cities per page of the Geographic tab's drill-down.
+CITY_PAGE_SIZE = 15
+
+# How often the Trends tab's live feed re-reads the rolling windows.
+LIVE_REFRESH_SECONDS = 10
+
+# Default files the Performance panel exports metrics to.
+METRICS_FILES = {"Prometheus": "veridi_metrics.prom", "JSON": "veridi_metrics.json"}
 
+# Where filters and group-bys run: "memory" (the in-process aggregate cube) or
+# an embedded SQL database scanning the master file, "duckdb" or "sqlite".
+QUERY_BACKEND = os.environ.get("VERIDI_BACKEND", "memory")
+
+# Background warm-up of the figure cache after each start or data refresh
+# (see veridi_auditor.warmup); VERIDI_WARMUP=0 turns it off.
+WARMUP = os.environ.get("VERIDI_WARMUP", "1") != "0"
+WARMUP_WORKERS = 1
+WARMUP_TOP_CATEGORIES = 10
+
+# Each rerun is recorded stage by stage (see the Performance panel, opened with ?perf=1).
+# Early stops end it first; a rerun Streamlit interrupts is recorded by the next begin.
+PROFILER.begin('rerun')
+
+def dataset_signature():
+    # Sizes and modification times of the master files and the category weights
+    # exported next to them: rewriting any of them (a data refresh) changes the
+    # signature, and the next rerun loads the new data.
+    paths = (MASTER_COLUMNAR, MASTER_CSV, category_weights_path(MASTER_COLUMNAR))
+    return tuple((path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+                 for path in paths if os.path.exists(path))
 
 # Data Loading
-@st.cache_data
-def load_data():
+@st.cache_resource(max_entries=1)
+def load_engine(signature):
     try:
-        df = pd.read_csv("veridi_master_clean.csv")
-        # Ensure correct data types
-        df['order_purchase_timestamp'] = pd.to_datetime(df['order_purchase_timestamp'])
-        df['order_estimated_delivery_date'] = pd.to_datetime(df['order_estimated_delivery_date'])
-        df['order_delivered_customer_date'] = pd.to_datetime(df['order_delivered_customer_date'])
-        return df
+        # Memory-mapped columnar copy with only the columns the dashboard reads
+        # (converted from the CSV export automatically on first load), compacted
+        # and collapsed once into the aggregate cube and its filter index.
+        # Read-only, so every session shares this one copy; every chart below
+        # sums cube cells for the filters. The SQL backends answer the same
+        # calls with group-by queries and keep the data on disk instead.
+        if QUERY_BACKEND != "memory":
+            return SQLEngine(backend=QUERY_BACKEND)
+        return AuditEngine.load()
     except FileNotFoundError:
         return None
 
-df = load_data()
+@st.cache_resource
+def load_figure_cache():
+    return FigureCache(FIGURE_CACHE_BYTES)
+
+@st.cache_resource
+def load_warmer():
+    # One warm-up worker for the server; it restarts whenever it is shown an
+    # engine with a new dataset version.
+    return Warmer(load_figure_cache(), workers=WARMUP_WORKERS, top_categories=WARMUP_TOP_CATEGORIES)
+
+def summaries_signature():
+    # Names, sizes and modification times of the summary files: rebuilding them
+    # (--export --summaries) changes the signature, and the next rerun loads
+    # them; None when they were not built.
+    path = summaries_path(MASTER_COLUMNAR)
+    if not os.path.isdir(path):
+        return None
+    return tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                        for entry in os.scandir(path)))
+
+@st.cache_resource(max_entries=1)
+def load_summaries(signature):
+    # Sketches for the approximate query mode, built when the master file was
+    # exported.
+    if signature is None:
+        return None
+    return Summaries.load(summaries_path(MASTER_COLUMNAR))
+
+@st.cache_resource
+def start_stream_monitor():
+    # One thread tailing the live event log, shared by every session.
+    return StreamMonitor.tail(EVENTS_JSONL).start()
+
+def load_stream_monitor():
+    # None while no log is being written next to the dataset; checked on every
+    # rerun, so a log created after startup is picked up. A monitor whose
+    # source failed is replaced by a fresh one re-reading the log.
+    if not os.path.exists(EVENTS_JSONL):
+        return None
+    monitor = start_stream_monitor()
+    if not monitor.running:
+        start_stream_monitor.clear()
+        monitor = start_stream_monitor()
+    return monitor
+
+with PROFILER.stage('load_data'):
+    engine = load_engine(dataset_signature())
 
-if df is None:
+if engine is None:
     st.error("⚠️ Dataset not found! Please run `veridi_logistics.ipynb` first to generate `veridi_master_clean.csv`.")
+    PROFILER.end()
     st.stop()
 
+if WARMUP:
+    load_warmer().ensure(engine)
+
 # --- SIDEBAR FILTERS ---
 st.sidebar.markdown("<h2 style='text-align: center; margin-top: 0;'>Veridi Logistics Filters</h2>", unsafe_allow_html=True)
 st.sidebar.markdown("---")
 
+# The initial selection is also the first one the warm-up builds.
+default_selection = default_filters(engine)
+
 # State Filter
-all_states = sorted(df['customer_state'].unique().tolist())
-selected_states = st.sidebar.multiselect("📍 Customer State", options=all_states, default=all_states)
+all_states = engine.options('customer_state')
+selected_states = st.sidebar.multiselect("📍 Customer State", options=all_states, default=default_selection['states'])
 
 # Delivery Status Filter
-all_statuses = sorted(df['delivery_status'].unique().tolist())
-selected_statuses = st.sidebar.multiselect("🚚 Delivery Status", options=all_statuses, default=all_statuses)
+all_statuses = engine.options('delivery_status')
+selected_statuses = st.sidebar.multiselect("🚚 Delivery Status", options=all_statuses,
+                                           default=default_selection['statuses'])
 
 # Category Filter
-df_clean_cats = df.dropna(subset=['product_category_en'])
-all_categories = sorted(df_clean_cats['product_category_en'].unique().tolist())
-selected_categories = st.sidebar.multiselect("📦 Product Category", options=all_categories, default=all_categories[:20])
+all_categories = engine.options('product_category_en')
+selected_categories = st.sidebar.multiselect("📦 Product Category", options=all_categories,
+                                             default=default_selection['categories'])
+
+# Query Mode (only offered when summaries were built)
+summaries_version = summaries_signature()
+summaries = load_summaries(summaries_version)
+approximate = False
+if summaries is not None:
+    query_mode = st.sidebar.radio("🧮 Query Mode", ["Exact", "Approximate"], key="query_mode", horizontal=True,
+                                  help="Approximate answers the delay histogram, state, category and trend views "
+                                       "from pre-built sketches, with error bounds and delay percentiles.")
+    approximate = query_mode == "Approximate"
 
 # Apply filters
-filtered_df = df[
-    (df['customer_state'].isin(selected_states)) &
-    (df['delivery_status'].isin(selected_statuses)) &
-    (df['product_category_en'].isin(selected_categories))
-]
-
-filtered_df['is_late'] = filtered_df['delivery_status'].isin(['Late', 'Super Late']).astype(int)
+audit = engine.select(states=selected_states, statuses=selected_statuses, categories=selected_categories)
+# Grouped views come from the sketches in approximate mode (same columns, plus percentiles).
+grouped = (summaries.select(states=selected_states, statuses=selected_statuses, categories=selected_categories)
+           if approximate else audit)
 
-if filtered_df.empty:
+if audit.empty:
     st.warning("No data matches the selected filters. Please adjust your selection.")
+    PROFILER.end()
     st.stop()
 
+figure_cache = load_figure_cache()
+
+def cached_figure(name, **params):
+    # Same dataset, filters and parameters -> the figure built on an earlier
+    # rerun, or by the warm-up (figures.figure_key).
+    key = figure_key(name, engine.version, selected_states, selected_statuses, selected_categories,
+                     approximate=approximate, summaries_version=summaries_version, **params)
+    def timed_build():
+        with PROFILER.stage(f'figure:{name}'):
+            return build_figure(name, audit, grouped, approximate=approximate, **params)
+    return figure_cache.get(key, timed_build)
+
+def show_chart(name, **params):
+    # st.plotly_chart serializes the figure; timed separately from building it.
+    figure = cached_figure(name, **params)
+    with PROFILER.stage(f'chart:{name}'):
+        st.plotly_chart(figure, use_container_width=True, config={'displayModeBar': False})
+
+# Owned by session state (not the widgets) so Top N and the drill-down survive
+# while their tab is not rendered.
+st.session_state.top_n = st.session_state.get('top_n', TOP_N)
+st.session_state.drill_state = st.session_state.get('drill_state')
+st.session_state.city_min_orders = st.session_state.get('city_min_orders', MIN_CITY_ORDERS)
+st.session_state.city_page = st.session_state.get('city_page', 1)
+
+def reset_city_page():
+    st.session_state.city_page = 1
+
 # --- KPI METRICS ---
 st.title("Last Mile Logistics Auditor")
 st.markdown("<p style='color: #94a3b8; font-size: 1.1rem; margin-bottom: 2rem;'>Monitor delivery performance, geographic delays, and customer sentiment with precision.</p>", unsafe_allow_html=True)
 
 col1, col2, col3, col4, col5 = st.columns(5)
 
-total_orders = len(filtered_df)
-late_orders = len(filtered_df[filtered_df['delivery_status'] == 'Late'])
-super_late_orders = len(filtered_df[filtered_df['delivery_status'] == 'Super Late'])
-pct_late = (late_orders / total_orders) * 100 if total_orders > 0 else 0
-pct_super_late = (super_late_orders / total_orders) * 100 if total_orders > 0 else 0
-avg_review = filtered_df['review_score'].mean()
-
-late_df_only = filtered_df[filtered_df['days_difference'] > 0]
-avg_days_late = late_df_only['days_difference'].mean() if not late_df_only.empty else 0
+with PROFILER.stage('kpis') as stage_stats:
+    kpi = audit.kpis()
+    stage_stats['rows'] = audit.scanned
+total_orders = kpi['total_orders']
+pct_late = kpi['pct_late']
+pct_super_late = kpi['pct_super_late']
+avg_review = kpi['avg_review']
+avg_days_late = kpi['avg_days_late']
 
 render_kpi("Total Volume", f"{total_orders:,}", col1, subtitle="Processed Orders", positive=True)
 render_kpi("Delayed", f"{pct_late:.1f}%", col2, subtitle="1-5 days past ETA")
@@ -281,250 +395,277 @@ render_kpi("Severity", f"{avg_days_late:.1f}", col5, subtitle="Avg Days Late")
 
 
 # --- TABS ---
+# Only the selected tab runs; the others are built when the user opens them.
 tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "📊 Overview", 
     "🗺️ Geographic", 
     "⭐ Sentiment", 
     "🏷️ Categories", 
     "📈 Trends"
-])
+], key="tab", on_change="rerun")
 
 # TAB 1: OVERVIEW
-with tab1:
-    st.header("Overall Delivery Performance")
-    c1, c2 = st.columns(2)
+if tab1.open:
+    with tab1, PROFILER.stage('tab:overview'):
+        st.header("Overall Delivery Performance")
+        c1, c2 = st.columns(2)
     
-    with c1:
-        # Pie chart of delivery status
-        status_counts = filtered_df['delivery_status'].value_counts().reset_index()
-        status_counts.columns = ['Status', 'Count']
-        fig_pie = px.pie(status_counts, values='Count', names='Status', 
-                         color='Status', 
-                         color_discrete_map=COLORS['status'],
-                         hole=0.6,
-                         custom_data=['Status'])
-        fig_pie.update_traces(textposition='inside', textinfo='percent+label', 
-                              hovertemplate="<b>%{label}</b><br>Count: %{value}<br>Share: %{percent}<extra></extra>",
-                              marker=dict(line=dict(color='#0f172a', width=2)))
-        fig_pie.update_layout(**get_premium_layout("Status Distribution"), showlegend=False)
-        # Add center text
-        fig_pie.add_annotation(text=f"{total_orders:,}<br>Orders", x=0.5, y=0.5, showarrow=False, 
-                               font=dict(size=24, color="#f8fafc", family="Outfit"))
-        st.plotly_chart(fig_pie, use_container_width=True, config={'displayModeBar': False})
+        with c1:
+            # Pie chart of delivery status
+            show_chart('status_pie')
         
-    with c2:
-        # Histogram of delay distribution
-        fig_hist = px.histogram(filtered_df, x='days_difference', 
-                                nbins=50, 
-                                range_x=[-20, 20],
-                                color_discrete_sequence=[COLORS['primary']])
-        fig_hist.update_traces(marker=dict(line=dict(color='#0f172a', width=1)), opacity=0.85)
-        fig_hist.add_vline(x=0, line_dash="dash", line_color=COLORS['danger'], line_width=2,
-                           annotation_text="Expected Delivery", annotation_position="top right",
-                           annotation_font=dict(color=COLORS['danger']))
-        layout = get_premium_layout("Delivery Timing Spread")
-        layout['xaxis'].update(title="Days Difference (Positive = Late)")
-        layout['yaxis'].update(title="Order Count")
-        fig_hist.update_layout(**layout)
-        st.plotly_chart(fig_hist, use_container_width=True, config={'displayModeBar': False})
+        with c2:
+            # Histogram of delay distribution
+            show_chart('delay_histogram')
+            if approximate:
+                st.caption("Estimated from stratified samples; bars show 95% intervals.")
         
-    # Bar chart of avg delay per review score
-    st.markdown("<br>", unsafe_allow_html=True)
-    avg_delay_score = filtered_df.groupby('review_score')['days_difference'].mean().reset_index()
-    fig_bar1 = px.bar(avg_delay_score, x='review_score', y='days_difference',
-                      color='review_score', color_continuous_scale="Viridis", text_auto=".1f")
-    
-    fig_bar1.update_traces(textfont_size=14, textangle=0, textposition="outside", cliponaxis=False,
-                           marker=dict(line=dict(color='#0f172a', width=1)))
-    layout = get_premium_layout("Average Delay by Review Score")
-    layout['coloraxis_showscale'] = False
-    layout['xaxis'].update(title="Review Score", tickmode='linear')
-    layout['yaxis'].update(title="Avg Days Difference")
-    fig_bar1.update_layout(**layout)
-    st.plotly_chart(fig_bar1, use_container_width=True, config={'displayModeBar': False})
+        # Bar chart of avg delay per review score
+        st.markdown("<br>", unsafe_allow_html=True)
+        show_chart('delay_by_score')
 
 # TAB 2: GEOGRAPHIC
-with tab2:
-    st.header("Geographic Delay Analysis")
-    
-    # Calculate late rate by state
-    state_perf = filtered_df.groupby('customer_state').agg(
-        late_rate=('is_late', 'mean'),
-        total_orders=('order_id', 'count')
-    ).reset_index()
-    state_perf['late_rate'] *= 100
-    state_perf = state_perf.sort_values('late_rate', ascending=True)
+if tab2.open:
+    with tab2, PROFILER.stage('tab:geographic'):
+        st.header("Geographic Delay Analysis")
     
-    national_avg = filtered_df['is_late'].mean() * 100
+        # Calculate late rate by state
+        state_perf = grouped.state_late_rates().sort_values('late_rate', ascending=True)
     
-    c1, c2 = st.columns([2, 1])
-    with c1:
-        fig_state = px.bar(state_perf, x='late_rate', y='customer_state', orientation='h',
-                           color='late_rate', color_continuous_scale="Reds")
-        
-        fig_state.update_traces(marker=dict(line=dict(color='#0f172a', width=1)))
-        fig_state.add_vline(x=national_avg, line_dash="dash", line_color=COLORS['primary'], line_width=2,
-                            annotation_text=f"Natl Avg: {national_avg:.1f}%", annotation_position="top right",
-                            annotation_font=dict(color=COLORS['primary']))
-        
-        layout = get_premium_layout("Late Order Rate by State")
-        layout['height'] = 600
-        layout['xaxis'].update(title="% Late Orders")
-        layout['yaxis'].update(title="")
-        fig_state.update_layout(**layout)
-        fig_state.update_layout(coloraxis_colorbar_title="% Late")
-        st.plotly_chart(fig_state, use_container_width=True, config={'displayModeBar': False})
+        c1, c2 = st.columns([2, 1])
+        with c1:
+            show_chart('state_late_rate')
         
-    with c2:
-        st.markdown("<p style='font-size: 1.2rem; font-weight: 600; color: #e2e8f0; margin-bottom: 1rem;'>State Data Matrix</p>", unsafe_allow_html=True)
-        # Format the dataframe nicely
-        styled_df = state_perf.sort_values('late_rate', ascending=False).rename(
-            columns={'customer_state': 'State', 'late_rate': 'Late Rate (%)', 'total_orders': 'Volume'}
-        )
-        st.dataframe(styled_df.style.format({'Late Rate (%)': '{:.1f}%', 'Volume': '{:,}'})
-                     .background_gradient(cmap='Reds', subset=['Late Rate (%)']), 
-                     use_container_width=True, height=550, hide_index=True)
+        with c2:
+            st.markdown("<p style='font-size: 1.2rem; font-weight: 600; color: #e2e8f0; margin-bottom: 1rem;'>State Data Matrix</p>", unsafe_allow_html=True)
+            # Format the dataframe nicely
+            styled_df = state_perf.sort_values('late_rate', ascending=False).drop(columns='rank_error', errors='ignore').rename(
+                columns={'customer_state': 'State', 'late_rate': 'Late Rate (%)', 'total_orders': 'Volume',
+                         'p50': 'p50 Days', 'p90': 'p90 Days', 'p99': 'p99 Days'}
+            )
+            st.dataframe(styled_df.style.format({'Late Rate (%)': '{:.1f}%', 'Volume': '{:,}', 'p50 Days': '{:.0f}',
+                                                 'p90 Days': '{:.0f}', 'p99 Days': '{:.0f}'})
+                         .background_gradient(cmap='Reds', subset=['Late Rate (%)']), 
+                         use_container_width=True, height=550, hide_index=True)
+            if approximate:
+                st.caption(f"Delay percentiles from quantile sketches: within "
+                           f"±{state_perf['rank_error'].max() * 100:.1f} percentile points (99%).")
+
+        # State -> city drill-down, answered exactly from the city aggregate
+        # (in-memory engine only) under the status and category filters.
+        if engine.geo is not None:
+            st.markdown("<br>", unsafe_allow_html=True)
+            st.subheader("City Drill-Down")
+            # Busiest states first: they have the most cities above the cutoff.
+            drill_states = state_perf.sort_values('total_orders', ascending=False)['customer_state'].tolist()
+            if st.session_state.drill_state not in drill_states:
+                st.session_state.drill_state = drill_states[0]
+            d1, d2, d3 = st.columns([2, 2, 1])
+            drill_state = d1.selectbox("State", drill_states, key="drill_state", on_change=reset_city_page)
+            city_min_orders = d2.slider("Minimum Orders per City", min_value=1, max_value=200, key="city_min_orders",
+                                        on_change=reset_city_page)
+            ranked_cities = audit.city_late_rates(drill_state, min_orders=city_min_orders)
+            n_pages = max(1, int(np.ceil(len(ranked_cities) / CITY_PAGE_SIZE)))
+            st.session_state.city_page = min(st.session_state.city_page, n_pages)
+            city_page = d3.number_input("Page", min_value=1, max_value=n_pages, step=1, key="city_page")
+
+            summary = audit.state_summary(drill_state)
+            st.caption(f"{drill_state}: {summary['total_orders']:,} orders in {summary['cities']:,} cities · "
+                       f"{summary['late_rate']:.1f}% late · delay p50 {summary['p50']:.0f}, "
+                       f"p90 {summary['p90']:.0f}, p99 {summary['p99']:.0f} days")
+            if ranked_cities.empty:
+                st.info(f"No city in {drill_state} has {city_min_orders} orders under these filters.")
+            else:
+                c1, c2 = st.columns([2, 1])
+                with c1:
+                    show_chart('city_late_rate', state=drill_state, page=city_page - 1, page_size=CITY_PAGE_SIZE,
+                               min_orders=city_min_orders)
+                with c2:
+                    page_cities = ranked_cities.iloc[(city_page - 1) * CITY_PAGE_SIZE:city_page * CITY_PAGE_SIZE]
+                    styled_cities = page_cities.rename(
+                        columns={'rank': 'Rank', 'customer_city': 'City', 'late_rate': 'Late Rate (%)',
+                                 'total_orders': 'Volume', 'avg_score': 'Avg Score',
+                                 'p50': 'p50 Days', 'p90': 'p90 Days', 'p99': 'p99 Days'})
+                    st.dataframe(styled_cities.style.format({'Late Rate (%)': '{:.1f}%', 'Volume': '{:,}',
+                                                             'Avg Score': '{:.2f}', 'p50 Days': '{:.0f}',
+                                                             'p90 Days': '{:.0f}', 'p99 Days': '{:.0f}'}, na_rep='—'),
+                                 use_container_width=True, hide_index=True)
+                    st.caption(f"Cities {(city_page - 1) * CITY_PAGE_SIZE + 1}–"
+                               f"{(city_page - 1) * CITY_PAGE_SIZE + len(page_cities)} of {len(ranked_cities):,} "
+                               f"with at least {city_min_orders} orders, worst late rate first.")
 
 # TAB 3: SENTIMENT
-with tab3:
-    st.header("Customer Experience Correlates")
-
-    c1, c2 = st.columns(2)
-    with c1:
-        # Bar chart of avg score by status
-        status_score = filtered_df.groupby('delivery_status')['review_score'].mean().reset_index()
-        status_order = ['On Time', 'Late', 'Super Late']
-        status_score['delivery_status'] = pd.Categorical(status_score['delivery_status'], categories=status_order, ordered=True)
-        status_score = status_score.sort_values('delivery_status')
+if tab3.open:
+    with tab3, PROFILER.stage('tab:sentiment'):
+        st.header("Customer Experience Correlates")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            # Bar chart of avg score by status
+            show_chart('score_by_status')
         
-        fig_score_bar = px.bar(status_score, x='delivery_status', y='review_score', text_auto=".2f",
-                               color='delivery_status',
-                               color_discrete_map=COLORS['status'])
-                               
-        fig_score_bar.update_traces(textfont_size=16, textangle=0, textposition="inside",
-                                    marker=dict(line=dict(color='#0f172a', width=1)))
+        with c2:
+            # Heatmap
+            show_chart('score_heatmap')
         
-        layout = get_premium_layout("Avg Review Score by Outcome")
-        layout['yaxis'].update(range=[1, 5], title="Review Score")
-        layout['xaxis'].update(title="")
-        layout['showlegend'] = False
-        fig_score_bar.update_layout(**layout)
-        st.plotly_chart(fig_score_bar, use_container_width=True, config={'displayModeBar': False})
-        
-    with c2:
-        # Heatmap
-        heatmap_data = pd.crosstab(filtered_df['delivery_status'], filtered_df['review_score'], normalize='index') * 100
-        heatmap_data = heatmap_data.reindex(['On Time', 'Late', 'Super Late'])
-        
-        fig_heat = px.imshow(heatmap_data, 
-                             x=heatmap_data.columns, y=heatmap_data.index,
-                             color_continuous_scale="Purples", text_auto=".1f")
-                             
-        layout = get_premium_layout("Score Distribution by Outcome (%)")
-        layout['xaxis'].update(title="Review Score", tickmode='linear')
-        layout['yaxis'].update(title="")
-        fig_heat.update_layout(**layout)
-        fig_heat.update_layout(coloraxis_colorbar_title="%")
-        st.plotly_chart(fig_heat, use_container_width=True, config={'displayModeBar': False})
-        
-    # Line chart of delay vs score
-    st.markdown("<br>", unsafe_allow_html=True)
-    df_filtered = filtered_df[(filtered_df['days_difference'] >= -20) & (filtered_df['days_difference'] <= 20)].copy()
-    df_filtered['days_bin'] = pd.cut(df_filtered['days_difference'], bins=range(-20, 23, 2), right=False)
-    binned_scores = df_filtered.groupby('days_bin', observed=True)['review_score'].mean().reset_index()
-    binned_scores['days_mid'] = binned_scores['days_bin'].apply(lambda x: x.mid).astype(float)
-
-    fig_line = px.line(binned_scores, x='days_mid', y='review_score', markers=True)
-
-    fig_line.update_traces(line=dict(color=COLORS['accent'], width=4), 
-                           marker=dict(size=10, color=COLORS['primary'], line=dict(color='white', width=2)))
-                           
-    fig_line.add_vline(x=0, line_dash="dash", line_color=COLORS['danger'], line_width=2,
-                       annotation_text="Expected Delivery", annotation_position="bottom right",
-                       annotation_font=dict(color=COLORS['danger']))
-                       
-    layout = get_premium_layout("Sentiment Decay Curve")
-    layout['xaxis'].update(title="Days Difference (Positive = Late)")
-    layout['yaxis'].update(title="Avg Review Score", range=[1, 5])
-    fig_line.update_layout(**layout)
-    st.plotly_chart(fig_line, use_container_width=True, config={'displayModeBar': False})
-
-    # TAB 4: CATEGORIES
-with tab4:
-    st.header("Category Vulnerability Matrix")
-    st.markdown("<p style='color: #94a3b8; margin-bottom: 2rem;'>Identify product lines most susceptible to logistical bottlenecks.</p>", unsafe_allow_html=True)
-
-    top_n = st.slider("Scope Size (Top N Categories)", min_value=5, max_value=50, value=15, step=5)
-
-    cat_perf = filtered_df.dropna(subset=['product_category_en']).groupby('product_category_en').agg(
-        late_rate=('is_late', 'mean'),
-        total_orders=('order_id', 'count')
-    ).reset_index()
-
-    cat_perf = cat_perf[cat_perf['total_orders'] >= 20]
-    cat_perf['late_rate'] *= 100
-
-    top_cats = cat_perf.sort_values('late_rate', ascending=False).head(top_n).sort_values('late_rate', ascending=True)
-
-    fig_cats = px.bar(top_cats, x='late_rate', y='product_category_en', orientation='h',
-                      color='late_rate', color_continuous_scale="Sunsetdark", text_auto=".1f")
-                      
-    fig_cats.update_traces(textfont_size=12, textangle=0, textposition="outside", cliponaxis=False,
-                           marker=dict(line=dict(color='#0f172a', width=1)))
-                           
-    layout = get_premium_layout(f"Top {top_n} Vulnerable Categories (Min 20 orders)")
-    layout['height'] = max(500, top_n * 35)
-    layout['xaxis'].update(title="Late Rate (%)")
-    layout['yaxis'].update(title="")
-    fig_cats.update_layout(**layout)
-    fig_cats.update_layout(coloraxis_colorbar_title="% Late")
-    st.plotly_chart(fig_cats, use_container_width=True, config={'displayModeBar': False})
-
-    # TAB 5: TRENDS
-with tab5:
-    st.header("Temporal Convergence")
-    st.markdown("<p style='color: #94a3b8; margin-bottom: 2rem;'>Candidate's Choice: Visualizing the inverse relationship between lateness and sentiment over time.</p>", unsafe_allow_html=True)
-    
-    monthly_trends = filtered_df.dropna(subset=['purchase_month']).groupby('purchase_month').agg(
-        late_rate=('is_late', 'mean'),
-        avg_score=('review_score', 'mean'),
-        order_count=('order_id', 'count')
-    ).reset_index()
+        # Line chart of delay vs score
+        st.markdown("<br>", unsafe_allow_html=True)
+        show_chart('sentiment_decay')
+
+# TAB 4: CATEGORIES
+if tab4.open:
+    with tab4, PROFILER.stage('tab:categories'):
+        st.header("Category Vulnerability Matrix")
+        st.markdown("<p style='color: #94a3b8; margin-bottom: 2rem;'>Identify product lines most susceptible to logistical bottlenecks.</p>", unsafe_allow_html=True)
+
+        top_n = st.slider("Scope Size (Top N Categories)", min_value=5, max_value=50, step=5, key="top_n")
+
+        # All-items attribution needs the category weights exported with the
+        # dataset; the sketches only know each order's first item.
+        weighted = False
+        if engine.attribution is not None and not approximate:
+            attribution = st.radio("Attribution", ["First item", "All items (weighted)"], key="attribution",
+                                   horizontal=True,
+                                   help="Weighted counts each order in every category of its items, "
+                                        "in proportion to their share of the order.")
+            weighted = attribution != "First item"
+
+        show_chart('category_late_rate', top_n=top_n, weighted=weighted)
+
+# TAB 5: TRENDS
+if tab5.open:
+    with tab5, PROFILER.stage('tab:trends'):
+        st.header("Temporal Convergence")
+        st.markdown("<p style='color: #94a3b8; margin-bottom: 2rem;'>Candidate's Choice: Visualizing the inverse relationship between lateness and sentiment over time.</p>", unsafe_allow_html=True)
     
-    monthly_trends['late_rate'] *= 100
-    monthly_trends = monthly_trends[monthly_trends['order_count'] > 50].sort_values('purchase_month')
+        monthly_trends = grouped.monthly_trends()
     
-    from plotly.subplots import make_subplots
+        show_chart('monthly_trends')
     
-    fig_trends = make_subplots(specs=[[{"secondary_y": True}]])
-    
-    fig_trends.add_trace(
-        go.Bar(x=monthly_trends['purchase_month'], y=monthly_trends['late_rate'], 
-               name="% Late Rate", marker_color='rgba(244, 63, 94, 0.6)', 
-               marker=dict(line=dict(color='#f43f5e', width=2))),
-        secondary_y=False,
-    )
-    
-    fig_trends.add_trace(
-        go.Scatter(x=monthly_trends['purchase_month'], y=monthly_trends['avg_score'], 
-                   name="Avg Review Score", mode='lines+markers', 
-                   line=dict(color='#38bdf8', width=4),
-                   marker=dict(size=12, color='#0f172a', line=dict(color='#38bdf8', width=2))),
-        secondary_y=True,
-    )
-    
-    layout = get_premium_layout()
-    layout['hovermode'] = "x unified"
-    layout['legend'] = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    
-    fig_trends.update_layout(**layout)
-    fig_trends.update_xaxes(title_text="", gridcolor="rgba(255,255,255,0.05)")
-    fig_trends.update_yaxes(title_text="Late Rate (%)", secondary_y=False, gridcolor="rgba(255,255,255,0.05)")
-    fig_trends.update_yaxes(title_text="Avg Review Score", secondary_y=True, range=[1, 5], showgrid=False)
-    
-    st.plotly_chart(fig_trends, use_container_width=True, config={'displayModeBar': False})
-    
-    with st.expander("Explore Raw Temporal Data"):
-        styled_trends = monthly_trends.rename(columns={'purchase_month': 'Month', 'late_rate': 'Late Rate (%)', 'avg_score': 'Avg Score', 'order_count': 'Volume'})
-        st.dataframe(styled_trends.style.format({'Late Rate (%)': '{:.1f}%', 'Avg Score': '{:.2f}', 'Volume': '{:,}'}), 
-                     use_container_width=True, hide_index=True)
+        with st.expander("Explore Raw Temporal Data"):
+            styled_trends = monthly_trends.rename(columns={'purchase_month': 'Month', 'late_rate': 'Late Rate (%)', 'avg_score': 'Avg Score', 'order_count': 'Volume'})
+            st.dataframe(styled_trends.style.format({'Late Rate (%)': '{:.1f}%', 'Avg Score': '{:.2f}', 'Volume': '{:,}'}), 
+                         use_container_width=True, hide_index=True)
+
+        # Live feed: rolling windows kept up to date by the event monitor; each
+        # refresh only reads the current windows.
+        if load_stream_monitor() is not None:
+            @st.fragment(run_every=LIVE_REFRESH_SECONDS)
+            def live_feed():
+                monitor = load_stream_monitor()
+                if monitor is None:
+                    return
+                st.markdown("<br>", unsafe_allow_html=True)
+                st.subheader("Live Delivery Feed")
+                if monitor.error is not None:
+                    st.warning(f"Event feed stopped: {monitor.error}")
+                granularity = st.radio("Window", list(RETAIN), horizontal=True, key="live_granularity",
+                                       format_func=str.title)
+                live = monitor.aggregator.snapshot(granularity)
+                if live.empty:
+                    st.info(f"Waiting for order events in `{EVENTS_JSONL}`...")
+                    return
+
+                fig_live = make_subplots(specs=[[{"secondary_y": True}]])
+                fig_live.add_trace(go.Scatter(x=live['period'], y=live['late_rate'], name="% Late",
+                                              mode='lines+markers', line=dict(color='#f43f5e', width=3)),
+                                   secondary_y=False)
+                fig_live.add_trace(go.Scatter(x=live['period'], y=live['super_late_rate'], name="% Super Late",
+                                              mode='lines+markers', line=dict(color='#a855f7', width=3)),
+                                   secondary_y=False)
+                fig_live.add_trace(go.Scatter(x=live['period'], y=live['avg_review'], name="Avg Review Score",
+                                              mode='lines+markers', line=dict(color='#38bdf8', width=3, dash='dot')),
+                                   secondary_y=True)
+                layout = get_premium_layout(f"Rolling {granularity.title()} Delivery Health")
+                layout['hovermode'] = "x unified"
+                layout['legend'] = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                fig_live.update_layout(**layout)
+                fig_live.update_yaxes(title_text="Rate (%)", secondary_y=False, gridcolor="rgba(255,255,255,0.05)")
+                fig_live.update_yaxes(title_text="Avg Review Score", secondary_y=True, range=[1, 5], showgrid=False)
+                st.plotly_chart(fig_live, use_container_width=True, config={'displayModeBar': False})
+
+                latest = monitor.aggregator.snapshot(granularity, by='customer_state', last=1)
+                latest = latest[latest['n_orders'] > 0].sort_values('late_rate', ascending=False)
+                styled_latest = latest[['customer_state', 'late_rate', 'super_late_rate', 'avg_review', 'n_orders']].rename(
+                    columns={'customer_state': 'State', 'late_rate': 'Late Rate (%)', 'super_late_rate': 'Super Late (%)',
+                             'avg_review': 'Avg Score', 'n_orders': 'Volume'})
+                st.dataframe(styled_latest.style.format({'Late Rate (%)': '{:.1f}%', 'Super Late (%)': '{:.1f}%',
+                                                         'Avg Score': '{:.2f}', 'Volume': '{:,}'}),
+                             use_container_width=True, hide_index=True)
+                stats = monitor.aggregator.stats()
+                skipped = f" · {stats['malformed']:,} malformed skipped" if stats['malformed'] else ""
+                st.caption(f"{stats['events']:,} events{skipped} · latest {granularity} starting "
+                           f"{live['period'].iloc[-1]:%Y-%m-%d} · all states and categories · "
+                           f"refreshes every {LIVE_REFRESH_SECONDS}s")
+            live_feed()
+
+# --- FIGURE CACHE STATS ---
+cache_stats = figure_cache.stats()
+st.sidebar.markdown("---")
+st.sidebar.caption(f"Figure cache: {cache_stats['hits']:,} hits · {cache_stats['misses']:,} misses · "
+                   f"{cache_stats['entries']} figures, {cache_stats['bytes'] / 1e6:.1f} of "
+                   f"{cache_stats['max_bytes'] / 1e6:.0f} MB")
+warmup = load_warmer().progress() if WARMUP else None
+if warmup is not None and warmup['version'] == engine.version:
+    if warmup['running']:
+        done = f"{warmup['done']}/{warmup['total']}" if warmup['total'] is not None else "listing"
+        st.sidebar.caption(f"Warming up: {done} filter sets · {warmup['built']} figures · {warmup['seconds']:.1f}s")
+    else:
+        st.sidebar.caption(f"Warm-up: {warmup['built']} figures for {warmup['done']} filter sets "
+                           f"in {warmup['seconds']:.1f}s")
+
+# --- MEMORY REPORT ---
+with st.sidebar.expander("Memory"):
+    memory = engine.memory_report()
+    st.dataframe(memory[['column', 'dtype', 'bytes']], hide_index=True, use_container_width=True)
+    st.caption(f"Shared by all sessions: {memory['bytes'].iloc[-1] / 1e6:.1f} MB. "
+               f"Held by this rerun's filter selection: {audit.nbytes / 1e3:.1f} kB.")
+
+# --- PERFORMANCE PANEL (hidden: open the app with ?perf=1) ---
+if st.query_params.get('perf'):
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        track_memory = st.checkbox("Track allocations (slows reruns)", value=PROFILER.track_memory,
+                                   key="perf_track_memory")
+        if track_memory != PROFILER.track_memory:
+            PROFILER.track_memory = track_memory
+        last_n = st.slider("Reruns shown", min_value=1, max_value=HISTORY, value=10, key="perf_last_n")
+        breakdown = PROFILER.breakdown(last=last_n)
+        if breakdown.empty:
+            st.caption("No completed reruns yet.")
+        else:
+            top_level = breakdown[~breakdown['stage'].str.contains('/')]
+            fig_perf = px.bar(top_level.assign(ms=top_level['seconds'] * 1000), x='run_index', y='ms', color='stage')
+            layout = get_premium_layout("Rerun Time by Stage")
+            layout['height'] = 300
+            layout['xaxis'].update(title="Rerun")
+            layout['yaxis'].update(title="ms")
+            fig_perf.update_layout(**layout)
+            st.plotly_chart(fig_perf, use_container_width=True, config={'displayModeBar': False})
+
+            stages = breakdown.groupby('stage', sort=False).agg(
+                calls=('seconds', 'size'), mean_ms=('seconds', 'mean'), last_ms=('seconds', 'last'),
+                rows=('rows', 'last'), peak_mb=('bytes', 'max'))
+            stages[['mean_ms', 'last_ms']] *= 1000
+            stages['peak_mb'] /= 1e6
+            st.dataframe(stages.sort_values('mean_ms', ascending=False).style.format(
+                {'mean_ms': '{:.1f}', 'last_ms': '{:.1f}', 'rows': '{:,.0f}', 'peak_mb': '{:.2f}'}, na_rep='—'),
+                use_container_width=True)
+            runs = breakdown.drop_duplicates('run_index')['run_seconds']
+            st.caption(f"Last {len(runs)} reruns: {runs.mean() * 1000:.0f} ms mean, {runs.max() * 1000:.0f} ms max.")
+
+        if warmup is not None:
+            st.markdown("**Warm-up**")
+            warmup_timings = load_warmer().timings()
+            st.dataframe(warmup_timings.assign(ms=warmup_timings['seconds'] * 1000)
+                         .drop(columns='seconds').style.format({'ms': '{:.1f}'}),
+                         use_container_width=True, hide_index=True, height=200)
+            for error in warmup['errors']:
+                st.caption(f"Failed: {error}")
+
+        metrics_format = st.radio("Export format", ["Prometheus", "JSON"], horizontal=True, key="perf_format")
+        metrics_path = st.text_input("Export to", value=METRICS_FILES[metrics_format], key=f"perf_path_{metrics_format}")
+        if st.button("Export metrics", key="perf_export"):
+            PROFILER.export(metrics_path, 'json' if metrics_format == "JSON" else 'prometheus')
+            st.success(f"Wrote {metrics_path}")
+
+PROFILER.end()
@@ -0,0 +1,113 @@
+"""Peak allocation per dashboard rerun: row copies vs cube frames vs cell arrays.
+
+Replays the data work of one rerun (every KPI and chart table, no plotting)
+three ways and reports the ``tracemalloc`` peak of each:
+
+- ``rows``: the original app.py path. It builds a filtered copy of the order
+  table, assigns ``is_late`` to it, runs ``dropna`` for the category options
+  and the Categories tab, and copies the +/-20 day window to add a bin column.
+- ``cube frame``: the aggregate cube path. It gathers every cube column of the
+  selected cells into a DataFrame and groups it.
+- ``cell arrays``: ``AuditEngine.select(...).report()``. It runs grouped
+  ``np.bincount`` sums over the selection's row ids, with options
+  precomputed once per engine.
+
+    python benchmarks/bench_alloc.py --rows 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor import cube as cube_ops  # noqa: E402
+from veridi_auditor.engine import AuditEngine  # noqa: E402
+from veridi_auditor.storage import DASHBOARD_COLUMNS, read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def rows_rerun(df, states, statuses, categories):
+    all_categories = sorted(df.dropna(subset=['product_category_en'])['product_category_en'].unique().tolist())
+    filtered = df[df['customer_state'].isin(states) & df['delivery_status'].isin(statuses)
+                  & df['product_category_en'].isin(categories)]
+    filtered = filtered.assign(is_late=filtered['delivery_status'].isin(['Late', 'Super Late']).astype(int))
+    filtered['delivery_status'].value_counts()
+    filtered[filtered['days_difference'] > 0]['days_difference'].mean()
+    filtered.groupby('review_score')['days_difference'].mean()
+    filtered.groupby('customer_state', observed=True).agg(late_rate=('is_late', 'mean'),
+                                                          total_orders=('order_id', 'count'))
+    filtered.groupby('delivery_status', observed=True)['review_score'].mean()
+    pd.crosstab(filtered['delivery_status'], filtered['review_score'], normalize='index')
+    window = filtered[(filtered['days_difference'] >= -20) & (filtered['days_difference'] <= 20)].copy()
+    window['days_bin'] = pd.cut(window['days_difference'], bins=range(-20, 23, 2), right=False)
+    window.groupby('days_bin', observed=True)['review_score'].mean()
+    filtered.dropna(subset=['product_category_en']).groupby('product_category_en', observed=True).agg(
+        late_rate=('is_late', 'mean'), total_orders=('order_id', 'count'))
+    filtered.dropna(subset=['purchase_month']).groupby('purchase_month', observed=True).agg(
+        late_rate=('is_late', 'mean'), avg_score=('review_score', 'mean'), order_count=('order_id', 'count'))
+    return all_categories
+
+
+def frame_rerun(engine, states, statuses, categories):
+    cube_ops.dimension_values(engine.cube, 'product_category_en')
+    cells = engine.index.select(customer_state=states, delivery_status=statuses,
+                                product_category_en=categories).frame()
+    for metric in (cube_ops.kpis, cube_ops.status_counts, cube_ops.delay_histogram, cube_ops.avg_delay_by_score,
+                   cube_ops.national_late_rate, cube_ops.avg_score_by_status,
+                   cube_ops.score_distribution_by_status, cube_ops.sentiment_decay, cube_ops.monthly_trends):
+        metric(cells)
+    cube_ops.late_rate_by(cells, 'customer_state')
+    cube_ops.late_rate_by(cells, 'product_category_en')
+
+
+def arrays_rerun(engine, states, statuses, categories):
+    engine.options('product_category_en')
+    engine.select(states=states, statuses=statuses, categories=categories).report()
+
+
+def measure(run, *args):
+    """Peak traced bytes and wall time of one call."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    run(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'filter':<8} {'path':<12} {'peak MiB':>9} {'s':>7}")
+    for n in args.rows:
+        path = f'/tmp/bench_alloc_{n}.feather'
+        write_master(make_master(n), path)
+        df = read_master(path, columns=DASHBOARD_COLUMNS)
+        os.remove(path)
+        engine = AuditEngine(df)
+
+        states = engine.options('customer_state')
+        statuses = engine.options('delivery_status')
+        categories = engine.options('product_category_en')
+        filters = {
+            'default': (states, statuses, categories[:20]),
+            'narrow': (states[:3], ['Late'], categories[:5]),
+        }
+        for name, selection in filters.items():
+            for label, run, data in [('rows', rows_rerun, df), ('cube frame', frame_rerun, engine),
+                                     ('cell arrays', arrays_rerun, engine)]:
+                run(data, *selection)  # warm-up
+                peak, elapsed = measure(run, data, *selection)
+                print(f"{n:>10,} {name:<8} {label:<12} {peak / 2**20:>9.2f} {elapsed:>7.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Per-interaction aggregation cost: row-level groupbys vs the aggregate cube.
+
+Times one dashboard rerun's worth of aggregations (KPIs plus every tab) for a
+broad and a selective filter, once over the filtered order table the way
+app.py used to do it and once over the pre-built cube.
+
+    python benchmarks/bench_cube.py --rows 1000000 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor import cube as cube_ops  # noqa: E402
+from veridi_auditor.storage import DASHBOARD_COLUMNS, read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def rows_rerun(df, states, statuses, categories):
+    """The pre-cube app.py: filter rows, then group them once per chart."""
+    f = df[df['customer_state'].isin(states) & df['delivery_status'].isin(statuses)
+           & df['product_category_en'].isin(categories)].copy()
+    f['review_score'].mean()
+    f.loc[f['days_difference'] > 0, 'days_difference'].mean()
+    f['delivery_status'].value_counts()
+    f.groupby('review_score')['days_difference'].mean()
+    f.groupby('customer_state', observed=True).agg(late_rate=('is_late', 'mean'), n=('order_id', 'count'))
+    f.groupby('delivery_status', observed=True)['review_score'].mean()
+    pd.crosstab(f['delivery_status'], f['review_score'], normalize='index')
+    w = f[f['days_difference'].between(-20, 20)].copy()
+    w['days_bin'] = pd.cut(w['days_difference'], bins=range(-20, 23, 2), right=False)
+    w.groupby('days_bin', observed=True)['review_score'].mean()
+    f.groupby('product_category_en', observed=True).agg(late_rate=('is_late', 'mean'), n=('order_id', 'count'))
+    f.groupby('purchase_month', observed=True).agg(late_rate=('is_late', 'mean'),
+                                                   avg_score=('review_score', 'mean'))
+
+
+def cube_rerun(cube, states, statuses, categories):
+    c = cube_ops.filter_cube(cube, states, statuses, categories)
+    cube_ops.kpis(c)
+    cube_ops.status_counts(c)
+    cube_ops.delay_histogram(c)
+    cube_ops.avg_delay_by_score(c)
+    cube_ops.late_rate_by(c, 'customer_state')
+    cube_ops.national_late_rate(c)
+    cube_ops.avg_score_by_status(c)
+    cube_ops.score_distribution_by_status(c)
+    cube_ops.sentiment_decay(c)
+    cube_ops.late_rate_by(c, 'product_category_en')
+    cube_ops.monthly_trends(c)
+
+
+def best_of(fn, *args, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'cells':>9} {'filter':<10} {'rows s':>8} {'cube s':>8} {'speedup':>8}")
+    for n in args.rows:
+        # Round-trip through the columnar file so dtypes match what app.py loads.
+        path = f'/tmp/bench_cube_{n}.feather'
+        write_master(make_master(n), path)
+        df = read_master(path, columns=DASHBOARD_COLUMNS)
+        os.remove(path)
+
+        start = time.perf_counter()
+        cube = cube_ops.build_cube(df)
+        build = time.perf_counter() - start
+        print(f"{n:>10,} {len(cube):>9,} {'(build)':<10} {'':>8} {build:>8.3f}")
+
+        states = cube_ops.dimension_values(cube, 'customer_state')
+        categories = cube_ops.dimension_values(cube, 'product_category_en')
+        filters = {
+            'broad': (states, cube_ops.STATUS_ORDER, categories[:20]),
+            'selective': (['RJ', 'BA'], ['Late', 'Super Late'], categories[:5]),
+        }
+        for name, selection in filters.items():
+            t_rows = best_of(rows_rerun, df, *selection, repeat=args.repeat)
+            t_cube = best_of(cube_rerun, cube, *selection, repeat=args.repeat)
+            print(f"{n:>10,} {len(cube):>9,} {name:<10} {t_rows:>8.3f} {t_cube:>8.3f} {t_rows / t_cube:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
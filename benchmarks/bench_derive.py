@@ -0,0 +1,71 @@
+"""Derived-column stage: the notebook's ``.apply`` path vs ``derive_columns``.
+
+Both paths start from parsed datetime columns and produce ``days_difference``,
+``delivery_status``, ``is_late`` and ``purchase_month``; the results are
+checked to agree before timings are reported.
+
+    python benchmarks/bench_derive.py --rows 10000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.pipeline import derive_columns  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+INPUT_COLUMNS = ['order_purchase_timestamp', 'order_estimated_delivery_date',
+                 'order_delivered_customer_date']
+
+
+def classify_delay(days):
+    if days <= 0:
+        return 'On Time'
+    elif days <= 5:
+        return 'Late'
+    else:
+        return 'Super Late'
+
+
+def notebook_path(df):
+    df = df.copy()
+    df['days_difference'] = (df['order_delivered_customer_date'].dt.floor('D') -
+                             df['order_estimated_delivery_date'].dt.floor('D')).dt.days
+    df['delivery_status'] = df['days_difference'].apply(classify_delay)
+    df['is_late'] = df['delivery_status'].isin(['Late', 'Super Late']).astype(int)
+    df['purchase_month'] = df['order_purchase_timestamp'].dt.to_period('M').astype(str)
+    return df
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>11} {'apply s':>9} {'vectorized s':>13} {'speedup':>8}")
+    for n in args.rows:
+        df = make_master(n)[INPUT_COLUMNS]
+        t_apply, old = timed(notebook_path, df)
+        t_vec, new = timed(derive_columns, df)
+
+        assert np.array_equal(old['days_difference'].to_numpy(), new['days_difference'].to_numpy())
+        assert (old['delivery_status'].to_numpy() == new['delivery_status'].astype(str).to_numpy()).all()
+        assert np.array_equal(old['is_late'].to_numpy().astype(bool), new['is_late'].to_numpy())
+        assert (old['purchase_month'].to_numpy() == new['purchase_month'].astype(str).to_numpy()).all()
+
+        print(f"{n:>11,} {t_apply:>9.2f} {t_vec:>13.2f} {t_apply / t_vec:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Sidebar filter latency: three ``isin`` masks vs the bitmap filter index.
+
+For each filter the mask path builds three boolean columns, ANDs them and
+copies every matching row (what app.py originally did). The bitmap path ORs
+and ANDs packed per-value bitmaps, then gathers only the two columns a
+typical chart needs.
+
+    python benchmarks/bench_filter.py --rows 1000000 10000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.cube import FILTER_DIMENSIONS  # noqa: E402
+from veridi_auditor.index import FilterIndex  # noqa: E402
+from veridi_auditor.storage import DASHBOARD_COLUMNS, read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+CHART_COLUMNS = ['customer_state', 'delivery_status']
+
+
+def mask_filter(df, states, statuses, categories):
+    return df[(df['customer_state'].isin(states)) &
+              (df['delivery_status'].isin(statuses)) &
+              (df['product_category_en'].isin(categories))]
+
+
+def bitmap_filter(index, states, statuses, categories):
+    selection = index.select(customer_state=states, delivery_status=statuses,
+                             product_category_en=categories)
+    return selection.frame(CHART_COLUMNS)
+
+
+def best_of(fn, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), len(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'filter':<10} {'matched':>10} {'mask ms':>9} {'bitmap ms':>10} {'speedup':>8}")
+    for n in args.rows:
+        path = f'/tmp/bench_filter_{n}.feather'
+        write_master(make_master(n), path)
+        df = read_master(path, columns=DASHBOARD_COLUMNS)
+        os.remove(path)
+
+        start = time.perf_counter()
+        index = FilterIndex(df, FILTER_DIMENSIONS)
+        print(f"{n:>10,} {'(build)':<10} {'':>10} {'':>9} {(time.perf_counter() - start) * 1e3:>10.1f}")
+
+        states = sorted(df['customer_state'].unique().tolist())
+        categories = sorted(df['product_category_en'].dropna().unique().tolist())
+        filters = {
+            'broad': (states, ['On Time', 'Late', 'Super Late'], categories[:20]),
+            'selective': (['AC', 'AP', 'RR'], ['Super Late'], categories[-10:]),
+        }
+        for name, selection in filters.items():
+            t_mask, matched = best_of(mask_filter, df, *selection, repeat=args.repeat)
+            t_bitmap, _ = best_of(bitmap_filter, index, *selection, repeat=args.repeat)
+            print(f"{n:>10,} {name:<10} {matched:>10,} {t_mask * 1e3:>9.1f} {t_bitmap * 1e3:>10.1f} "
+                  f"{t_mask / t_bitmap:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""City drill-down: aggregate build time, memory and per-state query latency by scale.
+
+For each ``--rows`` scale, builds the two-level ``geo.CityAggregate`` over a
+synthetic master. It then times ``Audit.city_late_rates`` (one page of the
+worst cities) and ``Audit.state_summary`` for the busiest and the smallest
+state, unfiltered and under a narrow status/category filter. A naive
+per-rerun ``groupby`` over the state's orders is timed alongside. The first
+page is checked against it.
+
+    python benchmarks/bench_geo.py --rows 1000000 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.engine import MIN_CITY_ORDERS, AuditEngine  # noqa: E402
+from veridi_auditor.geo import CityAggregate  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+PAGE = 15
+
+
+def best_of(run, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = run()
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+
+def naive_page(df, state, statuses, categories):
+    """The first page by a per-rerun groupby over the filtered order table."""
+    rows = df[(df['customer_state'] == state) & df['delivery_status'].isin(statuses)
+              & df['product_category_en'].isin(categories)]
+    grouped = rows.groupby('customer_city', observed=True)
+    cities = pd.DataFrame({'late_rate': grouped['is_late'].mean() * 100, 'total_orders': grouped.size()})
+    cities = cities[cities['total_orders'] >= MIN_CITY_ORDERS].reset_index()
+    return cities.sort_values(['late_rate', 'total_orders', 'customer_city'],
+                              ascending=[False, False, True]).head(PAGE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'build s':>8} {'entries':>10} {'MB':>6} {'state':>5} {'filter':<7} "
+          f"{'page ms':>8} {'summary ms':>10} {'groupby ms':>10} {'same':>5}")
+    for n in args.rows:
+        engine = AuditEngine(make_master(n))
+        start = time.perf_counter()
+        CityAggregate(engine.dataset)
+        build = time.perf_counter() - start
+        df = engine.dataset.frame(['customer_state', 'customer_city', 'delivery_status', 'product_category_en',
+                                   'is_late'])
+        volume = df['customer_state'].value_counts()
+        categories = engine.options('product_category_en')
+        filters = {'all': (engine.options('delivery_status'), categories),
+                   'narrow': (['Late', 'Super Late'], categories[:5])}
+        for state in (volume.index[0], volume.index[-1]):
+            for label, (statuses, cats) in filters.items():
+                audit = engine.select(statuses=statuses, categories=cats)
+                page, page_s = best_of(lambda: audit.city_late_rates(state, top_n=PAGE), args.repeats)
+                _, summary_s = best_of(lambda: audit.state_summary(state), args.repeats)
+                expected, naive_s = best_of(lambda: naive_page(df, state, statuses, cats), args.repeats)
+                same = (page['customer_city'].astype(str).tolist() == expected['customer_city'].astype(str).tolist()
+                        and np.allclose(page['late_rate'], expected['late_rate']))
+                print(f"{n:>10,} {build:>8.2f} {len(engine.geo):>10,} {engine.geo.nbytes / 1e6:>6.1f} {state:>5} "
+                      f"{label:<7} {page_s * 1000:>8.2f} {summary_s * 1000:>10.2f} {naive_s * 1000:>10.1f} "
+                      f"{str(same):>5}")
+        del engine, df
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Dashboard memory: per-session DataFrame copies vs one shared compact dataset.
+
+``st.cache_data`` gives every session its own unpickled copy of the loaded
+DataFrame. The dashboard now keeps a single read-only ``AuditEngine`` (compact
+``MasterDataset`` + aggregate cube + filter index) in ``st.cache_resource``
+and each session only holds its filter selection. This prints bytes per
+column for both layouts and the RSS growth of simulating ``--sessions``
+concurrent sessions each way.
+
+    python benchmarks/bench_memory.py --rows 1000000 --sessions 20
+"""
+
+import argparse
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.engine import AuditEngine  # noqa: E402
+from veridi_auditor.storage import DASHBOARD_COLUMNS, read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    path = f'/tmp/bench_memory_{args.rows}.feather'
+    write_master(make_master(args.rows), path)
+    df = read_master(path, columns=DASHBOARD_COLUMNS)
+    os.remove(path)
+
+    engine = AuditEngine(df)
+    compact = engine.dataset.memory_report().set_index('column')
+    print(f"{'column':<22} {'DataFrame B/row':>16} {'compact B/row':>14}")
+    for name in DASHBOARD_COLUMNS:
+        before = df[name].memory_usage(deep=True, index=False) / len(df)
+        print(f"{name:<22} {before:>16.2f} {compact.loc[name, 'bytes_per_row']:>14.2f}")
+    frame_bytes = df.memory_usage(deep=True, index=False).sum()
+    print(f"{'total':<22} {frame_bytes / len(df):>16.2f} {compact.loc['total', 'bytes_per_row']:>14.2f}")
+    print(f"shared engine (dataset + cube + index): {engine.memory_report()['bytes'].iloc[-1] / 2**20:.1f} MiB")
+
+    # One pickled copy per session is what st.cache_data hands out.
+    blob = pickle.dumps(df)
+    start = rss_bytes()
+    copies = [pickle.loads(blob) for _ in range(args.sessions)]
+    per_copy = (rss_bytes() - start) / args.sessions
+    del copies
+
+    states = engine.options('customer_state')
+    categories = engine.options('product_category_en')[:20]
+    start = rss_bytes()
+    audits = [engine.select(states=states, categories=categories) for _ in range(args.sessions)]
+    per_audit = (rss_bytes() - start) / args.sessions
+    print(f"per session, cache_data copy:   {per_copy / 2**20:8.2f} MiB RSS")
+    print(f"per session, shared + selection: {per_audit / 2**20:6.2f} MiB RSS "
+          f"({audits[0].nbytes / 2**10:.1f} KiB held by the selection while a rerun runs)")
+
+
+if __name__ == '__main__':
+    main()
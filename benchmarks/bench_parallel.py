@@ -0,0 +1,64 @@
+"""Partitioned master build: wall time for 1, 2, 4 and 8 worker processes.
+
+Writes synthetic Olist sources to a scratch directory, builds the master
+table with ``veridi_auditor.chunked`` at each worker count and checks that
+every output file is byte-for-byte identical to the single-process one.
+
+    python benchmarks/bench_parallel.py --orders 2000000 --workers 1 2 4 8
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.chunked import build_chunked  # noqa: E402
+from veridi_auditor.synthetic import write_sources  # noqa: E402
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--partitions', type=int, default=32)
+    parser.add_argument('--chunk-rows', type=int, default=250_000)
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix='bench_parallel_')
+    try:
+        source_dir = os.path.join(scratch, 'sources')
+        write_sources(source_dir, args.orders)
+
+        print(f"{args.orders:,} orders, {args.partitions} partitions, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>8} {'speedup':>8} {'identical':>9}")
+        baseline_time = baseline_hash = None
+        for workers in args.workers:
+            output = os.path.join(scratch, f'master_{workers}.parquet')
+            start = time.perf_counter()
+            build_chunked(source_dir, output, chunk_rows=args.chunk_rows,
+                          partitions=args.partitions, workers=workers)
+            elapsed = time.perf_counter() - start
+            digest = sha256(output)
+            if baseline_time is None:
+                baseline_time, baseline_hash = elapsed, digest
+            print(f"{workers:>7} {elapsed:>8.2f} {baseline_time / elapsed:>7.2f}x "
+                  f"{str(digest == baseline_hash):>9}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
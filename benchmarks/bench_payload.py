@@ -0,0 +1,82 @@
+"""Figure payload: raw-row histogram/decay curve vs server-side bins.
+
+Builds the Overview histogram and the Sentiment Decay Curve the way app.py
+originally did (``px.histogram`` over every filtered row, ``pd.cut`` + groupby
+for the decay curve) and from the cube's pre-binned per-day sums, then
+reports the serialized figure size sent to the browser and the time to build
+and serialize each. Browser render time follows the payload: Plotly.js has
+to parse and bin every embedded value in the raw-row version.
+
+    python benchmarks/bench_payload.py --rows 100000 1000000 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor import cube as cube_ops  # noqa: E402
+from veridi_auditor.storage import DASHBOARD_COLUMNS, read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def rows_histogram(df):
+    return px.histogram(df, x='days_difference', nbins=50, range_x=[-20, 20])
+
+
+def rows_decay(df):
+    window = df[(df['days_difference'] >= -20) & (df['days_difference'] <= 20)].copy()
+    window['days_bin'] = pd.cut(window['days_difference'], bins=range(-20, 23, 2), right=False)
+    binned = window.groupby('days_bin', observed=True)['review_score'].mean().reset_index()
+    binned['days_mid'] = binned['days_bin'].apply(lambda x: x.mid).astype(float)
+    return px.line(binned, x='days_mid', y='review_score', markers=True)
+
+
+def binned_histogram(cube):
+    return px.bar(cube_ops.delay_histogram(cube), x='days_difference', y='count', range_x=[-20.5, 20.5])
+
+
+def binned_decay(cube):
+    return px.line(cube_ops.sentiment_decay(cube), x='days_mid', y='review_score', markers=True)
+
+
+def measure(build, data, repeat):
+    """Smallest build+serialize time over ``repeat`` runs and the payload size."""
+    best, payload = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = pio.to_json(build(data), validate=False)
+        best = min(best, time.perf_counter() - start)
+    return len(payload), best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'figure':<10} {'raw bytes':>12} {'binned bytes':>13} "
+          f"{'raw s':>8} {'binned s':>9}")
+    for n in args.rows:
+        path = f'/tmp/bench_payload_{n}.feather'
+        write_master(make_master(n), path)
+        df = read_master(path, columns=DASHBOARD_COLUMNS)
+        os.remove(path)
+        cube = cube_ops.build_cube(df)
+
+        for name, raw, binned in [('histogram', rows_histogram, binned_histogram),
+                                  ('decay', rows_decay, binned_decay)]:
+            raw_bytes, raw_s = measure(raw, df, args.repeat)
+            binned_bytes, binned_s = measure(binned, cube, args.repeat)
+            print(f"{n:>10,} {name:<10} {raw_bytes:>12,} {binned_bytes:>13,} {raw_s:>8.3f} {binned_s:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Batch reports: per-state metrics from one split vs re-filtering per state, and render time.
+
+For each ``--rows`` scale, loads a synthetic master into an ``AuditEngine``
+and times every table of every per-state report three ways: one audit of
+all states (the cost the batch aims for), one ``engine.select`` plus report
+per state, and ``report.scenarios`` (one filter and one split for all
+states). It checks the two per-state results are identical, then times
+``write_reports`` (HTML and CSV) for the single report and for every state,
+with each ``--workers`` count.
+
+    python benchmarks/bench_report.py --rows 100000 1000000 --workers 1 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.engine import METRICS, AuditEngine  # noqa: E402
+from veridi_auditor.report import ScenarioTables, scenarios, write_reports  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def refilter(engine):
+    """Per-state tables the naive way: a fresh filter per state."""
+    return [(state, ScenarioTables(engine.select(states=[state]), state=state))
+            for state in engine.options('customer_state')]
+
+
+def split(engine):
+    return [(label, ScenarioTables(audit, state=label)) for label, audit in scenarios(engine, 'state')]
+
+
+def same(left, right):
+    if [label for label, _ in left] != [label for label, _ in right]:
+        return False
+    for (_, a), (_, b) in zip(left, right):
+        if a.kpis() != b.kpis() or not all(a.tables[m].equals(b.tables[m]) for m in METRICS):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'states':>6} {'one ms':>8} {'refilter ms':>11} {'split ms':>9} {'same':>5} "
+          f"{'workers':>7} {'render one s':>12} {'render all s':>12}")
+    for n in args.rows:
+        engine = AuditEngine(make_master(n))
+        _, one = timed(lambda: ScenarioTables(engine.select()))
+        naive, naive_s = timed(lambda: refilter(engine))
+        shared, shared_s = timed(lambda: split(engine))
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as out:
+                _, render_one = timed(lambda: write_reports(engine, os.path.join(out, 'one'), workers=workers))
+                _, render_all = timed(lambda: write_reports(engine, os.path.join(out, 'all'), by='state',
+                                                            workers=workers))
+            print(f"{n:>10,} {len(shared):>6} {one * 1000:>8.1f} {naive_s * 1000:>11.1f} {shared_s * 1000:>9.1f} "
+                  f"{str(same(naive, shared)):>5} {workers:>7} {render_one:>12.2f} {render_all:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Approximate mode: sketch summaries vs exact row queries.
+
+For each size, builds the summaries (``veridi_auditor.sketch``) and answers
+the Geographic/Categories views with delay percentiles. The exact answer is
+a row filter plus a per-group ``np.quantile`` (the same "smallest value reaching q" definition). The sketch answer merges the
+selected strata. For both it prints the query time, the summaries' size and
+build time, and the worst p50/p90/p99 error in days against the exact
+percentiles. It also prints the worst histogram-bin error in standard errors.
+
+    python benchmarks/bench_sketch.py --rows 1000000 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor import cube as cube_ops  # noqa: E402
+from veridi_auditor.sketch import QUANTILES, SUMMARY_COLUMNS, build_summaries  # noqa: E402
+from veridi_auditor.storage import read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+
+def exact(df, states, categories):
+    rows = df[df['customer_state'].isin(states) & df['product_category_en'].isin(categories)]
+    result = {}
+    for dim in ('customer_state', 'product_category_en'):
+        result[dim] = rows.groupby(dim, observed=True)['days_difference'].apply(
+            lambda days: pd.Series(np.quantile(days, QUANTILES, method='inverted_cdf'))).unstack()
+    hist = rows['days_difference'].value_counts().reindex(
+        range(-cube_ops.DAYS_WINDOW, cube_ops.DAYS_WINDOW + 1), fill_value=0)
+    return result, hist.to_numpy()
+
+
+def approximate(summaries, states, categories):
+    audit = summaries.select(states=states, categories=categories)
+    result = {dim: audit.delay_quantiles(dim).set_index(dim) for dim in ('customer_state', 'product_category_en')}
+    audit.state_late_rates()
+    audit.category_late_rates()
+    return result, audit.delay_histogram()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 5_000_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'build s':>8} {'MiB':>6} {'exact s':>8} {'sketch s':>9} {'max |err| days':>15} "
+          f"{'hist max z':>11}")
+    for n in args.rows:
+        path = f'/tmp/bench_sketch_{n}.feather'
+        write_master(make_master(n), path)
+        df = read_master(path, columns=SUMMARY_COLUMNS)
+        os.remove(path)
+
+        start = time.perf_counter()
+        summaries = build_summaries(df)
+        build_s = time.perf_counter() - start
+
+        states = sorted(df['customer_state'].unique().tolist())
+        categories = sorted(df['product_category_en'].dropna().unique().tolist())[:20]
+
+        start = time.perf_counter()
+        truth, true_hist = exact(df, states, categories)
+        exact_s = time.perf_counter() - start
+        start = time.perf_counter()
+        approx, hist = approximate(summaries, states, categories)
+        sketch_s = time.perf_counter() - start
+
+        columns = [f'p{round(q * 100):d}' for q in QUANTILES]
+        err = max(np.nanmax(np.abs(approx[dim][columns].to_numpy()
+                                   - truth[dim].reindex(approx[dim].index).to_numpy()))
+                  for dim in truth)
+        se = hist['count_se'].where(hist['count_se'] > 0)
+        z = np.nanmax(np.abs(hist['count'] - true_hist) / se)
+        print(f"{n:>10,} {build_s:>8.2f} {summaries.nbytes / 2**20:>6.1f} {exact_s:>8.3f} {sketch_s:>9.3f} "
+              f"{err:>15.1f} {z:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
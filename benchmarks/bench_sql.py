@@ -0,0 +1,97 @@
+"""In-memory cube vs DuckDB vs SQLite: startup and per-query latency side by side.
+
+Writes a synthetic master table as Feather and Parquet, then for each
+backend times engine startup and the four grouped metrics the SQL backend
+pushes down (state late rate, category late rate with the minimum-orders
+cutoff, monthly trends and the status x score distribution) under the
+dashboard's default filters and a narrow selection. Every SQL result is
+checked against the in-memory engine and must be identical.
+
+    python benchmarks/bench_sql.py --rows 1000000 5000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.engine import AuditEngine  # noqa: E402
+from veridi_auditor.sql import SQLEngine, duckdb  # noqa: E402
+from veridi_auditor.storage import write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+QUERIES = ['state_late_rates', 'category_late_rates', 'monthly_trends', 'score_distribution']
+
+
+def backends(scratch):
+    feather_path = os.path.join(scratch, 'master.feather')
+    parquet_path = os.path.join(scratch, 'master.parquet')
+    engines = {'memory': lambda: AuditEngine.load(feather_path)}
+    if duckdb is not None:
+        engines['duckdb feather'] = lambda: SQLEngine(feather_path, backend='duckdb')
+        engines['duckdb parquet'] = lambda: SQLEngine(parquet_path, backend='duckdb')
+    engines['sqlite'] = lambda: SQLEngine(parquet_path, backend='sqlite')
+    return engines
+
+
+def best_of(run, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = run()
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'backend':<15} {'filter':<8} {'startup s':>9} "
+          + ' '.join(f'{q[:14]:>14}' for q in QUERIES) + f" {'identical':>9}")
+    for n in args.rows:
+        scratch = tempfile.mkdtemp(prefix='bench_sql_')
+        try:
+            df = make_master(n)
+            write_master(df, os.path.join(scratch, 'master.feather'))
+            write_master(df, os.path.join(scratch, 'master.parquet'))
+            del df
+
+            expected = {}
+            for name, load in backends(scratch).items():
+                start = time.perf_counter()
+                engine = load()
+                startup = time.perf_counter() - start
+                states = engine.options('customer_state')
+                categories = engine.options('product_category_en')
+                filters = {'default': {'categories': categories[:20]},
+                           'narrow': {'states': states[:3], 'statuses': ['Late'], 'categories': categories[:5]}}
+                for label, selection in filters.items():
+                    timings, identical = [], True
+                    for query in QUERIES:
+                        result, seconds = best_of(lambda: getattr(engine.select(**selection), query)(),
+                                                  args.repeats)
+                        timings.append(seconds)
+                        if name == 'memory':
+                            expected[label, query] = result
+                        else:
+                            try:
+                                pd.testing.assert_frame_equal(result, expected[label, query], check_exact=True)
+                            except AssertionError:
+                                identical = False
+                    print(f"{n:>10,} {name:<15} {label:<8} {startup:>9.2f} "
+                          + ' '.join(f'{t * 1000:>12.1f}ms' for t in timings) + f" {str(identical):>9}")
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
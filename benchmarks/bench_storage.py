@@ -0,0 +1,104 @@
+"""Cold-start benchmark: CSV export vs columnar master file.
+
+Each measurement runs in a fresh interpreter so it sees what a new Streamlit
+worker sees: nothing cached, nothing imported beyond pandas/pyarrow. Reported
+memory is the growth in resident set size caused by the load itself.
+
+    python benchmarks/bench_storage.py --rows 100000 1000000 10000000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from veridi_auditor.storage import DASHBOARD_COLUMNS, write_master  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+
+# Executed in the child process. Mirrors app.py's load_data before and after.
+LOADERS = {
+    'csv': """
+df = pd.read_csv(path)
+df['order_purchase_timestamp'] = pd.to_datetime(df['order_purchase_timestamp'])
+df['order_estimated_delivery_date'] = pd.to_datetime(df['order_estimated_delivery_date'])
+df['order_delivered_customer_date'] = pd.to_datetime(df['order_delivered_customer_date'])
+""",
+    'columnar_full': "df = read_master(path)",
+    'columnar_projected': "df = read_master(path, columns=columns)",
+}
+
+CHILD = """
+import json, os, sys, time
+import pandas as pd
+sys.path.insert(0, {root!r})
+from veridi_auditor.storage import read_master
+path, columns = {path!r}, {columns!r}
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+rss_before = rss_bytes()
+start = time.perf_counter()
+{loader}
+elapsed = time.perf_counter() - start
+rss_after = rss_bytes()
+print(json.dumps({{'seconds': elapsed, 'rss_mb': (rss_after - rss_before) / 2**20,
+                  'frame_mb': df.memory_usage(deep=True).sum() / 2**20, 'rows': len(df)}}))
+"""
+
+
+def run_loader(name, path):
+    code = CHILD.format(root=REPO_ROOT, path=path, columns=DASHBOARD_COLUMNS,
+                        loader=LOADERS[name])
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def bench(rows, workdir, repeat):
+    df = make_master(rows)
+    csv_path = os.path.join(workdir, f'master_{rows}.csv')
+    columnar_path = os.path.join(workdir, f'master_{rows}.feather')
+    df.to_csv(csv_path, index=False)
+    write_master(df, columnar_path)
+    del df
+
+    results = []
+    for name in LOADERS:
+        path = csv_path if name == 'csv' else columnar_path
+        runs = [run_loader(name, path) for _ in range(repeat)]
+        best = min(runs, key=lambda r: r['seconds'])
+        best.update(loader=name, file_mb=os.path.getsize(path) / 2**20)
+        results.append(best)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per loader; best is kept')
+    parser.add_argument('--json', help='also write raw results to this file')
+    args = parser.parse_args(argv)
+
+    all_results = []
+    print(f"{'rows':>10} {'loader':<20} {'seconds':>8} {'rss MB':>8} {'frame MB':>9} {'file MB':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.rows:
+            for r in bench(rows, workdir, args.repeat):
+                all_results.append(r)
+                print(f"{rows:>10,} {r['loader']:<20} {r['seconds']:>8.3f} {r['rss_mb']:>8.1f} "
+                      f"{r['frame_mb']:>9.1f} {r['file_mb']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Streaming aggregator throughput in events per second.
+
+Feeds ``synthetic.make_events`` into a ``RollingAggregator`` from three
+sources: parsed events in memory (update cost only), a JSONL file
+(``read_events``) and a local TCP socket (``socket_events``, served by a
+thread writing the same file). For each it prints the events per second. It
+also prints how long a dashboard poll (``snapshot``) takes against the full
+windows, which stays flat however many events have been consumed.
+
+    python benchmarks/bench_stream.py --orders 100000 500000
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.stream import RollingAggregator, read_events, socket_events, write_events  # noqa: E402
+from veridi_auditor.synthetic import make_events  # noqa: E402
+
+
+def serve_file(path):
+    """Start a one-shot TCP server that sends ``path`` and closes; returns its address."""
+    server = socket.create_server(('127.0.0.1', 0))
+
+    def send():
+        conn, _ = server.accept()
+        with conn, open(path, 'rb') as f:
+            conn.sendfile(f)
+        server.close()
+
+    threading.Thread(target=send, daemon=True).start()
+    return server.getsockname()
+
+
+def throughput(events):
+    aggregator = RollingAggregator()
+    start = time.perf_counter()
+    n = aggregator.consume(events)
+    return aggregator, n / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[100_000, 500_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'orders':>9} {'events':>9} {'memory ev/s':>12} {'jsonl ev/s':>11} {'socket ev/s':>12} "
+          f"{'poll ms':>8} {'periods':>8}")
+    for n in args.orders:
+        events = make_events(n)
+        path = f'/tmp/bench_stream_{n}.jsonl'
+        write_events(events, path, mode='w')
+
+        aggregator, in_memory = throughput(events)
+        _, from_file = throughput(read_events(path))
+        _, from_socket = throughput(socket_events(serve_file(path)))
+        os.remove(path)
+
+        start = time.perf_counter()
+        for by in (None, 'customer_state', 'product_category_en'):
+            aggregator.snapshot('day', by=by, last=30)
+        poll_ms = (time.perf_counter() - start) * 1000
+        periods = sum(aggregator.stats()['periods'].values())
+        print(f"{n:>9,} {len(events):>9,} {in_memory:>12,.0f} {from_file:>11,.0f} {from_socket:>12,.0f} "
+              f"{poll_ms:>8.1f} {periods:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Benchmark suite: ETL build, cold start, filter and per-tab latency by scale.
+
+For each ``--orders`` scale it writes synthetic Olist sources
+(``synthetic.write_sources``) to a scratch directory and times:
+
+- ``etl``: the bounded-memory full build (``chunked.build_chunked``) and the
+  first incremental refresh into an empty store (``pipeline.refresh``), each
+  with its profiler stages
+- ``load``: the dashboard's ``load_data`` cold start, ``AuditEngine.load`` of
+  the Feather master in a fresh interpreter, with its stages
+- ``filter``: ``AuditEngine.select`` for a few sidebar selections
+- ``tabs``: the ``Audit`` metrics each dashboard tab computes, unfiltered
+
+Results are written as JSON with the commit, library versions and machine
+they came from. ``--compare`` matches them against an earlier results file,
+prints the ratio per benchmark and exits non-zero when any is slower than
+``--threshold`` allows, so a run on two commits is a regression check:
+
+    python benchmarks/bench_suite.py --orders 100000 1000000 --output base.json
+    python benchmarks/bench_suite.py --orders 100000 1000000 --output head.json --compare base.json
+
+``pipeline.refresh`` holds the whole table in memory; leave ``etl`` out of
+``--suites`` or pass ``--no-refresh`` at the largest scales (tens of millions
+of orders).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from veridi_auditor.chunked import build_chunked  # noqa: E402
+from veridi_auditor.engine import AuditEngine  # noqa: E402
+from veridi_auditor.pipeline import refresh  # noqa: E402
+from veridi_auditor.profiling import PROFILER  # noqa: E402
+from veridi_auditor.storage import read_master, write_master  # noqa: E402
+from veridi_auditor.synthetic import write_sources  # noqa: E402
+
+SUITES = ['etl', 'load', 'filter', 'tabs']
+
+# Audit methods behind each dashboard tab (the KPI row renders above the tabs).
+TABS = {
+    'kpis': ['kpis'],
+    'overview': ['status_counts', 'delay_histogram', 'avg_delay_by_score'],
+    'geographic': ['state_late_rates'],
+    'sentiment': ['avg_score_by_status', 'score_distribution', 'sentiment_decay'],
+    'categories': ['category_late_rates'],
+    'trends': ['monthly_trends'],
+}
+
+# Prints the profiler stage totals of one engine load as JSON.
+COLD_START = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from veridi_auditor.engine import AuditEngine
+from veridi_auditor.profiling import PROFILER
+start = time.perf_counter()
+AuditEngine.load({path!r})
+stages = {{k: v['seconds'] for k, v in PROFILER.totals.items()}}
+print(json.dumps({{'total': time.perf_counter() - start, **stages}}))
+"""
+
+
+def timings(run, repeats):
+    """Wall-clock seconds of ``repeats`` calls of ``run``."""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def result(orders, benchmark, seconds):
+    return {'orders': orders, 'benchmark': benchmark, 'seconds': statistics.median(seconds),
+            'min': min(seconds), 'repeats': len(seconds)}
+
+
+def stage_results(orders, prefix):
+    """One result per profiler stage recorded since the last reset."""
+    return [result(orders, f'{prefix}/{stage}', [totals['seconds']])
+            for stage, totals in sorted(PROFILER.totals.items())]
+
+
+def filter_sets(engine):
+    states = engine.options('customer_state')
+    categories = engine.options('product_category_en')
+    return {
+        'all': {},
+        'one_state': {'states': states[:1]},
+        'top_categories': {'categories': categories[:20]},
+        'narrow': {'states': states[:3], 'statuses': ['Late'], 'categories': categories[:5]},
+    }
+
+
+def run_scale(orders, scratch, args):
+    results = []
+    source_dir = os.path.join(scratch, 'sources')
+    start = time.perf_counter()
+    write_sources(source_dir, orders, seed=args.seed)
+    print(f"{orders:,} orders: sources written in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    parquet_path = os.path.join(scratch, 'master.parquet')
+    feather_path = os.path.join(scratch, 'master.feather')
+    if 'etl' in args.suites:
+        PROFILER.reset()
+        results.append(result(orders, 'etl.chunked', timings(
+            lambda: build_chunked(source_dir, parquet_path, workers=args.workers), 1)))
+        results += stage_results(orders, 'etl.chunked')
+        if not args.no_refresh:
+            store_dir = os.path.join(scratch, 'store')
+            PROFILER.reset()
+            results.append(result(orders, 'etl.refresh', timings(lambda: refresh(source_dir, store_dir), 1)))
+            results += stage_results(orders, 'etl.refresh')
+    else:
+        build_chunked(source_dir, parquet_path, workers=args.workers)
+    write_master(read_master(parquet_path), feather_path)
+
+    if 'load' in args.suites:
+        code = COLD_START.format(root=ROOT, path=feather_path)
+        runs = [json.loads(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True,
+                                          text=True).stdout) for _ in range(args.repeats_load)]
+        results.append(result(orders, 'load.cold_start', [r['total'] for r in runs]))
+        for stage in sorted(set(runs[0]) - {'total'}):
+            results.append(result(orders, f'load.cold_start/{stage}', [r[stage] for r in runs]))
+
+    if 'filter' in args.suites or 'tabs' in args.suites:
+        engine = AuditEngine.load(feather_path)
+        if 'filter' in args.suites:
+            for name, selection in filter_sets(engine).items():
+                results.append(result(orders, f'filter.{name}',
+                                      timings(lambda: engine.select(**selection), args.repeats)))
+        if 'tabs' in args.suites:
+            audit = engine.select()
+            for tab, methods in TABS.items():
+                results.append(result(orders, f'tab.{tab}', timings(
+                    lambda: [getattr(audit, method)() for method in methods], args.repeats)))
+    return results
+
+
+def _git(*command):
+    try:
+        return subprocess.run(['git', *command], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    status = _git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': None if status is None else bool(status),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print new/old time ratios; returns the benchmarks slower than ``threshold`` allows."""
+    old = {(r['orders'], r['benchmark']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'orders':>10} {'benchmark':<44} {'base ms':>10} {'new ms':>10} {'ratio':>7}")
+    for r in results:
+        before = old.get((r['orders'], r['benchmark']))
+        if before is None or before['seconds'] <= 0:
+            continue
+        ratio = r['seconds'] / before['seconds']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(r['benchmark'])
+        print(f"{r['orders']:>10,} {r['benchmark']:<44} {before['seconds'] * 1000:>10.3f} {r['seconds'] * 1000:>10.3f} "
+              f"{ratio:>6.2f}x{flag}")
+    print(f"\nbaseline: {baseline['environment'].get('commit')}  ({len(regressions)} regressions "
+          f"above {threshold:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    parser.add_argument('--repeats', type=int, default=20, help='repeats of each filter and tab timing')
+    parser.add_argument('--repeats-load', type=int, default=3, help='cold starts per scale')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes of the chunked build')
+    parser.add_argument('--no-refresh', action='store_true', help='skip the in-memory pipeline.refresh build')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results JSON (default: stdout)')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before a benchmark counts as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = []
+    for orders in args.orders:
+        scratch = tempfile.mkdtemp(prefix='bench_suite_')
+        try:
+            results += run_scale(orders, scratch, args)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    document = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Figure cache warm-up: pass duration, and first-rerun figure time cold vs warmed.
+
+For each ``--rows`` scale, loads a synthetic master into an ``AuditEngine``
+and times one ``Warmer`` pass over the default combinations (default
+filters, each state, each status and the busiest categories). It then times
+what a first rerun pays for every tab's figures under a few of those
+selections, on a cold cache and on the warmed one. It also times the
+filter-plus-KPI work a rerun does while a pass is running, against an idle
+server, to show how much the background builds slow serving.
+
+    python benchmarks/bench_warmup.py --rows 100000 1000000 --workers 1 2
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from veridi_auditor.engine import AuditEngine  # noqa: E402
+from veridi_auditor.figcache import FigureCache  # noqa: E402
+from veridi_auditor.figures import build_figure, figure_key  # noqa: E402
+from veridi_auditor.synthetic import make_master  # noqa: E402
+from veridi_auditor.warmup import WARM_FIGURES, Warmer, combinations  # noqa: E402
+
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def first_rerun(engine, cache, figures, selection):
+    """Seconds to get every figure of ``selection`` through ``cache``."""
+    start = time.perf_counter()
+    audit = engine.select(**selection)
+    for name, params in figures.items():
+        key = figure_key(name, engine.version, **selection, **params)
+        cache.get(key, lambda: build_figure(name, audit, **params))
+    return time.perf_counter() - start
+
+
+def serving_ms(engine, selection, seconds=1.0):
+    """Median ms of filter plus KPIs, repeated for ``seconds``."""
+    samples, stop = [], time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        engine.select(**selection).kpis()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'workers':>7} {'filter sets':>11} {'figures':>7} {'pass s':>7} "
+          f"{'cold ms':>9} {'warm ms':>9} {'serve idle':>10} {'serve busy':>10}")
+    for n in args.rows:
+        engine = AuditEngine(make_master(n))
+        selections = combinations(engine)
+        probes = [selection for _, selection in selections[:1] + selections[1:len(selections):10]]
+        idle = serving_ms(engine, probes[0])
+        for workers in args.workers:
+            cold = sum(first_rerun(engine, FigureCache(CACHE_BYTES), WARM_FIGURES, selection)
+                       for selection in probes) / len(probes)
+
+            cache = FigureCache(CACHE_BYTES)
+            warmer = Warmer(cache, workers=workers)
+            warmer.ensure(engine)
+            busy = serving_ms(engine, probes[0])
+            warmer.wait()
+            progress = warmer.progress()
+            warm = sum(first_rerun(engine, cache, warmer.figures, selection)
+                       for selection in probes) / len(probes)
+            warmer.shutdown()
+            print(f"{n:>10,} {workers:>7} {progress['total']:>11} {progress['built']:>7} "
+                  f"{progress['seconds']:>7.1f} {cold * 1000:>9.1f} {warm * 1000:>9.1f} "
+                  f"{idle:>8.2f}ms {busy:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""Shared fixtures: small fixed-seed synthetic tables."""
+
+import pandas as pd
+import pytest
+
+from veridi_auditor.synthetic import make_master, make_sources
+
+N_ORDERS = 600
+
+
+def canonical(master):
+    """``master`` with plain columns, sorted by order, for comparing builds."""
+    master = master.apply(lambda col: col.astype(object) if isinstance(col.dtype, pd.CategoricalDtype)
+                          or pd.api.types.is_string_dtype(col.dtype) else col)
+    master['review_score'] = master['review_score'].astype(float)
+    master['days_difference'] = master['days_difference'].astype('int64')
+    return master.sort_values('order_id').reset_index(drop=True)
+
+
+def write_tables(source_dir, tables, suffix=''):
+    """Write Olist-named CSVs of ``tables`` into ``source_dir`` (``suffix`` names a later drop)."""
+    from veridi_auditor.synthetic import SOURCE_FILES
+    for name, table in tables.items():
+        stem, ext = SOURCE_FILES[name].rsplit('.', 1)
+        table.to_csv(source_dir / f"{stem}{suffix}.{ext}", index=False)
+
+
+@pytest.fixture(scope='session')
+def sources():
+    return make_sources(N_ORDERS, seed=7)
+
+
+@pytest.fixture(scope='session')
+def master():
+    return make_master(5_000, seed=3)
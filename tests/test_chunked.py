@@ -0,0 +1,42 @@
+import pandas as pd
+
+from tests.conftest import canonical, write_tables
+from veridi_auditor.chunked import (SCATTER_COLUMNS, SCATTER_SCHEMAS, build_chunked, read_spill,
+                                     scatter)
+from veridi_auditor.pipeline import build_master
+from veridi_auditor.storage import read_master
+
+TABLES = ('orders', 'customers', 'reviews', 'items', 'products', 'translation')
+
+
+def test_chunked_matches_full_build_for_any_worker_count(tmp_path, sources):
+    source_dir = tmp_path / 'sources'
+    source_dir.mkdir()
+    write_tables(source_dir, sources)
+    outputs = {}
+    for workers in (1, 3):
+        output = tmp_path / f'master_{workers}.parquet'
+        build_chunked(source_dir, str(output), chunk_rows=150, partitions=4, workers=workers)
+        outputs[workers] = output.read_bytes()
+
+    assert outputs[1] == outputs[3]
+    expected = canonical(build_master(*(sources[name] for name in TABLES)))
+    assert canonical(read_master(str(tmp_path / 'master_1.parquet'))).equals(expected)
+
+
+
+def test_scatter_keeps_columns_that_start_all_null(tmp_path):
+    # Without a declared schema the first chunk's empty city column would be
+    # inferred as the null type, and the second chunk could not be cast to it.
+    chunks = [
+        pd.DataFrame({'customer_id': ['a', 'b'], 'customer_state': ['SP', 'RJ'],
+                      'customer_city': [None, None]}),
+        pd.DataFrame({'customer_id': ['c', 'd'], 'customer_state': ['MG', 'SP'],
+                      'customer_city': ['belo horizonte', 'sao paulo']}),
+    ]
+    spill_dir = str(tmp_path / 'customers')
+    assert scatter(chunks, spill_dir, 'customer_id', 1, SCATTER_SCHEMAS['customers']) == 4
+
+    spilled = read_spill(spill_dir, 0, SCATTER_COLUMNS['customers'])
+    assert spilled['customer_city'].tolist()[2:] == ['belo horizonte', 'sao paulo']
+    assert spilled['customer_city'].isna().tolist()[:2] == [True, True]
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from veridi_auditor import cube as cube_ops
+
+
+def original_decay(rows):
+    """The dashboard's sentiment curve before the binning moved into the cube."""
+    window = rows[(rows['days_difference'] >= -20) & (rows['days_difference'] <= 20)].copy()
+    window['days_bin'] = pd.cut(window['days_difference'], bins=range(-20, 23, 2), right=False)
+    binned = window.groupby('days_bin', observed=True)['review_score'].mean().reset_index()
+    binned['days_mid'] = binned['days_bin'].apply(lambda x: x.mid).astype(float)
+    return binned[['days_mid', 'review_score']]
+
+
+def test_bin_days_matches_groupby():
+    rng = np.random.default_rng(0)
+    days = rng.integers(-30, 30, 2_000)
+    values = rng.random(2_000)
+    got = cube_ops.bin_days(days, {'value': values})['value']
+
+    window = np.arange(-cube_ops.DAYS_WINDOW, cube_ops.DAYS_WINDOW + 1)
+    expected = pd.Series(values).groupby(days).sum().reindex(window, fill_value=0)
+    assert got == pytest.approx(expected.to_numpy())
+
+
+@pytest.mark.parametrize('states', [None, ['SP'], ['AC', 'RR']])
+def test_binned_charts_match_the_original_groupby(master, states):
+    rows = master if states is None else master[master['customer_state'].isin(states)]
+    per_day = cube_ops.delay_bins(cube_ops.build_cube(rows))
+
+    decay = cube_ops.decay_from_bins(per_day)
+    pd.testing.assert_frame_equal(decay, original_decay(rows), check_dtype=False)
+
+    histogram = cube_ops.histogram_from_bins(per_day)
+    counts = rows['days_difference'].value_counts()
+    assert (histogram['count'].to_numpy() == counts.reindex(histogram['days_difference'], fill_value=0)).all()
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from veridi_auditor.dataset import ID_BYTES, MasterDataset, _pack_ids
+
+
+@pytest.fixture(scope='module')
+def dataset(master):
+    return MasterDataset(master)
+
+
+def _buffers(array):
+    if isinstance(array, pd.Categorical):
+        return [array.codes]
+    if isinstance(array, pd.arrays.IntegerArray):
+        return [array._data, array._mask]
+    return [array]
+
+
+def test_columns_are_read_only(dataset):
+    for name, array in dataset.columns.items():
+        for buffer in _buffers(array):
+            assert not buffer.flags.writeable, name
+            with pytest.raises(ValueError):
+                buffer[:1] = buffer[1:2]
+
+
+def test_order_ids_pack_to_16_bytes_and_decode(master, dataset):
+    packed = dataset.columns['order_id']
+    assert packed.dtype == np.dtype(f'V{ID_BYTES}')
+    assert dataset.order_ids().tolist() == master['order_id'].tolist()
+    rows = np.array([4, 0, 4_999, 17])
+    assert dataset.order_ids(rows).tolist() == master['order_id'].iloc[rows].tolist()
+
+
+@pytest.mark.parametrize('ids', [
+    ['short', 'ids'],
+    ['a' * 2 * ID_BYTES, 'z' * 2 * ID_BYTES],  # right length, not hex
+    ['a' * 2 * ID_BYTES, 'b' * 31],
+])
+def test_ids_that_cannot_be_packed_stay_fixed_width_bytes(master, ids):
+    assert _pack_ids(ids).dtype.kind == 'S'
+    frame = master.head(len(ids)).assign(order_id=ids)
+    assert MasterDataset(frame).order_ids().tolist() == ids
@@ -0,0 +1,227 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from veridi_auditor import cube as cube_ops
+from veridi_auditor.attribution import CategoryAttribution
+from veridi_auditor.engine import METRICS, AuditEngine, _table, write_report
+from veridi_auditor.index import FilterIndex
+
+COLUMNS = {'states': 'customer_state', 'statuses': 'delivery_status', 'categories': 'product_category_en'}
+
+
+def every(values):
+    return values
+
+
+def all_but(*excluded):
+    return lambda values: [v for v in values if v not in excluded]
+
+
+# Selections as the sidebar passes them; a callable picks from the values
+# present in the master table (``all_but`` selects most of them).
+FILTER_SETS = [
+    {},
+    {'states': [], 'statuses': [], 'categories': []},
+    {'states': every, 'statuses': every, 'categories': every},
+    {'states': ['SP', 'RJ', 'MG']},
+    {'statuses': ['Late', 'Super Late'], 'categories': ['bed_bath_table', 'health_beauty', 'toys']},
+    {'states': all_but('SP', 'AC'), 'categories': all_but('bed_bath_table')},
+    {'states': ['BA', 'not_a_state'], 'statuses': all_but('On Time')},
+]
+
+
+def resolve(master, filters):
+    return {key: values(sorted(master[COLUMNS[key]].dropna().unique().tolist())) if callable(values) else values
+            for key, values in filters.items()}
+
+
+def filtered(master, filters):
+    mask = np.ones(len(master), dtype=bool)
+    for key, values in filters.items():
+        mask &= master[COLUMNS[key]].isin(values).to_numpy()
+    return master[mask]
+
+
+def expected_kpis(rows):
+    total = len(rows)
+    late = int((rows['delivery_status'] == 'Late').sum())
+    super_late = int((rows['delivery_status'] == 'Super Late').sum())
+    positive = rows.loc[rows['days_difference'] > 0, 'days_difference']
+    return {
+        'total_orders': total,
+        'late_orders': late,
+        'super_late_orders': super_late,
+        'pct_late': late / total * 100 if total else 0,
+        'pct_super_late': super_late / total * 100 if total else 0,
+        'avg_review': rows['review_score'].mean(),
+        'avg_days_late': positive.mean() if len(positive) else 0,
+        'national_late_rate': rows['is_late'].mean() * 100 if total else np.nan,
+    }
+
+
+def expected_tables(rows):
+    days = rows['days_difference']
+    window = rows[days.abs() <= cube_ops.DAYS_WINDOW]
+    decay_bins = (window['days_difference'] + cube_ops.DAYS_WINDOW) // cube_ops.DECAY_BIN_WIDTH
+    decay = window.groupby(decay_bins)['review_score'].mean()
+
+    def late_rates(column):
+        groups = rows.groupby(column)
+        return pd.DataFrame({'late_rate': groups['is_late'].mean() * 100, 'total_orders': groups.size()})
+
+    months = rows.groupby('purchase_month')
+    return {
+        'status_counts': rows['delivery_status'].value_counts().rename('Count').rename_axis('Status').to_frame(),
+        'delay_histogram': days.value_counts().reindex(
+            range(-cube_ops.DAYS_WINDOW, cube_ops.DAYS_WINDOW + 1), fill_value=0)
+            .rename('count').rename_axis('days_difference').to_frame(),
+        'state_late_rates': late_rates('customer_state'),
+        'category_late_rates': late_rates('product_category_en'),
+        'monthly_trends': pd.DataFrame({'late_rate': months['is_late'].mean() * 100,
+                                        'avg_score': months['review_score'].mean(),
+                                        'order_count': months.size()}),
+        'sentiment_decay': pd.DataFrame({'review_score': decay.to_numpy()}, index=pd.Index(
+            -cube_ops.DAYS_WINDOW + decay.index * cube_ops.DECAY_BIN_WIDTH + cube_ops.DECAY_BIN_WIDTH / 2,
+            name='days_mid')),
+    }
+
+
+def assert_table(got, expected):
+    """``got`` (a metric's frame) holds ``expected``'s rows, in any order."""
+    got = got.set_index(expected.index.name)[list(expected.columns)]
+    got.index = got.index.astype(object)
+    expected = expected.copy()
+    expected.index = expected.index.astype(object)
+    pd.testing.assert_frame_equal(got.sort_index(), expected.sort_index(), check_dtype=False,
+                                  check_index_type=False, check_categorical=False)
+
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS)
+def test_filter_index_matches_isin(master, filters):
+    filters = resolve(master, filters)
+    index = FilterIndex(master, list(COLUMNS.values()))
+    selection = index.select(**{COLUMNS[key]: values for key, values in filters.items()})
+    rows = filtered(master, filters)
+
+    assert (selection.row_ids == np.flatnonzero(master.index.isin(rows.index))).all()
+    assert len(selection) == len(rows) and selection.empty == rows.empty
+    pd.testing.assert_frame_equal(selection.frame(['order_id', 'days_difference']).reset_index(drop=True),
+                                  rows[['order_id', 'days_difference']].reset_index(drop=True))
+
+
+def test_filter_index_complements_majority_selections(master):
+    index = FilterIndex(master, ['customer_state', 'product_category_en'])
+    categories = index.dimensions['product_category_en']
+    assert categories.has_nulls and not index.dimensions['customer_state'].has_nulls
+
+    # Every value: no constraint without nulls, the non-null rows with them.
+    assert index.dimensions['customer_state'].union(index.dimensions['customer_state'].values) is None
+    everything = np.unpackbits(categories.union(categories.values), count=len(master)).astype(bool)
+    assert (everything == master['product_category_en'].notna().to_numpy()).all()
+
+    # More than half the values: the complement is OR-ed and subtracted.
+    selected = list(categories.values[3:])
+    assert len(selected) * 2 > len(categories.values)
+    got = np.unpackbits(categories.union(selected), count=len(master)).astype(bool)
+    assert (got == master['product_category_en'].isin(selected).to_numpy()).all()
+
+
+@pytest.fixture(scope='module')
+def cube(master):
+    return cube_ops.build_cube(master)
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS)
+def test_cube_metrics_match_groupby(master, cube, filters):
+    # The cube helpers take all three selections (``filter_cube``).
+    filters = resolve(master, {key: every for key in COLUMNS} | filters)
+    cells = cube_ops.filter_cube(cube, filters['states'], filters['statuses'], filters['categories'])
+    rows = filtered(master, filters)
+    expected = expected_tables(rows)
+
+    kpis = cube_ops.kpis(cells)
+    assert kpis == pytest.approx({k: v for k, v in expected_kpis(rows).items() if k in kpis}, nan_ok=True)
+    assert cube_ops.national_late_rate(cells) == pytest.approx(expected_kpis(rows)['national_late_rate'],
+                                                               nan_ok=True)
+    assert_table(cube_ops.status_counts(cells), expected['status_counts'])
+    assert_table(cube_ops.delay_histogram(cells), expected['delay_histogram'])
+    assert_table(cube_ops.late_rate_by(cells, 'customer_state'), expected['state_late_rates'])
+    assert_table(cube_ops.late_rate_by(cells, 'product_category_en'), expected['category_late_rates'])
+    assert_table(cube_ops.monthly_trends(cells), expected['monthly_trends'])
+    assert_table(cube_ops.sentiment_decay(cells), expected['sentiment_decay'])
+
+
+
+@pytest.fixture(scope='module')
+def engine(master):
+    return AuditEngine(master)
+
+
+@pytest.mark.parametrize('filters', FILTER_SETS)
+def test_audit_metrics_match_groupby(master, engine, filters):
+    filters = resolve(master, filters)
+    audit = engine.select(**filters)
+    rows = filtered(master, filters)
+    expected = expected_tables(rows)
+
+    assert audit.kpis() == pytest.approx(expected_kpis(rows), nan_ok=True)
+    assert_table(audit.status_counts(), expected['status_counts'])
+    assert_table(audit.delay_histogram(), expected['delay_histogram'])
+    assert_table(audit.state_late_rates(), expected['state_late_rates'])
+    assert_table(audit.sentiment_decay(), expected['sentiment_decay'])
+
+    categories = expected['category_late_rates']
+    categories = categories[categories['total_orders'] >= 5]
+    assert_table(audit.category_late_rates(top_n=len(categories), min_orders=5), categories)
+    months = expected['monthly_trends']
+    assert_table(audit.monthly_trends(min_orders=10), months[months['order_count'] > 10])
+
+
+
+@pytest.mark.parametrize('filters', [{}, {'states': ['AC', 'RR']}, {'states': []}])
+def test_write_report_round_trips(tmp_path, engine, filters):
+    report = engine.select(**filters).report()
+
+    write_report(report, str(tmp_path / 'report.json'))
+    document = json.loads((tmp_path / 'report.json').read_text())
+    assert document['kpis'] == pytest.approx({k: None if v != v else v for k, v in report['kpis'].items()})
+    for name in METRICS:
+        expected = _table(report[name])
+        got = pd.DataFrame.from_records(document[name], columns=list(expected.columns))
+        pd.testing.assert_frame_equal(got, expected, check_dtype=False, obj=name)
+
+    write_report(report, str(tmp_path / 'parquet'), fmt='parquet')
+    kpis = pd.read_parquet(tmp_path / 'parquet' / 'kpis.parquet').iloc[0].to_dict()
+    assert kpis == pytest.approx(report['kpis'], nan_ok=True)
+    for name in METRICS:
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / 'parquet' / f'{name}.parquet'),
+                                      _table(report[name]), check_dtype=False, obj=name)
+
+
+def _weights(master, weight=1.0):
+    weights = master[['order_id', 'product_category_en']].dropna().reset_index(drop=True)
+    weights['weight'] = weight
+    return weights
+
+
+def _engine(master, weights=None):
+    engine = AuditEngine(master)
+    if weights is not None:
+        engine.attribution = CategoryAttribution(weights, engine.dataset)
+    return engine
+
+
+def test_version_follows_columns_the_cube_leaves_out_and_the_weights(master):
+    master = master.head(1_000)
+    version = _engine(master, _weights(master)).version
+    assert _engine(master, _weights(master)).version == version
+
+    renamed = master.assign(customer_city=master['customer_city'].iloc[::-1].to_numpy())
+    assert AuditEngine(renamed).cube.equals(AuditEngine(master).cube)
+    assert _engine(renamed, _weights(master)).version != version
+    assert _engine(master, _weights(master, weight=0.5)).version != version
+    assert _engine(master).version != version
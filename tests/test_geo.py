@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from veridi_auditor.dataset import MasterDataset
+from veridi_auditor.geo import PERCENTILES, CityAggregate
+
+
+@pytest.fixture(scope='module')
+def aggregate(master):
+    return CityAggregate(MasterDataset(master))
+
+
+def expected_rates(master, state, statuses, categories, min_orders):
+    rows = master[master['customer_state'] == state]
+    if statuses is not None:
+        rows = rows[rows['delivery_status'].isin(statuses)]
+    if categories is not None:
+        rows = rows[rows['product_category_en'].isin(categories)]
+    groups = rows.groupby('customer_city', observed=True)
+    frame = pd.DataFrame({
+        'late_rate': groups['is_late'].mean() * 100,
+        'total_orders': groups.size(),
+        'avg_score': groups['review_score'].mean(),
+        **{name: groups['days_difference'].agg(lambda d, q=q: np.quantile(d, q, method='inverted_cdf'))
+           for name, q in PERCENTILES.items()},
+    }).reset_index()
+    frame = frame[frame['total_orders'] >= min_orders]
+    return frame.sort_values(['late_rate', 'total_orders', 'customer_city'],
+                             ascending=[False, False, True]).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('statuses, categories, min_orders', [
+    (None, None, 1),
+    (None, None, 20),
+    (['On Time', 'Late'], ['bed_bath_table', 'health_beauty', 'sports_leisure'], 1),
+])
+@pytest.mark.parametrize('state', ['SP', 'RJ', 'AC'])
+def test_late_rates_match_groupby(aggregate, master, state, statuses, categories, min_orders):
+    got = aggregate.late_rates(state, statuses=statuses, categories=categories, min_orders=min_orders)
+    expected = expected_rates(master, state, statuses, categories, min_orders)
+    assert got['rank'].tolist() == list(range(1, len(expected) + 1))
+    assert got['customer_city'].astype(str).tolist() == expected['customer_city'].astype(str).tolist()
+    for column in ['late_rate', 'total_orders', 'avg_score', *PERCENTILES]:
+        np.testing.assert_allclose(got[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   err_msg=column)
+
+
+def test_state_summary_matches_groupby(aggregate, master):
+    rows = master[master['customer_state'] == 'SP']
+    summary = aggregate.state_summary('SP')
+    assert summary['total_orders'] == len(rows)
+    assert summary['late_rate'] == pytest.approx(rows['is_late'].mean() * 100)
+    assert summary['avg_score'] == pytest.approx(rows['review_score'].mean())
+    assert summary['p90'] == np.quantile(rows['days_difference'], 0.9, method='inverted_cdf')
+    assert summary['cities'] == rows['customer_city'].nunique()
+    assert aggregate.state_summary('XX') is None
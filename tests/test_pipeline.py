@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from tests.conftest import canonical, write_tables
+from veridi_auditor.pipeline import LOOKUP_DB, STATE_FILE, MasterStore, build_master, category_weights, refresh
+
+INCREMENTAL = ('orders', 'reviews', 'items')
+
+
+def full_build(sources):
+    return canonical(build_master(*(sources[name] for name in
+                                    ('orders', 'customers', 'reviews', 'items', 'products', 'translation'))))
+
+
+def split_drop(sources, later):
+    """``sources`` as a first drop and a second one with the orders in ``later``."""
+    first, second = dict(sources), {}
+    for name in INCREMENTAL:
+        in_later = sources[name]['order_id'].isin(later)
+        first[name], second[name] = sources[name][~in_later], sources[name][in_later]
+    return first, second
+
+
+def test_refresh_matches_full_build(tmp_path, sources):
+    source_dir = tmp_path / 'sources'
+    source_dir.mkdir()
+    write_tables(source_dir, sources)
+    refresh(source_dir, tmp_path / 'store')
+    assert canonical(MasterStore(tmp_path / 'store').read_all()).equals(full_build(sources))
+
+
+def test_refresh_takes_late_arriving_drop(tmp_path, sources):
+    # The second drop holds a random third of the orders, so most of its rows
+    # are older than the watermark the first refresh leaves behind.
+    orders = sources['orders']['order_id']
+    later = orders[np.random.default_rng(0).random(len(orders)) < 1 / 3]
+    first, second = split_drop(sources, later)
+    source_dir = tmp_path / 'sources'
+    source_dir.mkdir()
+    write_tables(source_dir, first)
+    refresh(source_dir, tmp_path / 'store')
+    write_tables(source_dir, second, suffix='_2')
+    summary = refresh(source_dir, tmp_path / 'store')
+
+    assert summary['orders_changed'] == len(later)
+    assert canonical(MasterStore(tmp_path / 'store').read_all()).equals(full_build(sources))
+
+
+def test_refresh_without_new_files_changes_nothing(tmp_path, sources):
+    source_dir, store_dir = tmp_path / 'sources', tmp_path / 'store'
+    source_dir.mkdir()
+    write_tables(source_dir, sources)
+    refresh(source_dir, store_dir)
+    files = [store_dir / LOOKUP_DB, store_dir / STATE_FILE]
+    before = [(path.read_bytes(), path.stat().st_mtime_ns) for path in files]
+
+    summary = refresh(source_dir, store_dir)
+    assert summary['orders_changed'] == 0
+    assert summary['partitions_rewritten'] == 0
+    assert [(path.read_bytes(), path.stat().st_mtime_ns) for path in files] == before
+    assert pd.Index(MasterStore(store_dir).read_all()['order_id']).is_unique
+
+
+def test_refresh_takes_customers_arriving_after_their_orders(tmp_path, sources):
+    customers = sources['customers']
+    later = customers[np.random.default_rng(1).random(len(customers)) < 1 / 4]
+    first = {**sources, 'customers': customers.drop(later.index)}
+    source_dir = tmp_path / 'sources'
+    source_dir.mkdir()
+    write_tables(source_dir, first)
+    refresh(source_dir, tmp_path / 'store')
+    write_tables(source_dir, {'customers': later}, suffix='_2')
+    summary = refresh(source_dir, tmp_path / 'store')
+
+    assert summary['orders_changed'] == 0 and summary['rows_upserted'] > 0
+    assert canonical(MasterStore(tmp_path / 'store').read_all()).equals(full_build(sources))
+
+
+def test_store_reads_partitions_with_different_dictionary_widths(tmp_path, master):
+    # One month with over 127 cities is written with int16 indices, another with int8.
+    store = MasterStore(tmp_path / 'store')
+    months = master['purchase_month'].astype(str)
+    busy = master[months == months.value_counts().index[0]]
+    quiet = master[months != busy['purchase_month'].iloc[0]].head(3)
+    assert busy['customer_city'].nunique() > 127
+    for part in (quiet, busy):
+        store.write_partition(part['purchase_month'].iloc[0], part)
+
+    stored = canonical(store.read_all())
+    expected = canonical(pd.concat([quiet, busy])[stored.columns])
+    assert stored.drop(columns='purchase_month').equals(expected.drop(columns='purchase_month'))
+
+
+def test_refresh_keeps_items_of_orders_split_across_drops(tmp_path, sources):
+    # A random 40% of the item lines arrive in a later drop, splitting most multi-item orders.
+    items = sources['items']
+    later = np.random.default_rng(2).random(len(items)) < 0.4
+    source_dir = tmp_path / 'sources'
+    source_dir.mkdir()
+    write_tables(source_dir, {**sources, 'items': items[~later]})
+    refresh(source_dir, tmp_path / 'store')
+    write_tables(source_dir, {'items': items[later]}, suffix='_2')
+    refresh(source_dir, tmp_path / 'store')
+
+    # The reference reads the drops in file order, as a full rebuild would.
+    dropped = {**sources, 'items': pd.concat([items[~later], items[later]])}
+    assert canonical(MasterStore(tmp_path / 'store').read_all()).equals(full_build(dropped))
+    stored = MasterStore(tmp_path / 'store').load_lookup('category_weights')
+    expected = category_weights(dropped['items'], sources['products'], sources['translation'])
+    key = ['order_id', 'product_category_en']
+    stored, expected = (frame.sort_values(key).reset_index(drop=True) for frame in (stored, expected))
+    assert stored[key].astype(object).equals(expected[key].astype(object))
+    np.testing.assert_allclose(stored['weight'], expected['weight'])
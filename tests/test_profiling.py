@@ -0,0 +1,25 @@
+import time
+
+from veridi_auditor.profiling import Profiler
+
+
+def test_interrupted_run_is_recorded_up_to_its_last_stage():
+    profiler = Profiler()
+    profiler.begin('rerun')
+    with profiler.stage('load_data'):
+        pass
+    time.sleep(0.05)  # idle until the next rerun starts
+    profiler.begin('rerun')
+    profiler.end()
+
+    interrupted, finished = profiler.runs
+    assert interrupted['interrupted'] and not finished['interrupted']
+    assert [stage['stage'] for stage in interrupted['stages']] == ['load_data']
+    assert interrupted['seconds'] < 0.05
+    assert profiler.run_totals['rerun']['runs'] == 2
+
+
+def test_end_without_begin_records_nothing():
+    profiler = Profiler()
+    assert profiler.end() is None
+    assert not profiler.runs
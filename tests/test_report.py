@@ -0,0 +1,27 @@
+import pytest
+
+from veridi_auditor.engine import METRICS, AuditEngine
+from veridi_auditor.report import scenarios
+
+
+@pytest.fixture(scope='module')
+def engine(master):
+    return AuditEngine(master)
+
+
+@pytest.mark.parametrize('by, base', [
+    ('state', {}),
+    ('region', {}),
+    ('state', {'statuses': ['Late', 'Super Late']}),
+    ('region', {'states': ['SP', 'RJ', 'BA'], 'categories': ['bed_bath_table', 'health_beauty']}),
+])
+def test_scenarios_match_select(engine, by, base):
+    split = scenarios(engine, by, **base)
+    assert split
+    for label, audit in split:
+        expected = engine.select(**audit.filters)
+        assert (audit.rows == expected.rows).all(), label
+        assert audit.kpis() == pytest.approx(expected.kpis(), nan_ok=True), label
+        got_tables, expected_tables = audit.report(), expected.report()
+        assert all(got_tables[m].equals(expected_tables[m]) for m in METRICS if m in expected_tables), label
+    assert sum(audit.scanned for _, audit in split) <= engine.select(**base).scanned
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from veridi_auditor.cube import DAYS_WINDOW
+from veridi_auditor.engine import AuditEngine
+from veridi_auditor.sketch import QUANTILES, build_summaries
+
+SELECTIONS = [
+    {},
+    {'states': ['SP']},
+    {'states': ['SP', 'RJ'], 'categories': ['bed_bath_table', 'health_beauty', 'toys']},
+    {'statuses': ['Late', 'Super Late']},
+]
+
+
+@pytest.fixture(scope='module')
+def engine(master):
+    return AuditEngine(master)
+
+
+@pytest.fixture(scope='module')
+def summaries(master):
+    # Small sample sizes so the histogram estimate is sampled, not exact.
+    return build_summaries(master, k=32, sample_size=8, sample_fraction=0.05)
+
+
+def selected(master, states=None, statuses=None, categories=None):
+    mask = np.ones(len(master), dtype=bool)
+    for column, values in (('customer_state', states), ('delivery_status', statuses),
+                           ('product_category_en', categories)):
+        if values is not None:
+            mask &= master[column].isin(values).to_numpy()
+    return master[mask]
+
+
+def test_samples_take_a_fraction_of_large_strata(summaries):
+    strata = summaries.strata
+    expected = np.minimum(strata['n_orders'], np.maximum(8, np.ceil(0.05 * strata['n_orders'])))
+    assert (strata['n_sampled'] == expected).all()
+    assert (strata['n_sampled'] > 8).any()
+    counts = summaries.samples['stratum'].value_counts().reindex(strata.index, fill_value=0)
+    assert (counts.to_numpy() == strata['n_sampled'].to_numpy()).all()
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_counters_match_the_exact_audit(engine, summaries, selection):
+    approx, exact = summaries.select(**selection), engine.select(**selection)
+    for approx_table, exact_table, key in (
+            (approx.state_late_rates(), exact.state_late_rates(), 'customer_state'),
+            (approx.category_late_rates(top_n=100, min_orders=1),
+             exact.category_late_rates(top_n=100, min_orders=1), 'product_category_en'),
+            (approx.monthly_trends(min_orders=0), exact.monthly_trends(min_orders=0), 'purchase_month')):
+        columns = [c for c in exact_table.columns if c != key]
+        pd.testing.assert_frame_equal(approx_table.set_index(key)[columns].sort_index(),
+                                      exact_table.set_index(key)[columns].sort_index(),
+                                      check_dtype=False, check_index_type=False, check_categorical=False)
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+@pytest.mark.parametrize('dim', [None, 'customer_state'])
+def test_quantiles_lie_within_their_rank_bound(master, summaries, selection, dim):
+    rows = selected(master, **selection)
+    quantiles = summaries.select(**selection).delay_quantiles(dim)
+    groups = [('all', rows)] if dim is None else list(rows.groupby(dim))
+    assert len(quantiles) == len(groups)
+    for (_, days), (_, estimate) in zip(groups, quantiles.iterrows()):
+        days = np.sort(days['days_difference'].to_numpy())
+        error = estimate['rank_error'] + 1 / len(days)
+        for q in QUANTILES:
+            value = estimate[f'p{round(q * 100):d}']
+            # The estimate's rank range in the exact delays overlaps [q - e, q + e].
+            below = np.searchsorted(days, value, side='left') / len(days)
+            upto = np.searchsorted(days, value, side='right') / len(days)
+            assert below <= q + error and upto >= q - error, (q, value)
+
+
+@pytest.mark.parametrize('selection', SELECTIONS)
+def test_histogram_lies_within_its_standard_errors(master, engine, summaries, selection):
+    estimate = summaries.select(**selection).delay_histogram()
+    exact = engine.select(**selection).delay_histogram()
+    assert (estimate['days_difference'] == exact['days_difference']).all()
+    assert (estimate['days_difference'].abs() <= DAYS_WINDOW).all()
+    error = np.abs(estimate['count'] - exact['count'])
+    # Fully sampled bins are exact; the rest lie within their 99% interval.
+    assert (error <= 2.576 * estimate['count_se'] + 1e-6).all()
+    assert estimate['count'].sum() == pytest.approx(exact['count'].sum(), rel=0.1)
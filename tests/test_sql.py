@@ -0,0 +1,48 @@
+import pytest
+
+from veridi_auditor import sql
+from veridi_auditor.engine import METRICS, AuditEngine
+from veridi_auditor.report import write_reports
+from veridi_auditor.storage import write_master
+
+FILTERS = [
+    {},
+    {'states': ['SP', 'RJ']},
+    {'statuses': ['Late', 'Super Late'], 'categories': ['bed_bath_table', 'health_beauty']},
+    {'states': []},
+]
+
+
+@pytest.fixture(scope='module')
+def engine(master):
+    return AuditEngine(master)
+
+
+@pytest.fixture(scope='module', params=sql.BACKENDS)
+def sql_engine(request, master, tmp_path_factory):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    # A quote in the path must survive the SQL that scans it.
+    path = tmp_path_factory.mktemp("o'brien") / 'veridi_master_clean.parquet'
+    write_master(master, str(path))
+    return sql.SQLEngine(str(path), backend=request.param)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_sql_matches_in_memory(engine, sql_engine, filters):
+    expected, got = engine.select(**filters), sql_engine.select(**filters)
+    assert got.empty == expected.empty
+    if expected.empty:
+        return
+    assert got.kpis() == pytest.approx(expected.kpis(), nan_ok=True)
+    expected_tables, got_tables = expected.report(), got.report()
+    for metric in METRICS:
+        if metric in expected_tables:
+            assert got_tables[metric].equals(expected_tables[metric]), metric
+    assert got.filters == expected.filters
+
+
+def test_sql_reports_are_written(sql_engine, tmp_path):
+    summary = write_reports(sql_engine, str(tmp_path), formats=['csv'])
+    assert (tmp_path / 'kpis.csv').exists()
+    assert summary
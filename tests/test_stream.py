@@ -0,0 +1,37 @@
+from veridi_auditor.stream import RollingAggregator, StreamMonitor, read_events, write_events
+from veridi_auditor.synthetic import make_events
+
+
+def test_bad_events_are_counted_not_raised():
+    aggregator = RollingAggregator()
+    aggregator.apply({'event': 'order_delivered', 'order_id': 'x'})
+    aggregator.apply({'event': 'review_created', 'order_id': 'x', 'review_score': 'five',
+                      'review_creation_date': '2018-01-01'})
+    aggregator.apply(None)
+    aggregator.apply({'event': 'order_delivered', 'order_id': 'y',
+                      'order_delivered_customer_date': '2018-01-03',
+                      'order_estimated_delivery_date': '2018-01-01'})
+    stats = aggregator.stats()
+    assert stats['malformed'] == 3
+    assert stats['events'] == 1
+    assert stats['orders_remembered'] == 1
+
+
+def test_monitor_survives_bad_lines(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    events = make_events(200, seed=1)
+    write_events(events[:100], path)
+    with open(path, 'a') as f:
+        f.write('not json\n{"event": "order_delivered", "order_id": "x"}\n')
+    write_events(events[100:], path)
+
+    reference = RollingAggregator()
+    reference.consume(events)
+    monitor = StreamMonitor(lambda stop: read_events(path, stop=stop)).start()
+    monitor._thread.join(timeout=10)
+
+    assert monitor.error is None
+    assert monitor.aggregator.stats()['malformed'] == 2
+    assert monitor.aggregator.events == reference.events
+    assert monitor.aggregator.snapshot('day').equals(reference.snapshot('day'))
+
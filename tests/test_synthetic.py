@@ -0,0 +1,35 @@
+import io
+
+import pandas as pd
+import pytest
+
+from veridi_auditor.pipeline import build_master
+from veridi_auditor.synthetic import (SOURCE_FILES, _chunk_seed, make_products, make_sources, n_products_for,
+                                      write_sources)
+
+TABLES = ('orders', 'customers', 'reviews', 'items', 'products', 'translation')
+
+
+def as_csv(table):
+    """``table`` as it reads back from CSV."""
+    return pd.read_csv(io.StringIO(table.to_csv(index=False)))
+
+
+@pytest.mark.parametrize('chunk_orders', [1_000, 5_000])
+def test_write_sources_matches_make_sources_per_chunk(tmp_path, chunk_orders):
+    n_orders, seed = 2_500, 11
+    paths = write_sources(tmp_path, n_orders, seed=seed, chunk_orders=chunk_orders)
+    written = {name: pd.read_csv(paths[name]) for name in SOURCE_FILES}
+
+    products = make_products(n_products_for(n_orders), seed=seed)
+    chunks = [make_sources(min(chunk_orders, n_orders - start), seed=_chunk_seed(seed, chunk), products=products)
+              for chunk, start in enumerate(range(0, n_orders, chunk_orders))]
+    expected = {name: pd.concat([chunk[name] for chunk in chunks], ignore_index=True)
+                for name in ('orders', 'customers', 'items', 'reviews')}
+    expected.update(products=products, translation=chunks[0]['translation'])
+    for name in SOURCE_FILES:
+        pd.testing.assert_frame_equal(written[name], as_csv(expected[name]), obj=name)
+
+    assert written['orders']['order_id'].is_unique and written['customers']['customer_id'].is_unique
+    master = build_master(*(written[name] for name in TABLES))
+    assert len(master) == (written['orders']['order_status'] == 'delivered').sum()
@@ -0,0 +1,66 @@
+import ast
+import os
+
+import pytest
+
+from veridi_auditor.engine import TOP_N, AuditEngine
+from veridi_auditor.figcache import FigureCache
+from veridi_auditor.figures import figure_key
+from veridi_auditor.warmup import Warmer, combinations
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+# What the dashboard's widgets hold before anyone touches them.
+INITIAL_WIDGETS = {'top_n': TOP_N, 'weighted': False}
+
+
+class RecordingCache(FigureCache):
+    """Records the keys primed instead of building the figures."""
+
+    def __init__(self):
+        super().__init__(max_bytes=0)
+        self.keys = set()
+
+    def prime(self, key, build):
+        self.keys.add(key)
+        return True
+
+
+def app_charts():
+    """``(name, params)`` of every ``show_chart`` call in app.py, at the widgets' initial values."""
+    with open(APP) as f:
+        tree = ast.parse(f.read())
+    charts = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'show_chart':
+            params = {kw.arg: ast.literal_eval(kw.value) if isinstance(kw.value, ast.Constant)
+                      else INITIAL_WIDGETS.get(kw.arg) for kw in node.keywords}
+            charts.append((node.args[0].value, params))
+    return charts
+
+
+@pytest.fixture(scope='module')
+def engine(master):
+    return AuditEngine(master.head(2_000))
+
+
+def test_warmed_keys_are_the_keys_the_dashboard_looks_up(engine):
+    cache = RecordingCache()
+    warmer = Warmer(cache)
+    try:
+        assert warmer.ensure(engine)
+        assert warmer.wait(timeout=60)
+        assert not warmer.progress()['errors']
+    finally:
+        warmer.shutdown()
+
+    # The city drill-down is built on demand, for the state opened in it, and
+    # the dashboard stops before any chart when the selection is empty.
+    charts = [(name, params) for name, params in app_charts() if name != 'city_late_rate']
+    assert len(charts) == len(warmer.figures)
+    selections = [selection for _, selection in combinations(engine) if not engine.select(**selection).empty]
+    looked_up = {figure_key(name, engine.version, selection['states'], selection['statuses'],
+                            selection['categories'], approximate=False, summaries_version='summaries',
+                            **params)
+                 for selection in selections for name, params in charts}
+    assert cache.keys == looked_up
@@ -0,0 +1,21 @@
+"""Veridi Logistics auditor: data access and analytics behind the Streamlit dashboard."""
+
+from veridi_auditor.engine import AuditEngine
+from veridi_auditor.storage import (
+    DASHBOARD_COLUMNS,
+    MASTER_COLUMNAR,
+    MASTER_CSV,
+    load_master,
+    read_master,
+    write_master,
+)
+
+__all__ = [
+    "AuditEngine",
+    "DASHBOARD_COLUMNS",
+    "MASTER_COLUMNAR",
+    "MASTER_CSV",
+    "load_master",
+    "read_master",
+    "write_master",
+]
@@ -0,0 +1,118 @@
+"""Weighted category attribution: orders spread over all their item categories.
+
+The master table keeps one category per order, that of its first
+categorised item, so a category that often sells second in multi-item orders
+is under-counted. The pipeline also keeps a lookup of every order's item
+categories with weights (each category's share of the order's categorised
+items, summing to 1; see ``pipeline.category_weights``). When exporting the
+master it writes that lookup next to it as ``<master>.categories.parquet``.
+
+``CategoryAttribution`` lines the lookup up with a ``MasterDataset`` once.
+It holds the master row, category code and weight of each (order,
+category) pair, plus the state, status and late flag of that row. The
+weighted late rate per category is then one pair of weighted
+``np.bincount`` calls over the pairs that pass the filters. The master
+table is never exploded to one row per item.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from veridi_auditor.dataset import _pack_ids
+from veridi_auditor.storage import MASTER_COLUMNAR
+
+CATEGORY_WEIGHTS_SUFFIX = '.categories.parquet'
+WEIGHT_COLUMNS = ['order_id', 'product_category_en', 'weight']
+
+
+def category_weights_path(master_path=MASTER_COLUMNAR):
+    """Where the category weights of the master file at ``master_path`` live."""
+    return os.path.splitext(master_path.rstrip('/'))[0] + CATEGORY_WEIGHTS_SUFFIX
+
+
+def write_category_weights(weights, path):
+    """Write the weights lookup to ``path`` atomically."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    table = pa.Table.from_pandas(weights[WEIGHT_COLUMNS].reset_index(drop=True), preserve_index=False)
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _id_index(ids):
+    """Packed ids as a hashable index (16-byte ids viewed as fixed-width bytes)."""
+    return pd.Index(ids.view(f'S{ids.dtype.itemsize}') if ids.dtype.kind == 'V' else ids)
+
+
+class CategoryAttribution:
+    """Category weights aligned with the rows of one ``MasterDataset``.
+
+    Pairs whose order is not in the dataset are dropped. Everything is
+    read-only and built once, like the engine's other shared arrays.
+    """
+
+    def __init__(self, weights, dataset):
+        rows = _id_index(dataset.columns['order_id']).get_indexer(
+            _id_index(_pack_ids(weights['order_id'])))
+        kept = rows >= 0
+        codes, labels = pd.factorize(weights['product_category_en'].to_numpy()[kept], sort=True)
+        self.labels = pd.Index(labels, name='product_category_en')
+        self.rows = rows[kept].astype(np.int32)
+        self.category = codes.astype(np.min_scalar_type(-max(len(labels), 1)))
+        self.weight = weights['weight'].to_numpy(dtype=float)[kept]
+        self.late = np.asarray(dataset.columns['is_late'], dtype=bool)[self.rows]
+        self.filter_codes, self.filter_labels = {}, {}
+        for dim in ('customer_state', 'delivery_status'):
+            column = pd.Categorical(dataset.columns[dim])
+            self.filter_codes[dim] = np.asarray(column.codes)[self.rows]
+            self.filter_labels[dim] = pd.Index(column.categories)
+        for array in (self.rows, self.category, self.weight, self.late, *self.filter_codes.values()):
+            array.flags.writeable = False
+
+    @classmethod
+    def load(cls, path, dataset):
+        return cls(pq.read_table(path, columns=WEIGHT_COLUMNS).to_pandas(), dataset)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.rows, self.category, self.weight, self.late,
+                                      *self.filter_codes.values()))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _allowed(self, dim, values):
+        """Whether each pair's ``dim`` value is in ``values`` (missing values never are)."""
+        allowed = np.zeros(len(self.filter_labels[dim]) + 1, dtype=bool)  # last slot: code -1
+        positions = self.filter_labels[dim].get_indexer(list(values))
+        allowed[positions[positions >= 0]] = True
+        return allowed[self.filter_codes[dim]]
+
+    def late_rates(self, states=None, statuses=None, categories=None):
+        """Weighted late rate (%) and order volume per category.
+
+        ``states`` and ``statuses`` filter the orders, and ``categories``
+        filters the attributed categories. ``None`` keeps everything.
+        ``total_orders`` is each category's weighted order count.
+        """
+        keep = np.ones(len(self.rows), dtype=bool)
+        if states is not None:
+            keep &= self._allowed('customer_state', states)
+        if statuses is not None:
+            keep &= self._allowed('delivery_status', statuses)
+        if categories is not None:
+            wanted = self.labels.get_indexer(list(categories))
+            keep &= np.isin(self.category, wanted[wanted >= 0])
+        codes, weight = self.category[keep], self.weight[keep]
+        orders = np.bincount(codes, weights=weight, minlength=len(self.labels))
+        late = np.bincount(codes, weights=weight * self.late[keep], minlength=len(self.labels))
+        present = orders > 0
+        return pd.DataFrame({
+            'product_category_en': self.labels[present],
+            'late_rate': late[present] / orders[present] * 100,
+            'total_orders': orders[present],
+        })
@@ -0,0 +1,364 @@
+"""Bounded-memory, multi-core full build of the Veridi master table.
+
+``pipeline.build_master`` (and the notebook) load the orders, reviews and
+items tables into pandas whole before merging, on one core, so the build box
+needs RAM for all of them at once. This module produces the same rows as a
+hash-partitioned build whose peak memory is set by ``chunk_rows`` and
+``partitions`` rather than by the size of the input:
+
+1. Scatter: the sources are streamed in ``chunk_rows`` chunks and split into
+   ``partitions`` spill files, reviews and items by a hash of ``order_id``,
+   orders and customers by a hash of ``customer_id``. Every row lands in its
+   partition in input order.
+2. Customer join: each ``customer_id`` partition joins its orders with its
+   customers and re-spills the result by ``order_id``.
+3. Order build: each ``order_id`` partition runs the notebook's cleaning and
+   merges. Because a partition holds *all* reviews and items of its orders,
+   "latest review per order" and "first categorised item per order" computed
+   inside it are the global answers.
+
+Only products and the category translation stay resident. Roughly, peak
+memory per worker is those plus the larger of one chunk and one partition
+(about ``total rows / partitions``). The partitions of each step are
+independent and run in a pool of ``workers`` processes; the output depends
+only on the inputs and ``partitions``, so it is byte-for-byte the same for
+any worker count.
+
+    python -m veridi_auditor.chunked --source-dir data/ --output veridi_master_clean.parquet \\
+        --chunk-rows 500000 --partitions 64 --workers 8
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from veridi_auditor.pipeline import (
+    LATE_AFTER_DAYS,
+    SUPER_LATE_AFTER_DAYS,
+    _assemble,
+    _source_files,
+    dedup_reviews,
+    derive_delivery_columns,
+    first_categories,
+    read_dimension,
+)
+from veridi_auditor.profiling import PROFILER
+from veridi_auditor.storage import MASTER_COLUMNS, to_master_table
+
+CHUNK_ROWS = 500_000
+PARTITIONS = 32
+
+# Columns of the partitioned sources that the build uses; the rest is never parsed.
+SCATTER_COLUMNS = {
+    'orders': ['order_id', 'customer_id', 'order_status', 'order_purchase_timestamp',
+               'order_estimated_delivery_date', 'order_delivered_customer_date'],
+    'customers': ['customer_id', 'customer_state', 'customer_city'],
+    'reviews': ['order_id', 'review_creation_date', 'review_score'],
+    'items': ['order_id', 'product_id'],
+}
+
+SCATTER_KEYS = {
+    'orders': 'customer_id',
+    'customers': 'customer_id',
+    'reviews': 'order_id',
+    'items': 'order_id',
+}
+
+# Fixed dtypes so every chunk of a source spills with the same schema.
+SCATTER_DTYPES = {
+    'orders': str,
+    'customers': str,
+    'reviews': {'order_id': str, 'review_creation_date': str, 'review_score': 'float64'},
+    'items': str,
+}
+# Arrow types of the spill files, declared rather than inferred per chunk: a
+# column that is all-null in one chunk would otherwise get the null type.
+SCATTER_SCHEMAS = {
+    name: pa.schema([(c, pa.float64() if c == 'review_score' else pa.string()) for c in columns])
+    for name, columns in SCATTER_COLUMNS.items()
+}
+JOINED_SCHEMA = pa.schema(list(SCATTER_SCHEMAS['orders'])
+                          + [f for f in SCATTER_SCHEMAS['customers'] if f.name != 'customer_id'])
+
+JOINED_DIR = 'orders_joined'
+PART_COLUMN = '_part'
+
+
+def partition_of(keys, partitions):
+    """Stable partition number of each key (the same in every process)."""
+    hashes = pd.util.hash_array(pd.Series(keys, dtype=object).to_numpy(), categorize=False)
+    return (hashes % partitions).astype('int64')
+
+
+def _split(table, parts):
+    """``(part, rows)`` pairs of ``table``, keeping input order within each part."""
+    order = np.argsort(parts, kind='stable')
+    table, parts = table.take(order), parts[order]
+    bounds = np.flatnonzero(np.diff(parts)) + 1
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(parts)]):
+        yield int(parts[start]), table.slice(start, stop - start)
+
+
+def _spill_path(spill_dir, part):
+    return os.path.join(spill_dir, f"part-{part:05d}.parquet")
+
+
+def read_chunks(source_dir, name, chunk_rows=CHUNK_ROWS):
+    """Yield ``chunk_rows``-row frames of every file of a partitioned source."""
+    files = _source_files(source_dir, name)
+    if not files:
+        raise FileNotFoundError(f"no files for source {name!r} in {source_dir}")
+    for path in files:
+        yield from pd.read_csv(path, usecols=SCATTER_COLUMNS[name], dtype=SCATTER_DTYPES[name],
+                               chunksize=chunk_rows)
+
+
+def scatter(chunks, spill_dir, key, partitions, schema):
+    """Append each chunk's rows to per-partition Parquet spill files by ``key``.
+
+    Every chunk is converted with ``schema`` rather than the types inferred from
+    its own values, so all spill files of a source agree. Returns the number of
+    rows spilled. Partitions that receive no rows get no file; ``read_spill``
+    treats them as empty.
+    """
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+    writers, rows = {}, 0
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            table = pa.Table.from_pandas(chunk[schema.names].reset_index(drop=True),
+                                         schema=schema, preserve_index=False)
+            for part, part_rows in _split(table, partition_of(chunk[key], partitions)):
+                if part not in writers:
+                    writers[part] = pq.ParquetWriter(_spill_path(spill_dir, part), schema)
+                writers[part].write_table(part_rows)
+            rows += len(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def scatter_source(source_dir, work_dir, name, chunk_rows, partitions):
+    """Stream one source into its spill directory under ``work_dir``."""
+    chunks = read_chunks(source_dir, name, chunk_rows)
+    if name == 'orders':
+        # Non-delivered orders are dropped by the build anyway; don't spill them.
+        chunks = (chunk[chunk['order_status'] == 'delivered'] for chunk in chunks)
+    return scatter(chunks, os.path.join(work_dir, name), SCATTER_KEYS[name], partitions,
+                   SCATTER_SCHEMAS[name])
+
+
+def read_spill(spill_dir, part, columns):
+    path = _spill_path(spill_dir, part)
+    if not os.path.exists(path):
+        return pd.DataFrame({c: pd.Series(dtype='object') for c in columns})
+    return pq.read_table(path).to_pandas()
+
+
+def join_customers(work_dir, part, partitions):
+    """Join one ``customer_id`` partition and re-spill the rows by ``order_id``.
+
+    Writes a single file whose row groups are ordered by target partition, so
+    ``read_joined`` can skip straight to the rows of one ``order_id`` partition.
+    """
+    orders = read_spill(os.path.join(work_dir, 'orders'), part, SCATTER_COLUMNS['orders'])
+    if orders.empty:
+        return 0
+    customers = read_spill(os.path.join(work_dir, 'customers'), part, SCATTER_COLUMNS['customers'])
+    joined = pd.merge(orders, customers, on='customer_id', how='left')
+    targets = partition_of(joined['order_id'], partitions)
+    table = pa.Table.from_pandas(joined[JOINED_SCHEMA.names], schema=JOINED_SCHEMA, preserve_index=False)
+    table = table.append_column(PART_COLUMN, pa.array(targets))
+    with pq.ParquetWriter(_spill_path(os.path.join(work_dir, JOINED_DIR), part), table.schema) as writer:
+        for _, part_rows in _split(table, targets):
+            writer.write_table(part_rows)
+    return len(joined)
+
+
+def read_joined(work_dir, part):
+    """Customer-joined orders of one ``order_id`` partition, in a fixed order."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(work_dir, JOINED_DIR, 'part-*.parquet'))):
+        table = pq.read_table(path, filters=[(PART_COLUMN, '=', part)])
+        if table.num_rows:
+            frames.append(table.drop_columns([PART_COLUMN]).to_pandas())
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def build_partition(work_dir, part, products, translation, thresholds):
+    """Master rows of one ``order_id`` partition, sorted by ``order_id``."""
+    orders = read_joined(work_dir, part)
+    if orders is None:
+        return pd.DataFrame(columns=MASTER_COLUMNS)
+    reviews = read_spill(os.path.join(work_dir, 'reviews'), part, SCATTER_COLUMNS['reviews'])
+    items = read_spill(os.path.join(work_dir, 'items'), part, SCATTER_COLUMNS['items'])
+    orders = derive_delivery_columns(orders, **thresholds)
+    master = _assemble(orders, None, dedup_reviews(reviews), first_categories(items, products, translation))
+    return master.sort_values('order_id', kind='stable').reset_index(drop=True)
+
+
+# Products and the category translation, loaded once per worker process.
+_DIMENSIONS = {}
+
+
+def _init_worker(dimensions):
+    _DIMENSIONS.update(dimensions)
+
+
+def write_partition(work_dir, out_dir, part, thresholds):
+    """Build one ``order_id`` partition into ``out_dir``; returns its path and row count."""
+    master = build_partition(work_dir, part, _DIMENSIONS['products'], _DIMENSIONS['translation'], thresholds)
+    if master.empty:
+        return None, 0
+    path = _spill_path(out_dir, part)
+    pq.write_table(to_master_table(master), path)
+    return path, len(master)
+
+
+class _Inline:
+    """``ProcessPoolExecutor`` stand-in that runs tasks in this process."""
+
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        if initializer is not None:
+            initializer(*initargs)
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def build_chunked(source_dir, output, chunk_rows=CHUNK_ROWS, partitions=PARTITIONS, workers=1,
+                  work_dir=None, late_after=LATE_AFTER_DAYS, super_late_after=SUPER_LATE_AFTER_DAYS):
+    """Build the master table from ``source_dir`` into ``output`` in bounded memory.
+
+    ``output`` ending in ``.parquet`` is written as one file with a row group
+    per partition; any other path is created as a directory of per-partition
+    Parquet files. Both are readable with ``storage.read_master``. Partitions
+    are processed by ``workers`` processes (``1`` runs everything in this
+    process). Spill files go to ``work_dir`` (a temporary directory next to
+    ``output`` by default) and are removed afterwards. Returns a run summary.
+    """
+    thresholds = {'late_after': late_after, 'super_late_after': super_late_after}
+    dimensions = {name: read_dimension(source_dir, name) for name in ('products', 'translation')}
+
+    parent = os.path.dirname(os.path.abspath(output))
+    own_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='.veridi-build-', dir=parent)
+    to_file = str(output).endswith('.parquet')
+    out_dir = os.path.join(work_dir, 'master') if to_file else output
+    summary = {'partitions': partitions, 'workers': workers}
+
+    # Stages time the parent's wall clock; with workers > 1 that is the slowest worker.
+    pool = ProcessPoolExecutor if workers > 1 else _Inline
+    try:
+        with pool(max_workers=workers, initializer=_init_worker, initargs=(dimensions,)) as executor:
+            names = list(SCATTER_COLUMNS)
+            with PROFILER.stage('scatter') as stats:
+                spilled = list(executor.map(scatter_source, [source_dir] * len(names), [work_dir] * len(names),
+                                            names, [chunk_rows] * len(names), [partitions] * len(names)))
+                stats['rows'] = sum(spilled)
+            summary.update({f'{name}_rows': rows for name, rows in zip(names, spilled)})
+
+            with PROFILER.stage('join_customers', rows=summary['orders_rows']):
+                shutil.rmtree(os.path.join(work_dir, JOINED_DIR), ignore_errors=True)
+                os.makedirs(os.path.join(work_dir, JOINED_DIR))
+                list(executor.map(join_customers, [work_dir] * partitions, range(partitions),
+                                  [partitions] * partitions))
+
+            with PROFILER.stage('build_partitions') as stats:
+                os.makedirs(out_dir, exist_ok=True)
+                for stale in glob.glob(os.path.join(out_dir, 'part-*.parquet')):
+                    os.remove(stale)
+                results = list(executor.map(write_partition, [work_dir] * partitions, [out_dir] * partitions,
+                                            range(partitions), [thresholds] * partitions))
+                stats['rows'] = sum(rows for _, rows in results)
+
+        if to_file:
+            with PROFILER.stage('concat_parts', rows=sum(rows for _, rows in results)):
+                _concat_parts([path for path, _ in results if path is not None], output)
+        summary['master_rows'] = sum(rows for _, rows in results)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return summary
+
+
+def _part_schema(schema):
+    """Widen dictionary indices so every partition's table shares one schema."""
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type, field.type.ordered))
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _concat_parts(parts, output):
+    """Stream per-partition files into a single Parquet file, one at a time."""
+    tmp_path = f"{output}.tmp-{os.getpid()}"
+    writer = None
+    try:
+        for path in parts:
+            table = pq.read_table(path)
+            if writer is None:
+                schema = _part_schema(table.schema)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.cast(schema))
+        if writer is None:
+            pq.write_table(to_master_table(pd.DataFrame(columns=MASTER_COLUMNS)), tmp_path)
+        else:
+            writer.close()
+            writer = None
+        os.replace(tmp_path, output)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Veridi master table in bounded memory.")
+    parser.add_argument('--source-dir', required=True, help='directory holding the Olist CSVs')
+    parser.add_argument('--output', required=True,
+                        help='a .parquet file, or a directory to fill with per-partition files')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help='rows read from a source CSV at a time (default: %(default)s)')
+    parser.add_argument('--partitions', type=int, default=PARTITIONS,
+                        help='hash partitions; more means smaller ones (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes; the output does not depend on it (default: %(default)s)')
+    parser.add_argument('--work-dir', help='where to put spill files (default: next to --output)')
+    parser.add_argument('--late-after', type=int, default=LATE_AFTER_DAYS)
+    parser.add_argument('--super-late-after', type=int, default=SUPER_LATE_AFTER_DAYS)
+    parser.add_argument('--metrics', help='write per-stage timings here (.json, else Prometheus text)')
+    args = parser.parse_args(argv)
+
+    with PROFILER.run('chunked'):
+        summary = build_chunked(args.source_dir, args.output, chunk_rows=args.chunk_rows,
+                                partitions=args.partitions, workers=args.workers, work_dir=args.work_dir,
+                                late_after=args.late_after, super_late_after=args.super_late_after)
+    print(json.dumps(summary, indent=2))
+    if args.metrics:
+        PROFILER.export(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""Precomputed additive aggregate cube behind the dashboard charts.
+
+Every sidebar or slider change reruns app.py. Instead of re-grouping the whole
+filtered order table in each tab, the master table is collapsed once into a
+cube keyed by
+
+    (customer_state, delivery_status, product_category_en, purchase_month,
+     review_score, days_bucket)
+
+holding additive measures (order count, late-order count, reviewed count,
+review-score sum and days-difference sum). Every KPI and chart is a sum over
+the cube cells that match the current filter, so an interaction costs time
+proportional to the number of occupied cells rather than the number of orders.
+
+``days_bucket`` is ``days_difference`` clipped to ``[-21, 21]``: exact days
+inside the +/-20 day window the charts zoom into, with one overflow bucket on
+each side. That keeps "days > 0" and the 2-day sentiment bins exact.
+"""
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor.storage import DELIVERY_STATUSES
+
+DIMENSIONS = [
+    'customer_state',
+    'delivery_status',
+    'product_category_en',
+    'purchase_month',
+    'review_score',
+    'days_bucket',
+]
+
+MEASURES = ['n_orders', 'n_late', 'n_reviewed', 'review_sum', 'days_sum']
+
+# Dimensions the sidebar filters on (see ``veridi_auditor.index.FilterIndex``).
+FILTER_DIMENSIONS = ['customer_state', 'delivery_status', 'product_category_en']
+
+STATUS_ORDER = DELIVERY_STATUSES
+
+DAYS_WINDOW = 20
+DECAY_BIN_WIDTH = 2
+
+
+def build_cube(df):
+    """Collapse the master table into the aggregate cube (one row per cell)."""
+    keyed = df.assign(days_bucket=np.clip(df['days_difference'], -DAYS_WINDOW - 1, DAYS_WINDOW + 1),
+                      review_score=df['review_score'].astype(float))
+    return keyed.groupby(DIMENSIONS, observed=True, dropna=False, sort=False).agg(
+        n_orders=('days_difference', 'size'),
+        n_late=('is_late', 'sum'),
+        n_reviewed=('review_score', 'count'),
+        review_sum=('review_score', 'sum'),
+        days_sum=('days_difference', 'sum'),
+    ).reset_index()
+
+
+def filter_cube(cube, states, statuses, categories):
+    """Cells matching the sidebar selections (same semantics as the row filter)."""
+    return cube[
+        (cube['customer_state'].isin(states)) &
+        (cube['delivery_status'].isin(statuses)) &
+        (cube['product_category_en'].isin(categories))
+    ]
+
+
+def dimension_values(cube, dimension):
+    """Sorted distinct non-null values of a dimension, for the sidebar options."""
+    return sorted(cube[dimension].dropna().unique().tolist())
+
+
+def kpis(cube):
+    """Headline numbers: volume, late shares, average review and severity."""
+    total = cube['n_orders'].sum()
+    by_status = cube.groupby('delivery_status', observed=True)['n_orders'].sum()
+    late = by_status.get('Late', 0)
+    super_late = by_status.get('Super Late', 0)
+    reviewed = cube['n_reviewed'].sum()
+    positive = cube[cube['days_bucket'] > 0]
+    return {
+        'total_orders': int(total),
+        'late_orders': int(late),
+        'super_late_orders': int(super_late),
+        'pct_late': late / total * 100 if total > 0 else 0,
+        'pct_super_late': super_late / total * 100 if total > 0 else 0,
+        'avg_review': cube['review_sum'].sum() / reviewed if reviewed > 0 else np.nan,
+        'avg_days_late': positive['days_sum'].sum() / positive['n_orders'].sum() if not positive.empty else 0,
+    }
+
+
+def status_counts(cube):
+    """Order count per delivery status (only statuses present)."""
+    counts = cube.groupby('delivery_status', observed=True)['n_orders'].sum()
+    counts = counts[counts > 0].sort_values(ascending=False)
+    return counts.rename_axis('Status').reset_index(name='Count')
+
+
+def bin_days(days, measures):
+    """Per-day sums of each array in ``measures`` for ``days`` inside the window.
+
+    One weighted ``np.bincount`` per measure over the cells' day offset; each
+    array has ``2 * DAYS_WINDOW + 1`` entries, index 0 being day -DAYS_WINDOW.
+    """
+    inside = np.abs(days) <= DAYS_WINDOW
+    offset = (days[inside] + DAYS_WINDOW).astype(np.intp)
+    return {measure: np.bincount(offset, weights=values[inside], minlength=2 * DAYS_WINDOW + 1)
+            for measure, values in measures.items()}
+
+
+def delay_bins(cube):
+    """Per-day ``n_orders``, ``n_reviewed`` and ``review_sum`` inside the window."""
+    return bin_days(cube['days_bucket'].to_numpy(),
+                    {measure: cube[measure].to_numpy(dtype=float)
+                     for measure in ('n_orders', 'n_reviewed', 'review_sum')})
+
+
+def histogram_from_bins(per_day):
+    """``delay_histogram`` from ``delay_bins`` output."""
+    return pd.DataFrame({'days_difference': np.arange(-DAYS_WINDOW, DAYS_WINDOW + 1),
+                         'count': per_day['n_orders'].astype(np.int64)})
+
+
+def delay_histogram(cube):
+    """Order count per day of ``days_difference`` inside the +/-20 day window."""
+    return histogram_from_bins(delay_bins(cube))
+
+
+def avg_delay_by_score(cube):
+    """Mean ``days_difference`` per review score (unreviewed orders excluded)."""
+    sums = cube.dropna(subset=['review_score']).groupby('review_score')[['days_sum', 'n_orders']].sum()
+    return pd.DataFrame({'review_score': sums.index,
+                         'days_difference': (sums['days_sum'] / sums['n_orders']).to_numpy()})
+
+
+def late_rate_by(cube, dimension):
+    """Late rate (%) and order volume per value of ``dimension``."""
+    sums = cube.dropna(subset=[dimension]).groupby(dimension, observed=True)[['n_late', 'n_orders']].sum()
+    return pd.DataFrame({
+        'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+        'total_orders': sums['n_orders'],
+    }).reset_index()
+
+
+def national_late_rate(cube):
+    """Late rate (%) across every cell in ``cube``."""
+    total = cube['n_orders'].sum()
+    return cube['n_late'].sum() / total * 100 if total > 0 else np.nan
+
+
+def avg_score_by_status(cube):
+    """Mean review score per delivery status, in On Time/Late/Super Late order."""
+    sums = cube.groupby('delivery_status', observed=True)[['review_sum', 'n_reviewed']].sum()
+    scores = (sums['review_sum'] / sums['n_reviewed']).reset_index(name='review_score')
+    scores['delivery_status'] = pd.Categorical(scores['delivery_status'], categories=STATUS_ORDER, ordered=True)
+    return scores.sort_values('delivery_status')
+
+
+def score_distribution_by_status(cube):
+    """Share (%) of each review score within each delivery status."""
+    counts = cube.dropna(subset=['review_score']).pivot_table(
+        index='delivery_status', columns='review_score', values='n_orders',
+        aggfunc='sum', fill_value=0, observed=True)
+    counts.index = counts.index.astype(str)
+    shares = counts.div(counts.sum(axis=1), axis=0) * 100
+    return shares.reindex(STATUS_ORDER)
+
+
+def sentiment_decay(cube):
+    """Mean review score per 2-day ``days_difference`` bin inside the window.
+
+    Bins without any order are left out, so the line joins its neighbours.
+    """
+    return decay_from_bins(delay_bins(cube))
+
+
+def decay_from_bins(per_day):
+    """``sentiment_decay`` from ``delay_bins`` output."""
+    starts = np.arange(0, 2 * DAYS_WINDOW + 1, DECAY_BIN_WIDTH)
+    sums = {measure: np.add.reduceat(values, starts) for measure, values in per_day.items()}
+    present = sums['n_orders'] > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = sums['review_sum'] / sums['n_reviewed']
+    return pd.DataFrame({
+        'days_mid': (-DAYS_WINDOW + starts + DECAY_BIN_WIDTH / 2)[present].astype(float),
+        'review_score': scores[present],
+    })
+
+
+def monthly_trends(cube):
+    """Late rate (%), mean review score and volume per purchase month."""
+    sums = cube.dropna(subset=['purchase_month']).groupby('purchase_month', observed=True)[
+        ['n_late', 'n_orders', 'n_reviewed', 'review_sum']].sum()
+    return pd.DataFrame({
+        'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+        'avg_score': sums['review_sum'] / sums['n_reviewed'],
+        'order_count': sums['n_orders'],
+    }).reset_index()
+
+
+class CellArrays:
+    """The cube as flat NumPy arrays, summed over any row-id subset of cells.
+
+    The DataFrame helpers above take a cube (or a filtered copy of one).
+    ``CellArrays`` is built once per cube and answers the same questions for
+    a ``Selection``'s row ids without building a frame: each dimension is an
+    small integer code array into ``labels[dim]`` (-1 for missing), measures
+    and ``days_bucket`` are the cube's own column arrays, and a grouped sum
+    is one ``np.bincount``. Per query it allocates only the gathered
+    codes/weights of the selected cells and results the size of a dimension.
+    """
+
+    def __init__(self, cube):
+        self.n_cells = len(cube)
+        self.labels, self.codes = {}, {}
+        for dim in DIMENSIONS[:-1]:
+            codes, labels = pd.factorize(cube[dim], sort=True)
+            self.codes[dim] = codes.astype(np.min_scalar_type(-max(len(labels), 1)))
+            self.codes[dim].flags.writeable = False
+            self.labels[dim] = pd.Index(labels, name=dim)
+        self.days_bucket = cube['days_bucket'].to_numpy()
+        self.measures = {m: cube[m].to_numpy() for m in MEASURES}
+
+    @property
+    def nbytes(self):
+        """Bytes of the code arrays (measures are shared with the cube)."""
+        return sum(codes.nbytes for codes in self.codes.values())
+
+    def total(self, rows, measure, where=None):
+        """Sum of ``measure`` over ``rows`` (optionally only where ``where`` holds)."""
+        values = self.measures[measure][rows]
+        return values[where].sum() if where is not None else values.sum()
+
+    def group_sums(self, rows, dim, measures, by=None):
+        """Per-value sums of ``measures`` over ``rows``, for the values present.
+
+        Returns the present labels and one summed array per measure, in label
+        order (what ``groupby(dim, observed=True)`` returns after dropping
+        missing values). ``by`` adds a second dimension: the labels are then
+        ``(dim, by)`` pairs as a two-level ``MultiIndex``.
+        """
+        codes = self.codes[dim][rows]
+        size = len(self.labels[dim])
+        if by is not None:
+            inner = self.codes[by][rows]
+            codes = np.where(inner >= 0, codes * len(self.labels[by]) + inner, -1)
+            size *= len(self.labels[by])
+        valid = codes >= 0
+        codes = codes[valid]
+        present = np.bincount(codes, minlength=size) > 0
+        sums = {m: np.bincount(codes, weights=self.measures[m][rows][valid], minlength=size)[present]
+                for m in measures}
+        positions = np.flatnonzero(present)
+        if by is None:
+            return self.labels[dim][positions], sums
+        outer, inner = np.divmod(positions, len(self.labels[by]))
+        labels = pd.MultiIndex.from_arrays([self.labels[dim][outer], self.labels[by][inner]])
+        return labels, sums
+
+    def day_bins(self, rows):
+        """``delay_bins`` for the cells in ``rows``."""
+        return bin_days(self.days_bucket[rows],
+                        {m: self.measures[m][rows] for m in ('n_orders', 'n_reviewed', 'review_sum')})
@@ -0,0 +1,112 @@
+"""Compact, read-only master dataset shared by every dashboard session.
+
+``st.cache_data`` hands each caller its own unpickled copy of the cached
+DataFrame, so the dashboard's memory grew with every session. ``MasterDataset``
+is built once (app.py keeps it in ``st.cache_resource``) and stores each
+column in its smallest faithful form:
+
+- ``order_id`` as 16-byte packed ids (the 32-character hex ids are decoded),
+  falling back to fixed-width ASCII for ids that are not 32 hex characters
+- low-cardinality strings as categorical codes (int8 for up to 127 values),
+  including those a file written before they were dictionary-encoded (e.g.
+  ``customer_city``) stores as plain strings
+- ``days_difference`` as int16, ``is_late`` as bool
+- ``review_score`` as a nullable Int8 (one data byte plus one mask byte)
+
+Every array is marked read-only. ``frame`` wraps the arrays in a DataFrame
+without copying them, and per-session work selects rows through
+``veridi_auditor.index`` rather than copying the table.
+"""
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor.storage import (CATEGORY_COLUMNS, DASHBOARD_COLUMNS, MASTER_COLUMNAR, MASTER_CSV,
+                                    ORDERED_CATEGORIES, load_master)
+
+ID_BYTES = 16
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+def _pack_ids(ids):
+    """``order_id`` strings as fixed-width bytes (packed hex when possible)."""
+    ids = pd.Series(ids, dtype=object).to_numpy()
+    fixed = np.asarray(ids, dtype='S')
+    if fixed.dtype.itemsize == 2 * ID_BYTES and (np.char.str_len(fixed) == 2 * ID_BYTES).all():
+        try:
+            packed = bytes.fromhex(fixed.tobytes().decode('ascii'))
+        except ValueError:
+            return fixed
+        return np.frombuffer(packed, dtype=f'V{ID_BYTES}')
+    return fixed
+
+
+def _compact(name, col):
+    if name == 'order_id':
+        return _pack_ids(col)
+    if name in CATEGORY_COLUMNS and not isinstance(col.dtype, pd.CategoricalDtype):
+        # The categories a freshly written master file would come back with.
+        ordered = ORDERED_CATEGORIES.get(name)
+        col = col.astype(pd.CategoricalDtype(ordered, ordered=True) if ordered is not None
+                         else pd.CategoricalDtype(sorted(col.dropna().unique().tolist())))
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        cat = col.array
+        _readonly(cat.codes)
+        return cat
+    if name == 'review_score':
+        values = col.to_numpy(dtype=float, na_value=np.nan)
+        mask = np.isnan(values)
+        data = np.where(mask, 0, values).astype(np.int8)
+        return pd.arrays.IntegerArray(_readonly(data), _readonly(mask))
+    if pd.api.types.is_integer_dtype(col.dtype):
+        return _readonly(pd.to_numeric(col, downcast='integer').to_numpy())
+    return _readonly(col.to_numpy())
+
+
+def _nbytes(array):
+    if isinstance(array, pd.Categorical):
+        return array.codes.nbytes + array.categories.memory_usage(deep=True)
+    return array.nbytes
+
+
+class MasterDataset:
+    """Column arrays of the master table in their most compact form."""
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.columns = {name: _compact(name, df[name]) for name in df.columns}
+
+    @classmethod
+    def load(cls, path=MASTER_COLUMNAR, csv_path=MASTER_CSV, columns=DASHBOARD_COLUMNS):
+        """Load and compact the master file (see ``storage.load_master``)."""
+        return cls(load_master(columns=columns, csv_path=csv_path, columnar_path=path))
+
+    def __len__(self):
+        return self.n_rows
+
+    def order_ids(self, rows=None):
+        """``order_id`` strings for ``rows`` (all rows by default), decoded on demand."""
+        ids = self.columns['order_id']
+        ids = ids if rows is None else ids[rows]
+        if ids.dtype.kind == 'V':
+            return pd.Series([bytes(v).hex() for v in ids], dtype=str)
+        return pd.Series(ids.astype(str), dtype=str)
+
+    def frame(self, columns=None):
+        """A DataFrame over the shared arrays (no copy); ``order_id`` stays packed out of it."""
+        columns = [c for c in (columns or self.columns) if c != 'order_id']
+        return pd.DataFrame({name: self.columns[name] for name in columns}, copy=False)
+
+    def memory_report(self):
+        """Bytes and dtype of each stored column, plus a total row."""
+        rows = [{'column': name, 'dtype': str(array.dtype), 'bytes': _nbytes(array)}
+                for name, array in self.columns.items()]
+        report = pd.DataFrame(rows)
+        report['bytes_per_row'] = report['bytes'] / max(self.n_rows, 1)
+        total = pd.DataFrame([{'column': 'total', 'dtype': '', 'bytes': report['bytes'].sum(),
+                               'bytes_per_row': report['bytes'].sum() / max(self.n_rows, 1)}])
+        return pd.concat([report, total], ignore_index=True)
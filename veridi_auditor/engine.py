@@ -0,0 +1,364 @@
+"""Headless audit engine: every dashboard metric without Streamlit.
+
+``AuditEngine`` loads the master table once, collapses it into the aggregate
+cube and indexes the cube for the sidebar filters. The state -> city
+drill-down has its own aggregate (``veridi_auditor.geo``). ``AuditEngine.select``
+returns an ``Audit`` for one filter set; its methods are the KPI and chart
+computations app.py renders, including the dashboard's cutoffs (categories
+need ``MIN_CATEGORY_ORDERS`` orders, months more than ``MIN_MONTH_ORDERS``,
+cities ``MIN_CITY_ORDERS`` by default).
+One engine can answer any number of filter combinations, so batch jobs and
+benchmarks reuse the loaded dataset.
+
+    python -m veridi_auditor.engine --state SP --state RJ --status Late --status "Super Late"
+    python -m veridi_auditor.engine --format parquet --output report/
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor import cube as cube_ops
+from veridi_auditor.attribution import CategoryAttribution, category_weights_path
+from veridi_auditor.dataset import MasterDataset
+from veridi_auditor.geo import CityAggregate
+from veridi_auditor.index import FilterIndex
+from veridi_auditor.profiling import PROFILER
+from veridi_auditor.storage import MASTER_COLUMNAR, MASTER_CSV
+
+TOP_N = 15
+MIN_CATEGORY_ORDERS = 20
+MIN_MONTH_ORDERS = 50
+MIN_CITY_ORDERS = 20
+
+# Table-shaped metrics, in the order the dashboard shows them.
+METRICS = [
+    'status_counts',
+    'delay_histogram',
+    'avg_delay_by_score',
+    'state_late_rates',
+    'avg_score_by_status',
+    'score_distribution',
+    'sentiment_decay',
+    'category_late_rates',
+    'monthly_trends',
+]
+
+
+class Audit:
+    """Metrics for the cube cells matching one filter selection.
+
+    Every metric is a grouped sum over the selection's row ids in the
+    engine's ``CellArrays``; no per-selection DataFrame of cells is built.
+    """
+
+    def __init__(self, arrays, selection, attribution=None, filters=None, geo=None):
+        self.arrays = arrays
+        self.selection = selection
+        self.attribution = attribution
+        self.filters = filters or {}
+        self.geo = geo
+
+    @property
+    def rows(self):
+        return self.selection.row_ids
+
+    @property
+    def scanned(self):
+        """Cube cells the metrics sum over."""
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return self.selection.empty
+
+    @property
+    def nbytes(self):
+        """Memory held by this selection: its bitmap and row ids."""
+        return self.selection.bitmap.nbytes + self.rows.nbytes
+
+    def _sums(self, dim, measures, by=None):
+        labels, sums = self.arrays.group_sums(self.rows, dim, measures, by=by)
+        return pd.DataFrame(sums, index=labels)
+
+    def _late_rates(self, dim):
+        sums = self._sums(dim, ['n_late', 'n_orders'])
+        return pd.DataFrame({
+            'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+            'total_orders': sums['n_orders'].astype(np.int64),
+        }).reset_index()
+
+    def kpis(self):
+        """Headline numbers plus the late rate across the whole selection."""
+        rows, arrays = self.rows, self.arrays
+        total = arrays.total(rows, 'n_orders')
+        by_status = self._sums('delivery_status', ['n_orders'])['n_orders']
+        late = by_status.get('Late', 0)
+        super_late = by_status.get('Super Late', 0)
+        reviewed = arrays.total(rows, 'n_reviewed')
+        positive = arrays.days_bucket[rows] > 0
+        return {
+            'total_orders': int(total),
+            'late_orders': int(late),
+            'super_late_orders': int(super_late),
+            'pct_late': late / total * 100 if total > 0 else 0,
+            'pct_super_late': super_late / total * 100 if total > 0 else 0,
+            'avg_review': arrays.total(rows, 'review_sum') / reviewed if reviewed > 0 else np.nan,
+            'avg_days_late': (arrays.total(rows, 'days_sum', positive) / arrays.total(rows, 'n_orders', positive)
+                              if positive.any() else 0),
+            'national_late_rate': arrays.total(rows, 'n_late') / total * 100 if total > 0 else np.nan,
+        }
+
+    def status_counts(self):
+        counts = self._sums('delivery_status', ['n_orders'])['n_orders'].astype(np.int64)
+        counts = counts[counts > 0].sort_values(ascending=False)
+        return counts.rename_axis('Status').reset_index(name='Count')
+
+    def delay_histogram(self):
+        return cube_ops.histogram_from_bins(self.arrays.day_bins(self.rows))
+
+    def avg_delay_by_score(self):
+        sums = self._sums('review_score', ['days_sum', 'n_orders'])
+        return pd.DataFrame({'review_score': sums.index.to_numpy(),
+                             'days_difference': (sums['days_sum'] / sums['n_orders']).to_numpy()})
+
+    def state_late_rates(self):
+        """Late rate and volume per state, highest late rate first."""
+        return self._late_rates('customer_state') \
+            .sort_values('late_rate', ascending=False).reset_index(drop=True)
+
+    def avg_score_by_status(self):
+        sums = self._sums('delivery_status', ['review_sum', 'n_reviewed'])
+        scores = (sums['review_sum'] / sums['n_reviewed']).rename_axis('delivery_status').reset_index(name='review_score')
+        scores['delivery_status'] = pd.Categorical(scores['delivery_status'], categories=cube_ops.STATUS_ORDER,
+                                                   ordered=True)
+        return scores.sort_values('delivery_status')
+
+    def score_distribution(self):
+        """Share (%) of each review score within each delivery status."""
+        counts = self._sums('delivery_status', ['n_orders'], by='review_score')['n_orders'] \
+            .unstack(fill_value=0)
+        counts.index = counts.index.astype(str).rename('delivery_status')
+        counts.columns = counts.columns.rename('review_score')
+        shares = counts.div(counts.sum(axis=1), axis=0) * 100
+        return shares.reindex(cube_ops.STATUS_ORDER)
+
+    def sentiment_decay(self):
+        return cube_ops.decay_from_bins(self.arrays.day_bins(self.rows))
+
+    def category_late_rates(self, top_n=TOP_N, min_orders=MIN_CATEGORY_ORDERS, weighted=False):
+        """The ``top_n`` categories by late rate among those with ``min_orders`` orders.
+
+        By default each order counts for its first item's category. With
+        ``weighted`` it counts for every category of its items, in proportion
+        to their share of the order (needs the engine's ``attribution``).
+        """
+        if weighted:
+            if self.attribution is None:
+                raise ValueError("weighted attribution needs the category weights next to the master file")
+            rates = self.attribution.late_rates(**self.filters)
+        else:
+            rates = self._late_rates('product_category_en')
+        rates = rates[rates['total_orders'] >= min_orders]
+        return rates.sort_values('late_rate', ascending=False).head(top_n).reset_index(drop=True)
+
+    def monthly_trends(self, min_orders=MIN_MONTH_ORDERS):
+        """Late rate, mean score and volume per month with more than ``min_orders`` orders."""
+        sums = self._sums('purchase_month', ['n_late', 'n_orders', 'n_reviewed', 'review_sum'])
+        trends = pd.DataFrame({
+            'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+            'avg_score': sums['review_sum'] / sums['n_reviewed'],
+            'order_count': sums['n_orders'].astype(np.int64),
+        }).reset_index()
+        return trends[trends['order_count'] > min_orders].sort_values('purchase_month').reset_index(drop=True)
+
+    def _geo(self):
+        if self.geo is None:
+            raise ValueError("the city drill-down needs customer_city in the master table")
+        return self.geo
+
+    def city_late_rates(self, state, top_n=None, offset=0, min_orders=MIN_CITY_ORDERS):
+        """Cities of ``state`` by late rate, worst first, among those with ``min_orders`` orders.
+
+        The status and category filters apply; the state filter does not
+        (``state`` picks the state). ``offset`` and ``top_n`` select a page
+        of the ranking (``top_n=None``: to the end); the ``rank`` column
+        numbers the whole ranking.
+        """
+        ranked = self._geo().late_rates(state, statuses=self.filters.get('statuses'),
+                                        categories=self.filters.get('categories'), min_orders=min_orders)
+        stop = None if top_n is None else offset + top_n
+        return ranked.iloc[offset:stop].reset_index(drop=True)
+
+    def state_summary(self, state):
+        """Late rate, volume, mean score, delay percentiles and city count of ``state``."""
+        return self._geo().state_summary(state, statuses=self.filters.get('statuses'),
+                                         categories=self.filters.get('categories'))
+
+    def report(self, top_n=TOP_N):
+        """Every metric: ``kpis`` as a dict and the ``METRICS`` as DataFrames."""
+        report = {'kpis': self.kpis()}
+        for name in METRICS:
+            method = getattr(self, name)
+            report[name] = method(top_n=top_n) if name == 'category_late_rates' else method()
+        return report
+
+
+class AuditEngine:
+    """A loaded dataset, its aggregate cube and the cube's filter index.
+
+    ``master`` is a ``MasterDataset`` or a master DataFrame (compacted on the
+    way in). Everything the engine holds is read-only, so one instance can be
+    shared by every dashboard session.
+    """
+
+    def __init__(self, master, attribution=None):
+        with PROFILER.stage('compact', rows=len(master)):
+            self.dataset = master if isinstance(master, MasterDataset) else MasterDataset(master)
+        with PROFILER.stage('build_cube', rows=len(self.dataset)):
+            self.cube = cube_ops.build_cube(self.dataset.frame())
+        with PROFILER.stage('build_index', rows=len(self.cube)):
+            self.index = FilterIndex(self.cube, cube_ops.FILTER_DIMENSIONS)
+            self.arrays = cube_ops.CellArrays(self.cube)
+        self._options = {dim: sorted(self.arrays.labels[dim].dropna().tolist()) for dim in cube_ops.FILTER_DIMENSIONS}
+        self.geo = None
+        if 'customer_city' in self.dataset.columns:
+            with PROFILER.stage('build_geo', rows=len(self.dataset)):
+                self.geo = CityAggregate(self.dataset)
+        self._version = None
+        self.attribution = attribution
+
+    @classmethod
+    def load(cls, path=MASTER_COLUMNAR, csv_path=MASTER_CSV):
+        """Engine over the master file at ``path`` (see ``storage.load_master``).
+
+        The category weights exported next to it, when present, enable the
+        weighted ``category_late_rates``.
+        """
+        with PROFILER.stage('load_master') as stats:
+            dataset = MasterDataset.load(path, csv_path=csv_path)
+            stats['rows'] = len(dataset)
+        attribution = None
+        weights_path = category_weights_path(path)
+        if os.path.exists(weights_path):
+            with PROFILER.stage('load_attribution') as stats:
+                attribution = CategoryAttribution.load(weights_path, dataset)
+                stats['rows'] = len(attribution)
+        return cls(dataset, attribution=attribution)
+
+    @property
+    def version(self):
+        """Content hash of the loaded master columns and category weights.
+
+        Changes whenever anything a cached figure may be built from does,
+        including columns the cube leaves out (order ids, cities) and the weights.
+        """
+        if self._version is None:
+            digest = hashlib.sha256()
+            digest.update(pd.util.hash_pandas_object(self.dataset.frame(), index=False).to_numpy().tobytes())
+            if 'order_id' in self.dataset.columns:
+                digest.update(np.ascontiguousarray(self.dataset.columns['order_id']).tobytes())
+            if self.attribution is not None:
+                digest.update('\0'.join(self.attribution.labels).encode())
+                for array in (self.attribution.rows, self.attribution.category, self.attribution.weight):
+                    digest.update(array.tobytes())
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    def options(self, dimension):
+        """Sorted values a filter dimension can take (computed once per engine)."""
+        return list(self._options[dimension])
+
+    def select(self, states=None, statuses=None, categories=None):
+        """The ``Audit`` of orders matching every given selection (``None`` = all)."""
+        selections = {'customer_state': states, 'delivery_status': statuses,
+                      'product_category_en': categories}
+        with PROFILER.stage('filter', rows=len(self.cube)):
+            selection = self.index.select(**{dim: values for dim, values in selections.items()
+                                             if values is not None})
+        return Audit(self.arrays, selection, attribution=self.attribution,
+                     filters={'states': states, 'statuses': statuses, 'categories': categories}, geo=self.geo)
+
+    def memory_report(self):
+        """Bytes held once for all sessions: dataset columns, the cube and its index."""
+        report = self.dataset.memory_report()
+        shared = report[report['column'] != 'total']
+        index_bytes = sum(d.bitmaps.nbytes + d.valid.nbytes for d in self.index.dimensions.values())
+        extra = pd.DataFrame([
+            {'column': '(aggregate cube)', 'dtype': f'{len(self.cube):,} cells',
+             'bytes': int(self.cube.memory_usage(deep=True).sum())},
+            {'column': '(filter index)', 'dtype': 'packed bitmaps', 'bytes': index_bytes},
+            {'column': '(cell codes)', 'dtype': 'int8/int16 codes', 'bytes': self.arrays.nbytes},
+        ] + ([{'column': '(category weights)', 'dtype': f'{len(self.attribution):,} pairs',
+               'bytes': self.attribution.nbytes}] if self.attribution is not None else [])
+          + ([{'column': '(city aggregate)', 'dtype': f'{len(self.geo):,} entries',
+               'bytes': self.geo.nbytes}] if self.geo is not None else []))
+        report = pd.concat([shared, extra], ignore_index=True)
+        report['bytes_per_row'] = report['bytes'] / max(len(self.dataset), 1)
+        total = {'column': 'total', 'dtype': '', 'bytes': report['bytes'].sum(),
+                 'bytes_per_row': report['bytes'].sum() / max(len(self.dataset), 1)}
+        return pd.concat([report, pd.DataFrame([total])], ignore_index=True)
+
+
+# --- CLI ---------------------------------------------------------------------
+
+def _table(df):
+    """A metric as a plain table with string column names."""
+    df = df.reset_index() if df.index.name is not None else df.reset_index(drop=True)
+    df.columns = [f"{c:g}" if isinstance(c, float) else str(c) for c in df.columns]
+    return df.astype({c: str for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+def _json_value(value):
+    value = value.item() if hasattr(value, 'item') else value
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def write_report(report, output=None, fmt='json'):
+    """Write ``Audit.report()`` as one JSON document or a directory of Parquet files."""
+    if fmt == 'parquet':
+        if output is None:
+            raise ValueError("--output DIR is required for parquet")
+        os.makedirs(output, exist_ok=True)
+        pd.DataFrame([report['kpis']]).to_parquet(os.path.join(output, 'kpis.parquet'), index=False)
+        for name in METRICS:
+            _table(report[name]).to_parquet(os.path.join(output, f"{name}.parquet"), index=False)
+        return
+
+    document = {'kpis': {k: _json_value(v) for k, v in report['kpis'].items()}}
+    for name in METRICS:
+        document[name] = json.loads(_table(report[name]).to_json(orient='records'))
+    if output is None:
+        json.dump(document, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute the Veridi delivery audit for a filter set.")
+    parser.add_argument('--data', default=MASTER_COLUMNAR,
+                        help='columnar master file or partitioned store (default: %(default)s)')
+    parser.add_argument('--csv', default=MASTER_CSV, help='CSV export to convert if --data is missing')
+    parser.add_argument('--state', action='append', help='customer state to include (repeatable; default: all)')
+    parser.add_argument('--status', action='append', help='delivery status to include (repeatable; default: all)')
+    parser.add_argument('--category', action='append', help='product category to include (repeatable; default: all)')
+    parser.add_argument('--top-n', type=int, default=TOP_N, help='categories to rank (default: %(default)s)')
+    parser.add_argument('--format', choices=['json', 'parquet'], default='json')
+    parser.add_argument('--output', help='JSON file or Parquet directory (default: JSON to stdout)')
+    args = parser.parse_args(argv)
+
+    engine = AuditEngine.load(args.data, csv_path=args.csv)
+    audit = engine.select(states=args.state, statuses=args.status, categories=args.category)
+    write_report(audit.report(top_n=args.top_n), args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Server-side LRU cache of ready-made Plotly figures.
+
+Every Streamlit rerun used to rebuild each figure from scratch. The
+dashboard's figures depend only on the loaded dataset and the filter state,
+so ``FigureCache`` keeps built figures keyed by a canonical hash of both and
+hands the same object back on the next rerun (from any session) with the
+same inputs. Entries are evicted least-recently-used once the serialized size
+of the cached figures exceeds a byte budget. ``prime`` fills the cache ahead
+of time (see ``veridi_auditor.warmup``) without counting as a lookup.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+
+def cache_key(figure, dataset_version, **params):
+    """Canonical key for ``figure`` built from ``dataset_version`` with ``params``.
+
+    List-valued parameters are treated as sets (a multiselect's order does not
+    change what is plotted), so they are sorted before hashing.
+    """
+    canonical = {name: sorted(map(str, value)) if isinstance(value, (list, tuple, set)) else value
+                 for name, value in params.items()}
+    payload = json.dumps([figure, dataset_version, canonical], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FigureCache:
+    """Thread-safe LRU of figures bounded by their total serialized size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.primed = 0
+
+    def get(self, key, build):
+        """The cached figure for ``key``, calling ``build()`` to make it on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        figure = build()
+        self._put(key, figure)
+        return figure
+
+    def prime(self, key, build):
+        """Build and store the figure for ``key`` unless it is cached; True if it was built.
+
+        Unlike ``get`` this neither counts a hit or miss nor refreshes the
+        entry's recency.
+        """
+        with self._lock:
+            if key in self._entries:
+                return False
+        if self._put(key, build()):
+            with self._lock:
+                self.primed += 1
+        return True
+
+    def _put(self, key, figure):
+        size = len(pio.to_json(figure, validate=False))
+        with self._lock:
+            if key in self._entries or size > self.max_bytes:
+                return False
+            self._entries[key] = (figure, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'primed': self.primed,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
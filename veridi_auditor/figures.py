@@ -0,0 +1,295 @@
+"""The dashboard's Plotly figures, built from an ``Audit`` outside Streamlit.
+
+Each builder takes the exact ``audit`` for the sidebar filters, the
+``grouped`` view of the same filters (the sketches' ``SketchAudit`` in
+approximate mode, else ``audit`` again) and the figure's own parameters.
+app.py renders these figures through the ``FigureCache``, and
+``veridi_auditor.warmup`` builds the same ones in the background. Both use
+``figure_key`` for the cache key, so a warmed figure is a hit on the next
+rerun with those filters.
+"""
+
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from veridi_auditor.engine import MIN_CITY_ORDERS, TOP_N
+from veridi_auditor.figcache import cache_key
+from veridi_auditor.sketch import HISTOGRAM_Z
+
+# Premium Color Palettes
+COLORS = {
+    'primary': '#38bdf8',
+    'secondary': '#818cf8',
+    'accent': '#c084fc',
+    'success': '#34d399',
+    'warning': '#fbbf24',
+    'danger': '#f43f5e',
+    'status': {'On Time': '#34d399', 'Late': '#fbbf24', 'Super Late': '#f43f5e'}
+}
+
+
+# Shared Plotly Layout Template
+def get_premium_layout(title=""):
+    return dict(
+        title=dict(text=title, font=dict(family="Outfit", size=20, color="#f8fafc")),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Outfit", color="#cbd5e1"),
+        hoverlabel=dict(bgcolor="rgba(15, 23, 42, 0.9)", font=dict(family="Outfit", color="white"), bordercolor="rgba(255,255,255,0.2)"),
+        margin=dict(l=20, r=20, t=50, b=20),
+        xaxis=dict(gridcolor="rgba(255,255,255,0.05)", zerolinecolor="rgba(255,255,255,0.1)"),
+        yaxis=dict(gridcolor="rgba(255,255,255,0.05)", zerolinecolor="rgba(255,255,255,0.1)")
+    )
+
+
+def figure_key(name, dataset_version, states, statuses, categories, approximate=False, summaries_version=None,
+               **params):
+    """Cache key of figure ``name`` for one sidebar filter state.
+
+    Approximate figures also depend on the sketches they were answered
+    from, so their key carries ``summaries_version``; exact keys ignore it.
+    """
+    if approximate:
+        params['summaries_version'] = summaries_version
+    return cache_key(name, dataset_version, states=states, statuses=statuses, categories=categories,
+                     approximate=approximate, **params)
+
+
+# --- Overview ------------------------------------------------------------------
+
+def status_pie(audit, grouped, approximate):
+    status_counts = audit.status_counts()
+    fig_pie = px.pie(status_counts, values='Count', names='Status',
+                     color='Status',
+                     color_discrete_map=COLORS['status'],
+                     hole=0.6,
+                     custom_data=['Status'])
+    fig_pie.update_traces(textposition='inside', textinfo='percent+label',
+                          hovertemplate="<b>%{label}</b><br>Count: %{value}<br>Share: %{percent}<extra></extra>",
+                          marker=dict(line=dict(color='#0f172a', width=2)))
+    fig_pie.update_layout(**get_premium_layout("Status Distribution"), showlegend=False)
+    # Add center text
+    fig_pie.add_annotation(text=f"{audit.kpis()['total_orders']:,}<br>Orders", x=0.5, y=0.5, showarrow=False,
+                           font=dict(size=24, color="#f8fafc", family="Outfit"))
+    return fig_pie
+
+
+def delay_histogram(audit, grouped, approximate):
+    delay_counts = grouped.delay_histogram()
+    error_y = None
+    if approximate:
+        delay_counts['count_error'] = HISTOGRAM_Z * delay_counts['count_se']
+        error_y = 'count_error'
+    fig_hist = px.bar(delay_counts, x='days_difference', y='count', error_y=error_y,
+                      range_x=[-20.5, 20.5],
+                      color_discrete_sequence=[COLORS['primary']])
+    fig_hist.update_traces(marker=dict(line=dict(color='#0f172a', width=1)), opacity=0.85)
+    fig_hist.add_vline(x=0, line_dash="dash", line_color=COLORS['danger'], line_width=2,
+                       annotation_text="Expected Delivery", annotation_position="top right",
+                       annotation_font=dict(color=COLORS['danger']))
+    layout = get_premium_layout("Delivery Timing Spread")
+    layout['bargap'] = 0
+    layout['xaxis'].update(title="Days Difference (Positive = Late)")
+    layout['yaxis'].update(title="Order Count")
+    fig_hist.update_layout(**layout)
+    return fig_hist
+
+
+def delay_by_score(audit, grouped, approximate):
+    avg_delay_score = audit.avg_delay_by_score()
+    fig_bar1 = px.bar(avg_delay_score, x='review_score', y='days_difference',
+                      color='review_score', color_continuous_scale="Viridis", text_auto=".1f")
+
+    fig_bar1.update_traces(textfont_size=14, textangle=0, textposition="outside", cliponaxis=False,
+                           marker=dict(line=dict(color='#0f172a', width=1)))
+    layout = get_premium_layout("Average Delay by Review Score")
+    layout['coloraxis_showscale'] = False
+    layout['xaxis'].update(title="Review Score", tickmode='linear')
+    layout['yaxis'].update(title="Avg Days Difference")
+    fig_bar1.update_layout(**layout)
+    return fig_bar1
+
+
+# --- Geographic ----------------------------------------------------------------
+
+def state_late_rate(audit, grouped, approximate):
+    state_perf = grouped.state_late_rates().sort_values('late_rate', ascending=True)
+    national_avg = audit.kpis()['national_late_rate']
+    fig_state = px.bar(state_perf, x='late_rate', y='customer_state', orientation='h',
+                       color='late_rate', color_continuous_scale="Reds")
+
+    fig_state.update_traces(marker=dict(line=dict(color='#0f172a', width=1)))
+    fig_state.add_vline(x=national_avg, line_dash="dash", line_color=COLORS['primary'], line_width=2,
+                        annotation_text=f"Natl Avg: {national_avg:.1f}%", annotation_position="top right",
+                        annotation_font=dict(color=COLORS['primary']))
+
+    layout = get_premium_layout("Late Order Rate by State")
+    layout['height'] = 600
+    layout['xaxis'].update(title="% Late Orders")
+    layout['yaxis'].update(title="")
+    fig_state.update_layout(**layout)
+    fig_state.update_layout(coloraxis_colorbar_title="% Late")
+    return fig_state
+
+
+def city_late_rate(audit, grouped, approximate, state, page=0, page_size=TOP_N, min_orders=MIN_CITY_ORDERS):
+    # Always exact: the city aggregate is fast enough at any scale.
+    cities = audit.city_late_rates(state, top_n=page_size, offset=page * page_size, min_orders=min_orders)
+    cities = cities.assign(label=cities['rank'].astype(str) + '. ' + cities['customer_city'].astype(str))
+    cities = cities.sort_values('rank', ascending=False)
+    fig_city = px.bar(cities, x='late_rate', y='label', orientation='h',
+                      color='late_rate', color_continuous_scale="Reds",
+                      hover_data={'total_orders': ':,', 'p50': True, 'p90': True, 'p99': True, 'label': False})
+
+    fig_city.update_traces(marker=dict(line=dict(color='#0f172a', width=1)))
+    state_rate = audit.state_summary(state)['late_rate']
+    fig_city.add_vline(x=state_rate, line_dash="dash", line_color=COLORS['primary'], line_width=2,
+                       annotation_text=f"{state} Avg: {state_rate:.1f}%", annotation_position="top right",
+                       annotation_font=dict(color=COLORS['primary']))
+
+    layout = get_premium_layout(f"Worst Cities in {state} (Min {min_orders} orders)")
+    layout['height'] = max(400, len(cities) * 32)
+    layout['xaxis'].update(title="% Late Orders")
+    layout['yaxis'].update(title="")
+    fig_city.update_layout(**layout)
+    fig_city.update_layout(coloraxis_colorbar_title="% Late")
+    return fig_city
+
+
+# --- Sentiment -----------------------------------------------------------------
+
+def score_by_status(audit, grouped, approximate):
+    status_score = audit.avg_score_by_status()
+
+    fig_score_bar = px.bar(status_score, x='delivery_status', y='review_score', text_auto=".2f",
+                           color='delivery_status',
+                           color_discrete_map=COLORS['status'])
+
+    fig_score_bar.update_traces(textfont_size=16, textangle=0, textposition="inside",
+                                marker=dict(line=dict(color='#0f172a', width=1)))
+
+    layout = get_premium_layout("Avg Review Score by Outcome")
+    layout['yaxis'].update(range=[1, 5], title="Review Score")
+    layout['xaxis'].update(title="")
+    layout['showlegend'] = False
+    fig_score_bar.update_layout(**layout)
+    return fig_score_bar
+
+
+def score_heatmap(audit, grouped, approximate):
+    heatmap_data = audit.score_distribution()
+
+    fig_heat = px.imshow(heatmap_data,
+                         x=heatmap_data.columns, y=heatmap_data.index,
+                         color_continuous_scale="Purples", text_auto=".1f")
+
+    layout = get_premium_layout("Score Distribution by Outcome (%)")
+    layout['xaxis'].update(title="Review Score", tickmode='linear')
+    layout['yaxis'].update(title="")
+    fig_heat.update_layout(**layout)
+    fig_heat.update_layout(coloraxis_colorbar_title="%")
+    return fig_heat
+
+
+def sentiment_decay(audit, grouped, approximate):
+    binned_scores = audit.sentiment_decay()
+
+    fig_line = px.line(binned_scores, x='days_mid', y='review_score', markers=True)
+
+    fig_line.update_traces(line=dict(color=COLORS['accent'], width=4),
+                           marker=dict(size=10, color=COLORS['primary'], line=dict(color='white', width=2)))
+
+    fig_line.add_vline(x=0, line_dash="dash", line_color=COLORS['danger'], line_width=2,
+                       annotation_text="Expected Delivery", annotation_position="bottom right",
+                       annotation_font=dict(color=COLORS['danger']))
+
+    layout = get_premium_layout("Sentiment Decay Curve")
+    layout['xaxis'].update(title="Days Difference (Positive = Late)")
+    layout['yaxis'].update(title="Avg Review Score", range=[1, 5])
+    fig_line.update_layout(**layout)
+    return fig_line
+
+
+# --- Categories ----------------------------------------------------------------
+
+def category_late_rate(audit, grouped, approximate, top_n=TOP_N, weighted=False):
+    if weighted:
+        top_cats = audit.category_late_rates(top_n, weighted=True)
+    else:
+        top_cats = grouped.category_late_rates(top_n)
+    top_cats = top_cats.sort_values('late_rate', ascending=True)
+
+    fig_cats = px.bar(top_cats, x='late_rate', y='product_category_en', orientation='h',
+                      color='late_rate', color_continuous_scale="Sunsetdark", text_auto=".1f",
+                      hover_data=[c for c in ('p50', 'p90', 'p99') if c in top_cats])
+
+    fig_cats.update_traces(textfont_size=12, textangle=0, textposition="outside", cliponaxis=False,
+                           marker=dict(line=dict(color='#0f172a', width=1)))
+
+    layout = get_premium_layout(f"Top {top_n} Vulnerable Categories (Min 20 orders)")
+    layout['height'] = max(500, top_n * 35)
+    layout['xaxis'].update(title="Late Rate (%)")
+    layout['yaxis'].update(title="")
+    fig_cats.update_layout(**layout)
+    fig_cats.update_layout(coloraxis_colorbar_title="% Late")
+    return fig_cats
+
+
+# --- Trends --------------------------------------------------------------------
+
+def monthly_trends(audit, grouped, approximate):
+    monthly_trends = grouped.monthly_trends()
+    fig_trends = make_subplots(specs=[[{"secondary_y": True}]])
+
+    fig_trends.add_trace(
+        go.Bar(x=monthly_trends['purchase_month'], y=monthly_trends['late_rate'],
+               name="% Late Rate", marker_color='rgba(244, 63, 94, 0.6)',
+               marker=dict(line=dict(color='#f43f5e', width=2))),
+        secondary_y=False,
+    )
+
+    fig_trends.add_trace(
+        go.Scatter(x=monthly_trends['purchase_month'], y=monthly_trends['avg_score'],
+                   name="Avg Review Score", mode='lines+markers',
+                   line=dict(color='#38bdf8', width=4),
+                   marker=dict(size=12, color='#0f172a', line=dict(color='#38bdf8', width=2))),
+        secondary_y=True,
+    )
+
+    layout = get_premium_layout()
+    layout['hovermode'] = "x unified"
+    layout['legend'] = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+
+    fig_trends.update_layout(**layout)
+    fig_trends.update_xaxes(title_text="", gridcolor="rgba(255,255,255,0.05)")
+    fig_trends.update_yaxes(title_text="Late Rate (%)", secondary_y=False, gridcolor="rgba(255,255,255,0.05)")
+    fig_trends.update_yaxes(title_text="Avg Review Score", secondary_y=True, range=[1, 5], showgrid=False)
+    return fig_trends
+
+
+# Every cached figure by name, in tab order.
+FIGURES = {
+    'status_pie': status_pie,
+    'delay_histogram': delay_histogram,
+    'delay_by_score': delay_by_score,
+    'state_late_rate': state_late_rate,
+    'city_late_rate': city_late_rate,
+    'score_by_status': score_by_status,
+    'score_heatmap': score_heatmap,
+    'sentiment_decay': sentiment_decay,
+    'category_late_rate': category_late_rate,
+    'monthly_trends': monthly_trends,
+}
+
+
+# Parameters of the figures that take any, as the dashboard first shows them
+# (keys must match app.py's show_chart calls for a warmed figure to be a hit).
+DEFAULT_PARAMS = {
+    'category_late_rate': {'top_n': TOP_N, 'weighted': False},
+}
+
+
+def build_figure(name, audit, grouped=None, approximate=False, **params):
+    """Figure ``name`` for ``audit`` (``grouped`` defaults to ``audit`` itself)."""
+    return FIGURES[name](audit, audit if grouped is None else grouped, approximate, **params)
@@ -0,0 +1,232 @@
+"""State -> city drill-down backed by a two-level delay aggregate.
+
+``customer_city`` has thousands of values, and grouping the filtered orders
+by city on every rerun would cost time in proportion to the order count.
+``CityAggregate`` collapses the master table once, at both levels of the
+hierarchy:
+
+- states: one entry per (state, delivery status, category, days_difference)
+- cities: one entry per (state and city, delivery status, category,
+  days_difference)
+
+Each entry holds its order, late-order and reviewed counts and its review
+score sum. Cities are numbered in (state, city) order, so each state's
+cities are one contiguous range. Each group's entries are also one
+contiguous range, sorted by delay. A drill-down reads only the entries of
+the state it opens:
+
+1. it masks them with the sidebar's status and category filters;
+2. it sums them per city with ``np.bincount``;
+3. it reads exact delay percentiles off the running order counts.
+
+Its cost grows with the state's occupied entries, not with its orders.
+"""
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+def _sorted_codes(key):
+    """Codes of ``key`` into its sorted distinct non-negative values.
+
+    One hash pass over ``key`` and a sort of the distinct values only.
+    Negative keys get negative codes.
+    """
+    codes, uniques = pd.factorize(key)
+    order = np.argsort(uniques)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    uniques = uniques[order]
+    n_negative = np.searchsorted(uniques, 0)
+    return uniques[n_negative:], rank[codes] - n_negative
+
+
+def _allowed(labels, values):
+    """Whether each code (plus -1 for missing, in the last slot) is in ``values``."""
+    allowed = np.zeros(len(labels) + 1, dtype=bool)
+    if values is None:
+        allowed[:] = True
+    else:
+        positions = labels.get_indexer(list(values))
+        allowed[positions[positions >= 0]] = True
+    return allowed
+
+
+class _Level:
+    """Aggregate entries of one level, sorted by (group, days_difference).
+
+    ``offsets[g]:offsets[g + 1]`` are the entries of group ``g``.
+    """
+
+    def __init__(self, group, n_groups, days, status, category, late, score):
+        valid = group >= 0
+        if not valid.all():
+            group, days, status, category = group[valid], days[valid], status[valid], category[valid]
+            late, score = late[valid], score[valid]
+        low = int(days.min()) if len(days) else 0
+        n_days = int(days.max()) - low + 1 if len(days) else 1
+        n_status = int(status.max()) + 2 if len(status) else 1
+        n_category = int(category.max()) + 2 if len(category) else 1
+        # One int64 key per row, sorted as (group, days, status, category);
+        # built in place so the only full-size temporary is the key itself.
+        key = group.astype(np.int64)
+        key *= n_days
+        key += days
+        key -= low
+        key *= n_status
+        key += status
+        key += 1
+        key *= n_category
+        key += category
+        key += 1
+        keys, entry = _sorted_codes(key)
+        del key
+
+        reviewed = ~np.isnan(score)
+        self.n_orders = np.bincount(entry, minlength=len(keys)).astype(np.int32)
+        self.n_late = np.bincount(entry, weights=late, minlength=len(keys)).astype(np.int32)
+        self.n_reviewed = np.bincount(entry, weights=reviewed, minlength=len(keys)).astype(np.int32)
+        self.review_sum = np.bincount(entry, weights=np.where(reviewed, score, 0), minlength=len(keys))
+
+        rest, category = np.divmod(keys, n_category)
+        rest, status = np.divmod(rest, n_status)
+        group, days = np.divmod(rest, n_days)
+        self.group = group.astype(np.int32)
+        self.days = (days + low).astype(np.int16)
+        self.status = (status - 1).astype(np.int8)
+        self.category = (category - 1).astype(np.min_scalar_type(-n_category))
+        self.offsets = np.searchsorted(self.group, np.arange(n_groups + 1))
+        for array in self._arrays():
+            array.flags.writeable = False
+
+    def _arrays(self):
+        return (self.group, self.days, self.status, self.category,
+                self.n_orders, self.n_late, self.n_reviewed, self.review_sum, self.offsets)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays())
+
+    def __len__(self):
+        return len(self.group)
+
+    def summarize(self, first, last, status_ok, category_ok):
+        """Per-group totals and delay percentiles for groups ``first`` to ``last - 1``."""
+        start, stop = self.offsets[first], self.offsets[last]
+        keep = status_ok[self.status[start:stop]] & category_ok[self.category[start:stop]]
+        group = self.group[start:stop][keep] - first
+        orders = self.n_orders[start:stop][keep]
+        size = last - first
+        sums = {
+            'n_orders': np.bincount(group, weights=orders, minlength=size),
+            'n_late': np.bincount(group, weights=self.n_late[start:stop][keep], minlength=size),
+            'n_reviewed': np.bincount(group, weights=self.n_reviewed[start:stop][keep], minlength=size),
+            'review_sum': np.bincount(group, weights=self.review_sum[start:stop][keep], minlength=size),
+        }
+        # Entries are sorted by delay within each group, so the q-th percentile
+        # (inverted CDF) is the first entry whose running count reaches q * n.
+        running = np.cumsum(orders)
+        before = np.cumsum(sums['n_orders']) - sums['n_orders']
+        days = self.days[start:stop][keep]
+        present = sums['n_orders'] > 0
+        for name, q in PERCENTILES.items():
+            position = np.searchsorted(running, before + q * sums['n_orders'])
+            sums[name] = np.where(present, days[np.minimum(position, max(len(days) - 1, 0))]
+                                  if len(days) else 0, np.nan)
+        return sums
+
+
+class CityAggregate:
+    """State- and city-level delay aggregates of one ``MasterDataset``.
+
+    Rows without a state or city are left out of the city level. Everything
+    is read-only and built once, like the engine's other shared arrays.
+    """
+
+    def __init__(self, dataset):
+        columns = dataset.columns
+        state = pd.Categorical(columns['customer_state'])
+        city = pd.Categorical(columns['customer_city'])
+        status = pd.Categorical(columns['delivery_status'])
+        category = pd.Categorical(columns['product_category_en'])
+        self.state_labels = pd.Index(state.categories, name='customer_state')
+        self.status_labels = pd.Index(status.categories, name='delivery_status')
+        self.category_labels = pd.Index(category.categories, name='product_category_en')
+
+        state_codes, city_codes = np.asarray(state.codes), np.asarray(city.codes)
+        pair = np.where((state_codes >= 0) & (city_codes >= 0),
+                        state_codes.astype(np.int64) * len(city.categories) + city_codes, -1)
+        pairs, pair_codes = _sorted_codes(pair)
+        city_state, city_name = np.divmod(pairs, len(city.categories))
+        self.city_names = pd.Index(city.categories[city_name], name='customer_city')
+        # State s owns cities state_offsets[s]:state_offsets[s + 1].
+        self.state_offsets = np.searchsorted(city_state, np.arange(len(self.state_labels) + 1))
+        self.state_offsets.flags.writeable = False
+
+        days = np.asarray(columns['days_difference'])
+        late = np.asarray(columns['is_late'], dtype=bool)
+        score = pd.Series(columns['review_score'], copy=False).to_numpy(dtype=float, na_value=np.nan)
+        status_codes, category_codes = np.asarray(status.codes), np.asarray(category.codes)
+        self.states = _Level(state_codes, len(self.state_labels), days, status_codes, category_codes, late, score)
+        self.cities = _Level(pair_codes, len(pairs), days, status_codes, category_codes, late, score)
+
+    @property
+    def nbytes(self):
+        return self.states.nbytes + self.cities.nbytes + self.state_offsets.nbytes
+
+    def __len__(self):
+        return len(self.states) + len(self.cities)
+
+    def _filters(self, statuses, categories):
+        return _allowed(self.status_labels, statuses), _allowed(self.category_labels, categories)
+
+    @staticmethod
+    def _frame(sums):
+        n = sums['n_orders']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.DataFrame({
+                'late_rate': sums['n_late'] / n * 100,
+                'total_orders': n.astype(np.int64),
+                'avg_score': sums['review_sum'] / sums['n_reviewed'],
+                **{name: sums[name] for name in PERCENTILES},
+            })
+
+    def _city_range(self, state):
+        """First and end city numbers of ``state`` (an empty range if it is unknown)."""
+        if state not in self.state_labels:
+            return 0, 0
+        s = self.state_labels.get_loc(state)
+        return self.state_offsets[s], self.state_offsets[s + 1]
+
+    def state_summary(self, state, statuses=None, categories=None):
+        """One state's late rate, volume, mean score and delay percentiles, plus its city count.
+
+        ``statuses`` and ``categories`` filter the orders (``None`` keeps
+        everything). Returns None for a state the dataset does not have.
+        """
+        if state not in self.state_labels:
+            return None
+        s = self.state_labels.get_loc(state)
+        filters = self._filters(statuses, categories)
+        summary = self._frame(self.states.summarize(s, s + 1, *filters)).to_dict('records')[0]
+        cities = self.cities.summarize(*self._city_range(state), *filters)
+        return {'customer_state': state, **summary, 'cities': int((cities['n_orders'] > 0).sum())}
+
+    def late_rates(self, state, statuses=None, categories=None, min_orders=1):
+        """The cities of ``state`` with ``min_orders`` orders, worst late rate first.
+
+        Columns: ``rank`` (1 = worst), ``customer_city``, ``late_rate`` (%),
+        ``total_orders``, ``avg_score`` and ``p50``/``p90``/``p99`` delay
+        days. Ties rank by volume, then name. Empty for an unknown state.
+        """
+        first, last = self._city_range(state)
+        frame = self._frame(self.cities.summarize(first, last, *self._filters(statuses, categories)))
+        frame.insert(0, 'customer_city', self.city_names[first:last])
+        frame = frame[frame['total_orders'] >= max(min_orders, 1)]
+        order = np.lexsort((frame['customer_city'].to_numpy(), -frame['total_orders'].to_numpy(),
+                            -frame['late_rate'].to_numpy()))
+        frame = frame.iloc[order].reset_index(drop=True)
+        frame.insert(0, 'rank', np.arange(1, len(frame) + 1))
+        return frame
@@ -0,0 +1,130 @@
+"""Bitmap filter index for the sidebar multiselects.
+
+A boolean ``isin`` mask per dimension scans the whole column on every rerun,
+and indexing with the combined mask copies every column of every matching
+row. ``FilterIndex`` is built once per loaded dataset and stores, for each
+filter dimension, one packed row bitmap per distinct value. A filter is then
+
+    AND over dimensions of (OR over the selected values' bitmaps)
+
+on ``n / 8`` bytes per bitmap, and the matching rows are only materialized
+for the columns a caller actually asks for.
+
+When more than half of a dimension's values are selected (the dashboard's
+default "everything" selections) the complement is OR-ed instead and
+subtracted from the dimension's non-null rows; selecting every value of a
+dimension without nulls imposes no constraint at all.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class _DimensionBitmaps:
+    """Packed per-value row bitmaps for one column."""
+
+    def __init__(self, column, n_bytes):
+        codes, values = pd.factorize(column, sort=True)
+        self.values = pd.Index(values)
+        self.bitmaps = _pack_bitmaps(codes, len(values), n_bytes)
+        self.has_nulls = bool((codes < 0).any())
+        self.valid = np.bitwise_or.reduce(self.bitmaps, axis=0) if len(values) else np.zeros(n_bytes, np.uint8)
+
+    def union(self, selected):
+        """Bitmap of rows whose value is in ``selected``, or None for "all rows"."""
+        positions = self.values.get_indexer(pd.Index(list(selected)).unique())
+        positions = positions[positions >= 0]
+        if len(positions) == len(self.values):
+            return self.valid.copy() if self.has_nulls else None
+        if len(positions) * 2 > len(self.values):
+            rest = np.setdiff1d(np.arange(len(self.values)), positions)
+            return self.valid & ~np.bitwise_or.reduce(self.bitmaps[rest], axis=0)
+        if len(positions) == 0:
+            return np.zeros_like(self.valid)
+        return np.bitwise_or.reduce(self.bitmaps[positions], axis=0)
+
+
+def _pack_bitmaps(codes, n_values, n_bytes):
+    """Build a ``(n_values, n_bytes)`` packed bitmap matrix in one sort.
+
+    Rows are ordered by (code, row id); bits landing in the same byte of the
+    same bitmap are distinct, so summing them with ``reduceat`` equals OR-ing.
+    """
+    bitmaps = np.zeros((n_values, n_bytes), dtype=np.uint8)
+    rows = np.flatnonzero(codes >= 0)
+    if len(rows) == 0:
+        return bitmaps
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    keys = codes[rows].astype(np.int64) * n_bytes + (rows >> 3)
+    bits = (np.uint8(128) >> (rows & 7).astype(np.uint8)).astype(np.uint8)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    bitmaps.reshape(-1)[keys[starts]] = np.add.reduceat(bits, starts)
+    return bitmaps
+
+
+class FilterIndex:
+    """Per-value row bitmaps over ``dimensions`` of a read-only ``frame``."""
+
+    def __init__(self, frame, dimensions):
+        self.frame = frame
+        self.n_rows = len(frame)
+        n_bytes = (self.n_rows + 7) // 8
+        self.dimensions = {dim: _DimensionBitmaps(frame[dim], n_bytes) for dim in dimensions}
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def bitmap(self, **selections):
+        """Packed bitmap of rows matching every ``dimension=values`` selection."""
+        result = None
+        for dim, selected in selections.items():
+            bits = self.dimensions[dim].union(selected)
+            if bits is None:
+                continue
+            if result is None:
+                result = bits
+            else:
+                np.bitwise_and(result, bits, out=result)
+        return self._all.copy() if result is None else result
+
+    def select(self, **selections):
+        """Rows matching the selections, e.g. ``select(customer_state=['SP'])``."""
+        return Selection(self.frame, self.bitmap(**selections), self.n_rows)
+
+
+class Selection:
+    """Lazily materialized subset of the indexed frame.
+
+    Row ids are decoded from the bitmap on first use and each column is only
+    gathered when asked for, so a chart that needs two columns never pays for
+    copying the rest.
+    """
+
+    def __init__(self, frame, bitmap, n_rows):
+        self._frame = frame
+        self.bitmap = bitmap
+        self._n_rows = n_rows
+        self._row_ids = None
+        self._columns = {}
+
+    @property
+    def row_ids(self):
+        if self._row_ids is None:
+            self._row_ids = np.flatnonzero(np.unpackbits(self.bitmap, count=self._n_rows))
+        return self._row_ids
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    @property
+    def empty(self):
+        return not self.bitmap.any()
+
+    def column(self, name):
+        """The selected rows of one column (gathered once, then cached)."""
+        if name not in self._columns:
+            self._columns[name] = self._frame[name].take(self.row_ids)
+        return self._columns[name]
+
+    def frame(self, columns=None):
+        """The selected rows as a DataFrame, restricted to ``columns``."""
+        columns = list(self._frame.columns) if columns is None else columns
+        return pd.DataFrame({name: self.column(name) for name in columns})
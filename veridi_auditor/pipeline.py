@@ -0,0 +1,640 @@
+"""Incremental, append-only ETL for the Veridi master dataset.
+
+The notebook rebuilds ``veridi_master_clean.csv`` from scratch: it re-reads all
+six Olist CSVs, sorts the entire reviews table to keep the latest review per
+order and runs four merges. This module produces the same rows but only does
+work for orders touched since the last run.
+
+State lives in a store directory::
+
+    store/
+      _state.json          per-source watermark and ingested files
+      _lookups.sqlite      lookup tables keyed by order (customers by customer)
+      master/purchase_month=YYYY-MM/part.parquet
+
+The lookups are SQLite tables with a primary key on the order (or customer)
+id, so a run reads and rewrites only the entries of the ids it touches:
+
+- ``latest_review``: order_id -> latest review
+- ``order_items``: every item's category, by order, file and line
+- ``order_category``: order_id -> first categorised item's category
+- ``category_weights``: (order_id, category) -> share of the order's items
+- ``customers``: customer_id -> state and city
+- ``orders``: order_id -> customer and master partition
+
+Each run reads only new (or modified) source files: new files whole, and
+modified ones only for rows changed since the source's watermark. Orders,
+reviews, items and customers that arrive are folded into the lookups. Every
+affected order is re-derived and upserted into its ``purchase_month``
+partition, so a daily refresh rewrites a handful of partitions instead of
+the whole history. Only products and the category translation (one row per
+product and per category) are read in full, and only when items arrive.
+
+    python -m veridi_auditor.pipeline --source-dir data/ --store master_store/ \\
+        --export veridi_master_clean.feather
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import shutil
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor.attribution import category_weights_path, write_category_weights
+from veridi_auditor.profiling import PROFILER
+from veridi_auditor.sketch import build_summaries, summaries_path
+from veridi_auditor.storage import DELIVERY_STATUSES, MASTER_COLUMNS, read_master, write_master
+
+SOURCE_PATTERNS = {
+    'orders': 'olist_orders_dataset*.csv',
+    'reviews': 'olist_order_reviews_dataset*.csv',
+    'items': 'olist_order_items_dataset*.csv',
+    'customers': 'olist_customers_dataset*.csv',
+    'products': 'olist_products_dataset*.csv',
+    'translation': 'product_category_name_translation*.csv',
+}
+
+# A row's "last changed" time is the latest of these; rows at or after the
+# source's watermark are (re)processed. A review's score is fixed once it is
+# created, and items and customers have no timestamp, so they are tracked by
+# file only.
+CHANGE_COLUMNS = {
+    'orders': ['order_purchase_timestamp', 'order_approved_at',
+               'order_delivered_carrier_date', 'order_delivered_customer_date'],
+    'reviews': ['review_creation_date'],
+    'items': [],
+    'customers': [],
+}
+INCREMENTAL_SOURCES = list(CHANGE_COLUMNS)
+
+# Columns read_delta adds to every row: the file it came from and its line in it.
+SOURCE_FILE = 'source_file'
+SOURCE_ROW = 'source_row'
+
+ORDER_DATETIME_COLUMNS = [
+    'order_purchase_timestamp',
+    'order_estimated_delivery_date',
+    'order_delivered_customer_date',
+]
+
+# Delivery classification: "On Time" up to LATE_AFTER_DAYS past the estimate,
+# "Late" up to SUPER_LATE_AFTER_DAYS, "Super Late" beyond.
+LATE_AFTER_DAYS = 0
+SUPER_LATE_AFTER_DAYS = 5
+
+MASTER_DIR = 'master'
+LOOKUP_DB = '_lookups.sqlite'
+LEGACY_LOOKUP_DIR = '_lookups'
+STATE_FILE = '_state.json'
+PARTITION_KEY = 'purchase_month'
+
+LOOKUP_SCHEMA = """
+CREATE TABLE latest_review (order_id TEXT PRIMARY KEY, review_creation_date TEXT, review_score REAL);
+CREATE TABLE order_items (order_id TEXT NOT NULL, source_file TEXT NOT NULL, source_row INTEGER NOT NULL,
+                          product_category_en TEXT, PRIMARY KEY (order_id, source_file, source_row));
+CREATE INDEX order_items_file ON order_items (source_file);
+CREATE TABLE order_category (order_id TEXT PRIMARY KEY, product_category_en TEXT);
+CREATE TABLE category_weights (order_id TEXT NOT NULL, product_category_en TEXT NOT NULL, weight REAL,
+                               PRIMARY KEY (order_id, product_category_en));
+CREATE TABLE customers (customer_id TEXT PRIMARY KEY, customer_state TEXT, customer_city TEXT);
+CREATE TABLE orders (order_id TEXT PRIMARY KEY, customer_id TEXT, purchase_month TEXT);
+CREATE INDEX orders_customer ON orders (customer_id);
+"""
+
+
+# --- Notebook semantics ------------------------------------------------------
+
+def _first_max(codes, n_groups, values):
+    """Row of each group's largest ``values``, the earliest such row on ties.
+
+    Two unbuffered ``ufunc.at`` passes over the rows, so O(n) with no sort.
+    """
+    best = np.full(n_groups, np.iinfo(np.int64).min)
+    np.maximum.at(best, codes, values)
+    candidates = np.flatnonzero(values == best[codes])
+    first = np.full(n_groups, len(codes))
+    np.minimum.at(first, codes[candidates], candidates)
+    return first
+
+
+def dedup_reviews(reviews):
+    """Latest review per ``order_id`` (ties keep the first row seen).
+
+    Same rule as the notebook, which sorts by order and creation date
+    descending and keeps the first row per order, including its tie-break
+    and reviews without a date losing to dated ones. Instead of the full
+    sort, order ids are hashed once and each order's latest row is found in
+    linear passes. Orders come out in order of first appearance.
+    """
+    reviews = reviews[['order_id', 'review_creation_date', 'review_score']].reset_index(drop=True)
+    created = pd.to_datetime(reviews['review_creation_date'])
+    codes, uniques = pd.factorize(reviews['order_id'])
+    # NaT is the smallest int64, so it only wins when an order has no dated review.
+    latest = _first_max(codes, len(uniques), created.to_numpy(dtype='datetime64[ns]').view(np.int64))
+    return reviews.iloc[latest].assign(review_creation_date=created.iloc[latest]).reset_index(drop=True)
+
+
+def _item_categories(items, products, translation):
+    """Each item's position in the English category names (-1 if it has none).
+
+    Returns the positions and the names. This is equivalent to the notebook's
+    two left merges, done as hash lookups: the (small) translation is looked
+    up once per product, then each item once in the product index. A
+    duplicated product or category key resolves to its first row, which is
+    also what ``keep='first'`` picks after the merge fans it out.
+    """
+    products = products.drop_duplicates(subset=['product_id'])
+    translation = translation.drop_duplicates(subset=['product_category_name'])
+    per_product = pd.Index(translation['product_category_name']).get_indexer(products['product_category_name'])
+    product = pd.Index(products['product_id']).get_indexer(items['product_id'])
+    codes = np.where(product >= 0, per_product[product], -1)
+    return codes, pd.Index(translation['product_category_name_english'])
+
+
+def item_categories(items, products, translation):
+    """English category of each item in ``items`` (None when it has none)."""
+    codes, names = _item_categories(items, products, translation)
+    return np.append(names.to_numpy(dtype=object), None)[codes]
+
+
+def first_categories(items, products, translation):
+    """English category of each order's first categorised item."""
+    return _first_categories(items['order_id'], item_categories(items, products, translation))
+
+
+def _first_categories(order_ids, categories):
+    """First non-null of ``categories`` per order, in order of first appearance."""
+    found = pd.notna(categories)
+    order_ids = pd.Series(np.asarray(order_ids, dtype=object)[found])
+    first = ~order_ids.duplicated().to_numpy()
+    return pd.DataFrame({'order_id': order_ids[first].to_numpy(),
+                         'product_category_en': categories[found][first]})
+
+
+def category_weights(items, products, translation):
+    """Each order's share in every category of its categorised items.
+
+    One row per (order, category) with ``weight`` = the category's fraction
+    of the order's categorised items, so each order's weights sum to 1. It
+    is the lookup behind the dashboard's weighted category attribution (see
+    ``veridi_auditor.attribution``) and sits beside the master table rather
+    than exploding it.
+    """
+    return _category_weights(items['order_id'], item_categories(items, products, translation))
+
+
+def _category_weights(order_ids, categories):
+    found = pd.notna(categories)
+    pairs = pd.DataFrame({'order_id': np.asarray(order_ids, dtype=object)[found],
+                          'product_category_en': categories[found]})
+    counts = pairs.groupby(['order_id', 'product_category_en'], sort=False).size()
+    weights = counts / counts.groupby(level='order_id', sort=False).transform('sum')
+    return weights.rename('weight').reset_index()
+
+
+def classify_delay(days, late_after=LATE_AFTER_DAYS, super_late_after=SUPER_LATE_AFTER_DAYS):
+    """Vectorized ``delivery_status`` for an array of ``days_difference``.
+
+    Returns an ordered categorical (On Time < Late < Super Late) whose codes
+    are simply the number of thresholds the delay exceeds.
+    """
+    days = np.asarray(days)
+    codes = (days > late_after).astype(np.int8) + (days > super_late_after)
+    return pd.Categorical.from_codes(codes, categories=DELIVERY_STATUSES, ordered=True)
+
+
+def _month_labels(timestamps):
+    """``YYYY-MM`` of each timestamp as a categorical, formatting each month once."""
+    months = timestamps.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+    valid = ~np.isnat(months)
+    if not valid.any():
+        return pd.Categorical.from_codes(np.full(len(months), -1), categories=[])
+    ordinal = months.view(np.int64)
+    first = ordinal[valid].min()
+    offset = np.where(valid, ordinal - first, 0)
+    present = np.bincount(offset[valid]) > 0
+    codes = np.where(valid, (np.cumsum(present) - 1)[offset], -1)
+    labels = np.datetime_as_string((first + np.flatnonzero(present)).astype('datetime64[M]'), unit='M')
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def derive_columns(orders, late_after=LATE_AFTER_DAYS, super_late_after=SUPER_LATE_AFTER_DAYS):
+    """Add ``days_difference``, ``delivery_status``, ``is_late`` and ``purchase_month``.
+
+    One vectorized pass over datetime columns that are already parsed and, for
+    the two delivery dates, present. ``days_difference`` compares calendar
+    days (time of day ignored); positive means late.
+    """
+    delivered = orders['order_delivered_customer_date'].to_numpy(dtype='datetime64[ns]')
+    estimated = orders['order_estimated_delivery_date'].to_numpy(dtype='datetime64[ns]')
+    days = (delivered.astype('datetime64[D]') - estimated.astype('datetime64[D]')).astype(np.int64)
+    status = classify_delay(days, late_after, super_late_after)
+    return orders.assign(
+        days_difference=days,
+        delivery_status=status,
+        is_late=status.codes > 0,
+        purchase_month=_month_labels(orders['order_purchase_timestamp']),
+    )
+
+
+def derive_delivery_columns(orders, **thresholds):
+    """Parse dates, keep measurable deliveries and add the derived columns."""
+    orders = orders.copy()
+    for name in ORDER_DATETIME_COLUMNS:
+        orders[name] = pd.to_datetime(orders[name])
+    orders = orders[
+        (orders['order_status'] == 'delivered') &
+        (orders['order_delivered_customer_date'].notna()) &
+        (orders['order_estimated_delivery_date'].notna())
+    ]
+    return derive_columns(orders, **thresholds)
+
+
+def _assemble(orders, customers, latest_reviews, categories):
+    """Join derived orders with their customer, latest review and category.
+
+    ``customers`` may be ``None`` when ``orders`` already carries the customer
+    columns (the partitioned build joins them per ``customer_id`` partition).
+    """
+    master = orders
+    if customers is not None:
+        master = pd.merge(master, customers[['customer_id', 'customer_state', 'customer_city']],
+                          on='customer_id', how='left')
+    master = pd.merge(master, latest_reviews[['order_id', 'review_score']], on='order_id', how='left')
+    master = pd.merge(master, categories[['order_id', 'product_category_en']], on='order_id', how='left')
+    return master[MASTER_COLUMNS]
+
+
+def build_master(orders, customers, reviews, items, products, translation, **thresholds):
+    """Full rebuild with the notebook's semantics (the reference for ``refresh``)."""
+    orders = derive_delivery_columns(orders, **thresholds)
+    return _assemble(orders, customers, dedup_reviews(reviews),
+                     first_categories(items, products, translation)).reset_index(drop=True)
+
+
+# --- Sources -----------------------------------------------------------------
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _source_files(source_dir, name):
+    return sorted(glob.glob(os.path.join(source_dir, SOURCE_PATTERNS[name])))
+
+
+def read_dimension(source_dir, name):
+    """Read every file of a (small) dimension source."""
+    files = _source_files(source_dir, name)
+    if not files:
+        raise FileNotFoundError(f"no {SOURCE_PATTERNS[name]} in {source_dir}")
+    return pd.concat([pd.read_csv(path) for path in files], ignore_index=True)
+
+
+def _changed_at(rows, name):
+    """When each row of source ``name`` last changed (the latest of its ``CHANGE_COLUMNS``)."""
+    return rows[CHANGE_COLUMNS[name]].apply(pd.to_datetime).max(axis=1)
+
+
+def read_delta(source_dir, name, source_state):
+    """Rows of an incremental source that are new since ``source_state``.
+
+    New files are taken whole: a late drop may hold rows older than the
+    watermark. Only files read before (and modified since) are cut to the
+    rows changed at or after it. Each row carries its file name and line
+    (``SOURCE_FILE``, ``SOURCE_ROW``). Returns the rows and the updated state
+    for the source (watermark and file signatures); the caller persists the
+    state only after the upsert succeeds.
+    """
+    seen = source_state.get('files', {})
+    watermark = source_state.get('watermark')
+    files = {os.path.basename(p): p for p in _source_files(source_dir, name)}
+    changed = [f for f in sorted(files) if seen.get(f) != _file_signature(files[f])]
+
+    frames = []
+    for f in changed:
+        frame = pd.read_csv(files[f])
+        frame[SOURCE_FILE], frame[SOURCE_ROW] = f, np.arange(len(frame))
+        if CHANGE_COLUMNS[name] and watermark is not None and f in seen and not frame.empty:
+            # ">=" so rows sharing the watermark instant are not lost; upserts are idempotent.
+            frame = frame[_changed_at(frame, name) >= pd.Timestamp(watermark)]
+        frames.append(frame)
+    # Every incremental source is keyed by order_id (customers by customer_id), even when nothing is new.
+    key = 'customer_id' if name == 'customers' else 'order_id'
+    empty = pd.DataFrame(columns=[key, SOURCE_FILE, SOURCE_ROW])
+    delta = pd.concat(frames, ignore_index=True) if frames else empty
+
+    new_state = {'files': {**seen, **{f: _file_signature(files[f]) for f in changed}},
+                 'watermark': watermark}
+    if CHANGE_COLUMNS[name] and not delta.empty:
+        changed_at = _changed_at(delta, name)
+        candidates = [t for t in (changed_at.max(), pd.Timestamp(watermark) if watermark else None)
+                      if t is not None and not pd.isna(t)]
+        if candidates:
+            new_state['watermark'] = max(candidates).isoformat()
+    return delta.reset_index(drop=True), new_state
+
+
+# --- Store -------------------------------------------------------------------
+
+class MasterStore:
+    """Partitioned master table plus the lookups and state needed to update it."""
+
+    def __init__(self, root):
+        self.root = root
+        self.master_dir = os.path.join(root, MASTER_DIR)
+        self.lookup_path = os.path.join(root, LOOKUP_DB)
+
+    # State and lookups
+
+    def load_state(self):
+        path = os.path.join(self.root, STATE_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        path = os.path.join(self.root, STATE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def open_lookups(self):
+        """Connection to the lookup database, created (empty) on first use.
+
+        Raises ``ValueError`` for a store written with the earlier Parquet
+        lookups, which this version does not convert.
+        """
+        if os.path.isdir(os.path.join(self.root, LEGACY_LOOKUP_DIR)):
+            raise ValueError(f"store {self.root} has Parquet lookups from an earlier version; "
+                             "rebuild it into an empty store")
+        os.makedirs(self.root, exist_ok=True)
+        exists = os.path.exists(self.lookup_path)
+        con = sqlite3.connect(self.lookup_path)
+        if not exists:
+            con.executescript(LOOKUP_SCHEMA)
+        return con
+
+    def load_lookup(self, name, columns=None):
+        """A whole lookup table (for exports; refreshes read only their keys with ``_lookup``)."""
+        if not os.path.exists(self.lookup_path):
+            return pd.DataFrame(columns=columns or [])
+        with contextlib.closing(sqlite3.connect(f'file:{self.lookup_path}?mode=ro', uri=True)) as con:
+            return pd.read_sql_query(f"SELECT {', '.join(columns or ['*'])} FROM {name}", con)
+
+    # Partitions
+
+    def partition_path(self, month):
+        return os.path.join(self.master_dir, f"{PARTITION_KEY}={month}", "part.parquet")
+
+    def read_partition(self, month):
+        path = self.partition_path(month)
+        if not os.path.exists(path):
+            return None
+        df = read_master(path)
+        df[PARTITION_KEY] = month
+        return df
+
+    def write_partition(self, month, df):
+        path = self.partition_path(month)
+        if df.empty:
+            if os.path.exists(path):
+                shutil.rmtree(os.path.dirname(path))
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df = df.sort_values('order_id').reset_index(drop=True)
+        write_master(df.drop(columns=[PARTITION_KEY]), path)
+
+    def months(self):
+        if not os.path.isdir(self.master_dir):
+            return []
+        prefix = f"{PARTITION_KEY}="
+        return sorted(d[len(prefix):] for d in os.listdir(self.master_dir) if d.startswith(prefix))
+
+    def read_all(self, columns=None):
+        """The whole master table, in ``MASTER_COLUMNS`` order."""
+        df = read_master(self.master_dir, columns=columns)
+        return df[columns or MASTER_COLUMNS]
+
+
+def _plain(df):
+    """Categorical columns back to plain values so partitions concatenate cleanly."""
+    return df.apply(lambda col: col.astype(object) if isinstance(col.dtype, pd.CategoricalDtype) else col)
+
+
+def _lookup(con, table, key, ids, columns='*'):
+    """Rows of lookup ``table`` whose ``key`` is one of ``ids`` (read through the key index)."""
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS lookup_keys (id TEXT PRIMARY KEY)")
+    con.execute("DELETE FROM temp.lookup_keys")
+    con.executemany("INSERT OR IGNORE INTO temp.lookup_keys VALUES (?)", ((i,) for i in ids))
+    return pd.read_sql_query(f"SELECT {columns} FROM {table} WHERE {key} IN (SELECT id FROM temp.lookup_keys)", con)
+
+
+def _rows(df):
+    """``df`` as SQLite parameter tuples: timestamps as ISO text, missing values as NULL."""
+    df = df.apply(lambda col: col.astype(str).where(col.notna(), None)
+                  if pd.api.types.is_datetime64_any_dtype(col.dtype) else col)
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def _replace(con, table, key, ids, df):
+    """Replace every entry of ``table`` for ``ids`` with the rows of ``df``."""
+    con.executemany(f"DELETE FROM {table} WHERE {key} = ?", ((i,) for i in ids))
+    con.executemany(f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})",
+                    _rows(df))
+
+
+def fold_reviews(con, reviews):
+    """Fold new reviews into ``latest_review``; returns the ids of the orders whose entry was re-ranked."""
+    ids = pd.Index(reviews['order_id'].unique())
+    if reviews.empty:
+        return ids
+    columns = ['order_id', 'review_creation_date', 'review_score']
+    # Stored reviews come first, so they keep winning ties as they did in the file order.
+    combined = pd.concat([_lookup(con, 'latest_review', 'order_id', ids), reviews[columns]], ignore_index=True)
+    _replace(con, 'latest_review', 'order_id', ids, dedup_reviews(combined))
+    return ids
+
+
+def fold_items(con, items, products, translation):
+    """Fold new items into ``order_items`` and recompute their orders' category and weights.
+
+    A re-read file replaces its earlier rows. Each touched order is then
+    recomputed from all of its items, in file and line order, so an order
+    whose items span several drops keeps the categories of every drop.
+    Returns the ids of the touched orders.
+    """
+    files = items[SOURCE_FILE].unique().tolist()
+    before = _lookup(con, 'order_items', SOURCE_FILE, files, 'DISTINCT order_id')['order_id']
+    ids = pd.Index(items['order_id'].unique()).union(pd.Index(before))
+    con.executemany("DELETE FROM order_items WHERE source_file = ?", ((f,) for f in files))
+    rows = items[['order_id', SOURCE_FILE, SOURCE_ROW]].assign(
+        product_category_en=item_categories(items, products, translation))
+    con.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?)", _rows(rows))
+
+    stored = _lookup(con, 'order_items', 'order_id', ids).sort_values([SOURCE_FILE, SOURCE_ROW], kind='stable')
+    categories = stored['product_category_en'].to_numpy(dtype=object)
+    _replace(con, 'order_category', 'order_id', ids, _first_categories(stored['order_id'], categories))
+    _replace(con, 'category_weights', 'order_id', ids, _category_weights(stored['order_id'], categories))
+    return ids
+
+
+def fold_customers(con, customers):
+    """Fold new customer rows into ``customers``; returns the ids of the master orders they belong to."""
+    if customers.empty:
+        return pd.Index([])
+    customers = customers[['customer_id', 'customer_state', 'customer_city']].drop_duplicates(
+        subset=['customer_id'], keep='last')
+    _replace(con, 'customers', 'customer_id', customers['customer_id'], customers)
+    return pd.Index(_lookup(con, 'orders', 'customer_id', customers['customer_id'], 'order_id')['order_id'])
+
+
+def refresh(source_dir, store_dir, late_after=LATE_AFTER_DAYS, super_late_after=SUPER_LATE_AFTER_DAYS):
+    """Process new source rows into ``store_dir``; returns a run summary.
+
+    The work is proportional to the new rows: lookups are read and written
+    only for the orders they touch, and only those orders' partitions are
+    rewritten. A run with nothing new writes nothing.
+
+    The delay thresholds are fixed for the lifetime of a store: rows already
+    in the master were classified with them, so a different value raises
+    ``ValueError`` instead of silently mixing two definitions of "late".
+    """
+    store = MasterStore(store_dir)
+    state = store.load_state()
+    sources_state = state.get('sources', {})
+    thresholds = {'late_after': late_after, 'super_late_after': super_late_after}
+    if state.get('thresholds', thresholds) != thresholds:
+        raise ValueError(f"store {store_dir} was built with {state['thresholds']}, not {thresholds}; "
+                         "rebuild it into an empty store to change the delay thresholds")
+
+    deltas, new_sources_state = {}, dict(sources_state)
+    with PROFILER.stage('read_deltas') as stats:
+        for name in INCREMENTAL_SOURCES:
+            deltas[name], new_sources_state[name] = read_delta(source_dir, name, sources_state.get(name, {}))
+        stats['rows'] = sum(len(delta) for delta in deltas.values())
+
+    with contextlib.closing(store.open_lookups()) as con:
+        # Latest review per order, including orders not delivered yet.
+        with PROFILER.stage('fold_reviews', rows=len(deltas['reviews'])):
+            review_ids = fold_reviews(con, deltas['reviews'])
+
+        # First categorised item and category weights of every order with new items.
+        with PROFILER.stage('fold_categories', rows=len(deltas['items'])):
+            category_ids = pd.Index([])
+            if not deltas['items'].empty:
+                category_ids = fold_items(con, deltas['items'], read_dimension(source_dir, 'products'),
+                                          read_dimension(source_dir, 'translation'))
+
+        with PROFILER.stage('fold_customers', rows=len(deltas['customers'])):
+            customer_order_ids = fold_customers(con, deltas['customers'])
+
+        # Re-derive changed orders (the last version of each wins).
+        with PROFILER.stage('derive', rows=len(deltas['orders'])):
+            order_delta = deltas['orders'].drop_duplicates(subset=['order_id'], keep='last')
+            order_ids = pd.Index(order_delta['order_id'])
+            derived = derive_delivery_columns(order_delta, **thresholds) if not order_delta.empty else None
+            if derived is None:
+                new_rows = pd.DataFrame(columns=MASTER_COLUMNS)
+            else:
+                ids = derived['order_id']
+                new_rows = _assemble(derived, _lookup(con, 'customers', 'customer_id', derived['customer_id']),
+                                     _lookup(con, 'latest_review', 'order_id', ids),
+                                     _lookup(con, 'order_category', 'order_id', ids))
+
+        # Orders already in the master whose review, category or customer changed.
+        touched = review_ids.union(category_ids).union(customer_order_ids).difference(order_ids)
+        refreshed = _lookup(con, 'orders', 'order_id', touched)
+        replaced = _lookup(con, 'orders', 'order_id', order_ids.union(touched))
+        updates = (refreshed[['order_id', 'customer_id']]
+                   .merge(_lookup(con, 'customers', 'customer_id', refreshed['customer_id']),
+                          on='customer_id', how='left')
+                   .merge(_lookup(con, 'latest_review', 'order_id', refreshed['order_id']), on='order_id', how='left')
+                   .merge(_lookup(con, 'order_category', 'order_id', refreshed['order_id']), on='order_id', how='left')
+                   .set_index('order_id'))
+
+        months = set(new_rows[PARTITION_KEY]) | set(replaced[PARTITION_KEY])
+        with PROFILER.stage('upsert_partitions') as stats:
+            stats['rows'] = 0
+            for month in sorted(months):
+                partition = store.read_partition(month)
+                if partition is None:
+                    partition = pd.DataFrame(columns=MASTER_COLUMNS)
+                updated = partition[partition['order_id'].isin(refreshed['order_id'])].copy()
+                for column in ('customer_state', 'customer_city', 'review_score', 'product_category_en'):
+                    updated[column] = updated['order_id'].map(updates[column])
+                keep = partition[~partition['order_id'].isin(replaced['order_id'])]
+                frames = [f for f in (keep, updated, new_rows[new_rows[PARTITION_KEY] == month]) if not f.empty]
+                merged = pd.concat([_plain(f) for f in frames], ignore_index=True)[MASTER_COLUMNS] \
+                    if frames else pd.DataFrame(columns=MASTER_COLUMNS)
+                store.write_partition(month, merged)
+                stats['rows'] += len(partition)
+
+        with PROFILER.stage('save_lookups'):
+            if derived is not None:
+                entries = derived[['order_id', 'customer_id', PARTITION_KEY]].astype({PARTITION_KEY: str})
+                _replace(con, 'orders', 'order_id', order_ids, entries)
+            con.commit()  # nothing to commit (and the file is untouched) when nothing was new
+            master_rows = con.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+            state['thresholds'] = thresholds
+            if new_sources_state != sources_state or 'sources' not in state:
+                state['sources'] = new_sources_state
+                store.save_state(state)
+
+    return {
+        'orders_changed': len(order_ids),
+        'reviews_new': len(deltas['reviews']),
+        'items_new': len(deltas['items']),
+        'customers_new': len(deltas['customers']),
+        'rows_upserted': len(new_rows) + len(refreshed),
+        'partitions_rewritten': len(months),
+        'master_rows': master_rows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally refresh the Veridi master store.")
+    parser.add_argument('--source-dir', required=True, help='directory holding the Olist CSV drops')
+    parser.add_argument('--store', required=True, help='partitioned master store directory')
+    parser.add_argument('--export', help='also write the consolidated master file (.feather/.parquet/.csv)')
+    parser.add_argument('--summaries', action='store_true',
+                        help="with --export, also build the approximate-mode summaries next to it")
+    parser.add_argument('--metrics', help='write per-stage timings here (.json, else Prometheus text)')
+    parser.add_argument('--late-after', type=int, default=LATE_AFTER_DAYS,
+                        help='days past the estimate before an order counts as Late (default: %(default)s)')
+    parser.add_argument('--super-late-after', type=int, default=SUPER_LATE_AFTER_DAYS,
+                        help='days past the estimate before an order counts as Super Late (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    with PROFILER.run('pipeline'):
+        summary = refresh(args.source_dir, args.store,
+                          late_after=args.late_after, super_late_after=args.super_late_after)
+        print(json.dumps(summary, indent=2))
+
+        if args.export:
+            with PROFILER.stage('export') as stats:
+                master = MasterStore(args.store).read_all()
+                stats['rows'] = len(master)
+                if args.export.endswith('.csv'):
+                    master.to_csv(args.export, index=False)
+                else:
+                    write_master(master, args.export)
+                weights = MasterStore(args.store).load_lookup('category_weights')
+                write_category_weights(weights[weights['order_id'].isin(master['order_id'])],
+                                       category_weights_path(args.export))
+            if args.summaries:
+                with PROFILER.stage('build_summaries', rows=len(master)):
+                    build_summaries(master).save(summaries_path(args.export))
+    if args.metrics:
+        PROFILER.export(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""Per-stage timing for dashboard reruns and ETL runs.
+
+``Profiler.stage(name)`` times the enclosed block as one named stage. Stages
+nest, and inner stages are recorded as ``outer/inner``. A stage may also
+report the rows it scanned, through its ``rows`` argument or by setting
+``stats['rows']`` inside the block. When ``track_memory`` is on (it starts
+``tracemalloc``, which slows everything down noticeably), each stage also
+records its peak allocation above the memory in use when it started.
+
+A *run* is one dashboard rerun or one ETL invocation: ``begin``/``end``
+(or the ``run`` context manager) group the stages between them. The last
+``history`` runs are kept with their per-stage breakdown, and cumulative
+per-stage counters are kept for export:
+
+- ``to_prometheus``: Prometheus text exposition format (counters labelled by
+  stage), for a node-exporter textfile collector or a diff in CI
+- ``to_json``: the counters plus the recent runs
+
+``PROFILER`` is the process-wide instance the ETL modules, the engine and
+app.py record into. Runs and stages are tracked per thread, so concurrent
+dashboard sessions do not mix their stages.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+HISTORY = 50
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Profiler:
+    """Named-stage timings of recent runs plus cumulative per-stage counters."""
+
+    def __init__(self, history=HISTORY, prefix='veridi'):
+        self.prefix = prefix
+        self.runs = deque(maxlen=history)
+        self.totals = {}      # stage -> {'calls', 'seconds', 'rows', 'bytes'}
+        self.run_totals = {}  # run name -> {'runs', 'seconds'}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- Memory tracking --------------------------------------------------
+
+    @property
+    def track_memory(self):
+        return tracemalloc.is_tracing()
+
+    @track_memory.setter
+    def track_memory(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # --- Recording ---------------------------------------------------------
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+            self._local.record = None
+        return self._local.stack
+
+    def begin(self, name='rerun'):
+        """Start a run on this thread.
+
+        An unfinished earlier run (a dashboard rerun that Streamlit interrupted
+        with a newer one) is recorded first, marked ``interrupted`` and timed
+        up to the end of its last stage.
+        """
+        self._stack().clear()
+        record = self._local.record
+        if record is not None:
+            record['interrupted'] = True
+            self._finish(record, record.pop('_last', record['_start']))
+        self._local.record = {'run': name, 'started': time.time(), 'seconds': None, 'stages': [],
+                              'interrupted': False, '_start': time.perf_counter()}
+
+    def end(self):
+        """Finish this thread's run; returns its record (None if none was started)."""
+        self._stack()
+        record, self._local.record = self._local.record, None
+        if record is None:
+            return None
+        record.pop('_last', None)
+        return self._finish(record, time.perf_counter())
+
+    def _finish(self, record, stop):
+        record['seconds'] = stop - record.pop('_start')
+        with self._lock:
+            self.runs.append(record)
+            totals = self.run_totals.setdefault(record['run'], {'runs': 0, 'seconds': 0.0})
+            totals['runs'] += 1
+            totals['seconds'] += record['seconds']
+        return record
+
+    @contextlib.contextmanager
+    def run(self, name='rerun'):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Time the enclosed block as stage ``name``; yields its mutable stats."""
+        stack = self._stack()
+        stats = {'stage': '/'.join([frame['stats']['stage'] for frame in stack[-1:]] + [name]),
+                 'seconds': None, 'rows': rows, 'bytes': None}
+        frame = {'stats': stats, 'peak': 0}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:  # keep the enclosing stage's peak so far before resetting it
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            frame['base'] = current
+            tracemalloc.reset_peak()
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = time.perf_counter() - start
+            stack.pop()
+            if tracing and tracemalloc.is_tracing():
+                peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+                stats['bytes'] = max(peak - frame['base'], 0)
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            self._record(stats)
+
+    def _record(self, stats):
+        record = self._local.record
+        if record is not None:
+            record['stages'].append(dict(stats))
+            record['_last'] = time.perf_counter()
+        with self._lock:
+            totals = self.totals.setdefault(stats['stage'], {'calls': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0})
+            totals['calls'] += 1
+            totals['seconds'] += stats['seconds']
+            totals['rows'] += int(stats['rows'] or 0)
+            totals['bytes'] += int(stats['bytes'] or 0)
+
+    def timed(self, name=None):
+        """Decorator recording each call of the function as a stage."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self.runs.clear()
+            self.totals.clear()
+            self.run_totals.clear()
+
+    # --- Reporting ---------------------------------------------------------
+
+    def breakdown(self, last=None):
+        """One row per stage of the last ``last`` runs (oldest first)."""
+        with self._lock:
+            runs = list(self.runs)[-last:] if last else list(self.runs)
+        rows = [{'run_index': i, 'run': record['run'], 'run_seconds': record['seconds'], **stage}
+                for i, record in enumerate(runs) for stage in record['stages']]
+        frame = pd.DataFrame(rows, columns=['run_index', 'run', 'run_seconds', 'stage', 'seconds', 'rows', 'bytes'])
+        return frame.astype({'rows': float, 'bytes': float})
+
+    def to_json(self):
+        with self._lock:
+            document = {'stages': {k: dict(v) for k, v in self.totals.items()},
+                        'runs': {k: dict(v) for k, v in self.run_totals.items()},
+                        'recent': [dict(r) for r in self.runs]}
+        return json.dumps(document, indent=2)
+
+    def to_prometheus(self):
+        p = self.prefix
+        metrics = [
+            ('stage_seconds_total', 'Wall-clock seconds spent in each stage.', 'seconds'),
+            ('stage_calls_total', 'Times each stage ran.', 'calls'),
+            ('stage_rows_total', 'Rows scanned by each stage.', 'rows'),
+            ('stage_allocated_bytes_total', 'Peak bytes allocated by each stage (when tracked).', 'bytes'),
+        ]
+        with self._lock:
+            totals = {k: dict(v) for k, v in self.totals.items()}
+            run_totals = {k: dict(v) for k, v in self.run_totals.items()}
+        lines = []
+        for metric, help_text, field in metrics:
+            lines += [f'# HELP {p}_{metric} {help_text}', f'# TYPE {p}_{metric} counter']
+            lines += [f'{p}_{metric}{{stage="{_label(stage)}"}} {values[field]}'
+                      for stage, values in sorted(totals.items())]
+        for metric, help_text, field in [('runs_total', 'Finished runs, interrupted ones included.', 'runs'),
+                                         ('run_seconds_total', 'Wall-clock seconds of finished runs.', 'seconds')]:
+            lines += [f'# HELP {p}_{metric} {help_text}', f'# TYPE {p}_{metric} counter']
+            lines += [f'{p}_{metric}{{run="{_label(run)}"}} {values[field]}'
+                      for run, values in sorted(run_totals.items())]
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, fmt=None):
+        """Write the metrics to ``path`` atomically (JSON for ``.json``, else Prometheus text)."""
+        fmt = fmt or ('json' if str(path).endswith('.json') else 'prometheus')
+        text = self.to_json() if fmt == 'json' else self.to_prometheus()
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return path
+
+
+PROFILER = Profiler()
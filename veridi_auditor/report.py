@@ -0,0 +1,419 @@
+"""Batch audit reports: every dashboard chart and table for many filter scenarios.
+
+The weekly audit used to be re-run by hand in the notebook. This command
+writes one report per scenario from a single loaded ``AuditEngine``, with
+one scenario per value of a key (each state, each region, each status or
+each category) under optional base filters. Each report has:
+
+- the KPIs and every metric table as CSV;
+- every dashboard figure as PNG (needs ``kaleido``);
+- an HTML page with the figures in tab order.
+
+An index page and a ``kpis.csv`` compare the scenarios.
+
+Scenarios share the aggregation. The base filters are applied to the cube
+once, and the matching cells are split by the scenario key in one stable
+sort. Each scenario's ``Audit`` then sums over its own run of cell ids, so
+the metrics for 27 states cost about as much as one audit of all of them.
+The tables are computed in this process, and the figures are built and
+written by ``workers`` processes that get only those tables.
+
+    python -m veridi_auditor.report --by state --output reports/
+    python -m veridi_auditor.report --by region --status Late --status "Super Late" \\
+        --format html csv png --workers 4 --output reports/
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html import escape
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from veridi_auditor.chunked import _Inline
+from veridi_auditor.engine import MIN_CATEGORY_ORDERS, MIN_CITY_ORDERS, TOP_N, Audit, AuditEngine, _table
+from veridi_auditor.figures import DEFAULT_PARAMS, FIGURES, build_figure
+from veridi_auditor.profiling import PROFILER
+from veridi_auditor.storage import MASTER_COLUMNAR, MASTER_CSV
+
+try:
+    import kaleido
+except ImportError:  # optional: only PNG output needs it
+    kaleido = None
+
+# IBGE macro-regions of the customer states.
+REGIONS = {
+    'Norte': ['AC', 'AM', 'AP', 'PA', 'RO', 'RR', 'TO'],
+    'Nordeste': ['AL', 'BA', 'CE', 'MA', 'PB', 'PE', 'PI', 'RN', 'SE'],
+    'Centro-Oeste': ['DF', 'GO', 'MS', 'MT'],
+    'Sudeste': ['ES', 'MG', 'RJ', 'SP'],
+    'Sul': ['PR', 'RS', 'SC'],
+}
+
+# Scenario key -> the cube dimension it splits on.
+SCENARIO_KEYS = {
+    'state': 'customer_state',
+    'region': 'customer_state',
+    'status': 'delivery_status',
+    'category': 'product_category_en',
+}
+
+# Cube dimension -> its ``AuditEngine.select`` keyword.
+FILTER_KEYWORDS = {'customer_state': 'states', 'delivery_status': 'statuses',
+                   'product_category_en': 'categories'}
+
+FORMATS = ['html', 'csv', 'png']
+CITY_CHART_ROWS = 15
+PNG_WIDTH, PNG_HEIGHT = 1100, 500
+PAGE_BACKGROUND = '#0f172a'
+
+# The dashboard's tabs and the figures each shows.
+SECTIONS = {
+    'Overall Delivery Performance': ['status_pie', 'delay_histogram', 'delay_by_score'],
+    'Geographic Delay Analysis': ['state_late_rate', 'city_late_rate'],
+    'Customer Experience Correlates': ['score_by_status', 'score_heatmap', 'sentiment_decay'],
+    'Category Vulnerability Matrix': ['category_late_rate'],
+    'Temporal Convergence': ['monthly_trends'],
+}
+
+
+class _Rows:
+    """A ``Selection`` over known cell ids; ``Audit`` reads nothing else."""
+
+    def __init__(self, row_ids):
+        self.row_ids = row_ids
+        self.bitmap = np.empty(0, dtype=np.uint8)  # never built: the ids come from the split
+
+    @property
+    def empty(self):
+        return len(self.row_ids) == 0
+
+
+def _groups(engine, by):
+    """The scenario labels of ``by``, their member values and a code -> scenario lookup."""
+    labels = engine.arrays.labels[SCENARIO_KEYS[by]]
+    if by == 'region':
+        members = {region: [s for s in states if s in labels] for region, states in REGIONS.items()}
+        lookup = np.full(len(labels), -1)
+        for number, states in enumerate(members.values()):
+            lookup[labels.get_indexer(states)] = number
+    else:
+        members = {value: [value] for value in labels}
+        lookup = np.arange(len(labels))
+    return members, np.append(lookup, -1)  # last slot: missing values (code -1) join no scenario
+
+
+def scenarios(engine, by=None, states=None, statuses=None, categories=None):
+    """One labelled ``Audit`` per value of ``by`` that has orders under the base filters.
+
+    ``by`` is a ``SCENARIO_KEYS`` key; ``None`` gives a single ``'all'``
+    scenario. The cells of the base selection are split by the key in one
+    stable sort, so each scenario's cell ids come in the order
+    ``engine.select`` would give them, and its metrics are identical.
+    """
+    base = engine.select(states=states, statuses=statuses, categories=categories)
+    if by is None:
+        return [('all', base)]
+    if by not in SCENARIO_KEYS:
+        raise ValueError(f"unknown scenario key {by!r} (expected one of {list(SCENARIO_KEYS)})")
+    dim = SCENARIO_KEYS[by]
+    keyword = FILTER_KEYWORDS[dim]
+    members, lookup = _groups(engine, by)
+    with PROFILER.stage('split', rows=base.scanned):
+        rows = base.rows
+        codes = lookup[engine.arrays.codes[dim][rows]]
+        order = np.argsort(codes, kind='stable')
+        rows, codes = rows[order], codes[order]
+        bounds = np.searchsorted(codes, np.arange(len(members) + 1))
+
+    audits = []
+    for number, (label, values) in enumerate(members.items()):
+        part = rows[bounds[number]:bounds[number + 1]]
+        if len(part) == 0:
+            continue
+        chosen = base.filters[keyword]
+        filters = {**base.filters, keyword: values if chosen is None else [v for v in values if v in chosen]}
+        audits.append((label, Audit(engine.arrays, _Rows(part), attribution=engine.attribution,
+                                    filters=filters, geo=engine.geo)))
+    return audits
+
+
+class ScenarioTables:
+    """Every table of one scenario's ``Audit``, computed once.
+
+    It answers the ``Audit`` calls the figure builders make, so
+    ``build_figure`` takes it in place of the audit. It is small and
+    picklable, so render workers never need the engine. With ``state`` (and
+    a city aggregate) it also holds that state's city ranking.
+    """
+
+    def __init__(self, audit, state=None, top_n=TOP_N, min_city_orders=MIN_CITY_ORDERS):
+        self.top_n = top_n
+        self.tables = audit.report(top_n=top_n)
+        self.state, self.min_city_orders, self.summary = None, min_city_orders, None
+        if state is not None and audit.geo is not None:
+            self.state = state
+            self.summary = audit.state_summary(state)
+            self.tables['city_late_rates'] = audit.city_late_rates(state, min_orders=min_city_orders)
+
+    def _copy(self, name):
+        return self.tables[name].copy()
+
+    def kpis(self):
+        return dict(self.tables['kpis'])
+
+    def status_counts(self):
+        return self._copy('status_counts')
+
+    def delay_histogram(self):
+        return self._copy('delay_histogram')
+
+    def avg_delay_by_score(self):
+        return self._copy('avg_delay_by_score')
+
+    def state_late_rates(self):
+        return self._copy('state_late_rates')
+
+    def avg_score_by_status(self):
+        return self._copy('avg_score_by_status')
+
+    def score_distribution(self):
+        return self._copy('score_distribution')
+
+    def sentiment_decay(self):
+        return self._copy('sentiment_decay')
+
+    def category_late_rates(self, top_n=TOP_N, min_orders=MIN_CATEGORY_ORDERS, weighted=False):
+        if weighted or min_orders != MIN_CATEGORY_ORDERS or top_n > self.top_n:
+            raise ValueError(f"the report holds the top {self.top_n} first-item categories "
+                             f"with {MIN_CATEGORY_ORDERS}+ orders only")
+        return self._copy('category_late_rates').head(top_n)
+
+    def monthly_trends(self):
+        return self._copy('monthly_trends')
+
+    def _check_state(self, state, min_orders=None):
+        if state != self.state or min_orders not in (None, self.min_city_orders):
+            raise ValueError(f"the report holds the cities of {self.state} with "
+                             f"{self.min_city_orders}+ orders only")
+
+    def city_late_rates(self, state, top_n=None, offset=0, min_orders=MIN_CITY_ORDERS):
+        self._check_state(state, min_orders)
+        stop = None if top_n is None else offset + top_n
+        return self.tables['city_late_rates'].iloc[offset:stop].reset_index(drop=True)
+
+    def state_summary(self, state):
+        self._check_state(state)
+        return dict(self.summary)
+
+
+def report_figures(tables):
+    """Names and parameters of the figures in one scenario's report, in tab order.
+
+    The city chart shows the first ``CITY_CHART_ROWS`` cities and is only
+    there when the scenario is one state with cities over the cutoff.
+    """
+    figures = {}
+    for name in FIGURES:
+        if name == 'city_late_rate':
+            if tables.state is not None and len(tables.tables['city_late_rates']):
+                figures[name] = {'state': tables.state, 'page_size': CITY_CHART_ROWS,
+                                 'min_orders': tables.min_city_orders}
+            continue
+        params = dict(DEFAULT_PARAMS.get(name, {}))
+        if 'top_n' in params:
+            params['top_n'] = tables.top_n
+        figures[name] = params
+    return figures
+
+
+def slugify(label):
+    """A file-name-safe form of a scenario label."""
+    return re.sub(r'[^a-z0-9_]+', '-', str(label).lower()).strip('-') or 'scenario'
+
+
+def describe(filters):
+    """The filters of a scenario as one line of text."""
+    parts = [f"{keyword}: {', '.join(map(str, values))}" for keyword, values in filters.items()
+             if values is not None]
+    return '; '.join(parts) or 'all orders'
+
+
+_STYLE = f"""
+body {{ background: {PAGE_BACKGROUND}; color: #cbd5e1; font-family: Outfit, sans-serif; margin: 2rem; }}
+h1, h2 {{ color: #f8fafc; }}
+a {{ color: #38bdf8; }}
+table {{ border-collapse: collapse; margin: 1rem 0; }}
+th, td {{ border-bottom: 1px solid rgba(255, 255, 255, 0.1); padding: 0.3rem 0.8rem; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+.kpis {{ display: flex; gap: 1rem; flex-wrap: wrap; }}
+.kpi {{ background: rgba(255, 255, 255, 0.03); border: 1px solid rgba(255, 255, 255, 0.1);
+        border-radius: 12px; padding: 1rem 1.5rem; }}
+.kpi b {{ display: block; color: #f8fafc; font-size: 1.8rem; }}
+"""
+
+
+def _html(title, body):
+    return (f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{escape(title)}</title>'
+            f'<script src="plotly.min.js"></script><style>{_STYLE}</style></head>'
+            f'<body>{body}</body></html>\n')
+
+
+def _kpi_cards(kpis):
+    cards = [('Total Volume', f"{kpis['total_orders']:,}"),
+             ('Delayed', f"{kpis['pct_late']:.1f}%"),
+             ('Critical Delay', f"{kpis['pct_super_late']:.1f}%"),
+             ('Sentiment', f"{kpis['avg_review']:.2f}"),
+             ('Severity', f"{kpis['avg_days_late']:.1f}")]
+    return '<div class="kpis">' + ''.join(f'<div class="kpi">{escape(title)}<b>{value}</b></div>'
+                                          for title, value in cards) + '</div>'
+
+
+def _page(label, description, tables, figures, csv_dir=None):
+    body = [f'<p><a href="index.html">All scenarios</a></p><h1>Veridi Delivery Audit: {escape(label)}</h1>',
+            f'<p>{escape(description)}</p>', _kpi_cards(tables.kpis())]
+    for header, names in SECTIONS.items():
+        shown = [figures[name] for name in names if name in figures]
+        if shown:
+            body.append(f'<h2>{escape(header)}</h2>')
+            body += [pio.to_html(fig, full_html=False, include_plotlyjs=False) for fig in shown]
+    if csv_dir is not None:
+        links = [f'<a href="{csv_dir}/{name}.csv">{name}</a>' for name in tables.tables]
+        body.append('<h2>Tables</h2><p>' + ' &middot; '.join(links) + '</p>')
+    return _html(f'Veridi Delivery Audit: {label}', ''.join(body))
+
+
+def render_scenario(output, slug, label, description, tables, formats):
+    """Build one scenario's figures and write its files; returns its seconds and file count.
+
+    Runs in a render worker.
+    """
+    start = time.perf_counter()
+    figures = {name: build_figure(name, tables, **params) for name, params in report_figures(tables).items()}
+    files_dir = os.path.join(output, slug)
+    written = 0
+    if 'csv' in formats or 'png' in formats:
+        os.makedirs(files_dir, exist_ok=True)
+    if 'csv' in formats:
+        pd.DataFrame([tables.kpis()]).to_csv(os.path.join(files_dir, 'kpis.csv'), index=False)
+        for name, table in tables.tables.items():
+            if name != 'kpis':
+                _table(table).to_csv(os.path.join(files_dir, f'{name}.csv'), index=False)
+        written += len(tables.tables)
+    if 'html' in formats:
+        with open(os.path.join(output, f'{slug}.html'), 'w') as f:
+            f.write(_page(label, description, tables, figures, slug if 'csv' in formats else None))
+        written += 1
+    if 'png' in formats:
+        for name, fig in figures.items():
+            # The dashboard draws on a dark page; a PNG has no page behind it.
+            fig.update_layout(paper_bgcolor=PAGE_BACKGROUND)
+            fig.write_image(os.path.join(files_dir, f'{name}.png'), width=PNG_WIDTH,
+                            height=fig.layout.height or PNG_HEIGHT)
+        written += len(figures)
+    return time.perf_counter() - start, written
+
+
+def _index(by, rows, formats):
+    body = [f'<h1>Veridi Delivery Audit by {escape(by or "all orders")}</h1><table><tr>',
+            ''.join(f'<th>{escape(title)}</th>' for title in
+                    ['Scenario', 'Orders', 'Delayed', 'Critical Delay', 'Sentiment', 'Severity']),
+            '</tr>']
+    for row in rows:
+        name = escape(str(row['scenario']))
+        link = f'<a href="{row["slug"]}.html">{name}</a>' if 'html' in formats else name
+        body.append(f"<tr><td>{link}</td><td>{row['total_orders']:,}</td><td>{row['pct_late']:.1f}%</td>"
+                    f"<td>{row['pct_super_late']:.1f}%</td><td>{row['avg_review']:.2f}</td>"
+                    f"<td>{row['avg_days_late']:.1f}</td></tr>")
+    body.append('</table>')
+    return _html(f'Veridi Delivery Audit by {by or "all orders"}', ''.join(body))
+
+
+def write_reports(engine, output, by=None, formats=('html', 'csv'), workers=1, top_n=TOP_N,
+                  min_city_orders=MIN_CITY_ORDERS, states=None, statuses=None, categories=None):
+    """Write a report per scenario of ``engine`` into ``output``; returns a run summary.
+
+    See ``scenarios`` for ``by`` and the base filters. ``formats`` picks
+    from ``FORMATS``. Figures are built by ``workers`` processes (``1``
+    builds them in this process).
+    """
+    formats = list(formats)
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"unknown formats {sorted(unknown)} (expected some of {FORMATS})")
+    if 'png' in formats and kaleido is None:
+        raise ImportError("PNG output needs the kaleido package (pip install kaleido)")
+    os.makedirs(output, exist_ok=True)
+
+    with PROFILER.stage('aggregate') as stats:
+        audits = scenarios(engine, by, states=states, statuses=statuses, categories=categories)
+        jobs = []
+        for label, audit in audits:
+            chosen = audit.filters['states']
+            state = chosen[0] if chosen is not None and len(chosen) == 1 else None
+            tables = ScenarioTables(audit, state=state, top_n=top_n, min_city_orders=min_city_orders)
+            jobs.append((slugify(label), label, describe(audit.filters), tables))
+        stats['rows'] = sum(audit.scanned for _, audit in audits)
+
+    summary_rows = [{'scenario': label, 'slug': slug, **tables.kpis()} for slug, label, _, tables in jobs]
+    pd.DataFrame(summary_rows).drop(columns='slug').to_csv(os.path.join(output, 'kpis.csv'), index=False)
+    if 'html' in formats:
+        with open(os.path.join(output, 'plotly.min.js'), 'w') as f:
+            f.write(get_plotlyjs())
+        with open(os.path.join(output, 'index.html'), 'w') as f:
+            f.write(_index(by, summary_rows, formats))
+
+    # Stages time the parent's wall clock; with workers > 1 that is the slowest worker.
+    pool = ProcessPoolExecutor if workers > 1 else _Inline
+    with PROFILER.stage('render', rows=len(jobs)):
+        with pool(max_workers=workers) as executor:
+            results = list(executor.map(render_scenario, [output] * len(jobs), *zip(*jobs),
+                                        [formats] * len(jobs))) if jobs else []
+    return {
+        'scenarios': len(jobs),
+        'formats': formats,
+        'workers': workers,
+        'files': sum(written for _, written in results),
+        'render_seconds': sum(seconds for seconds, _ in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the Veridi delivery audit for many filter scenarios.")
+    parser.add_argument('--data', default=MASTER_COLUMNAR,
+                        help='columnar master file or partitioned store (default: %(default)s)')
+    parser.add_argument('--csv', default=MASTER_CSV, help='CSV export to convert if --data is missing')
+    parser.add_argument('--by', choices=list(SCENARIO_KEYS),
+                        help='one report per value of this key (default: one report of everything)')
+    parser.add_argument('--state', action='append', help='customer state to include (repeatable; default: all)')
+    parser.add_argument('--status', action='append', help='delivery status to include (repeatable; default: all)')
+    parser.add_argument('--category', action='append', help='product category to include (repeatable; default: all)')
+    parser.add_argument('--top-n', type=int, default=TOP_N, help='categories to rank (default: %(default)s)')
+    parser.add_argument('--min-city-orders', type=int, default=MIN_CITY_ORDERS,
+                        help='orders a city needs to be ranked (default: %(default)s)')
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['html', 'csv'], dest='formats')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='figure render processes (default: %(default)s)')
+    parser.add_argument('--output', required=True, help='directory to write the reports to')
+    parser.add_argument('--metrics', help='write per-stage timings here (.json, else Prometheus text)')
+    args = parser.parse_args(argv)
+
+    with PROFILER.run('report'):
+        with PROFILER.stage('load'):
+            engine = AuditEngine.load(args.data, csv_path=args.csv)
+        summary = write_reports(engine, args.output, by=args.by, formats=args.formats, workers=args.workers,
+                                top_n=args.top_n, min_city_orders=args.min_city_orders, states=args.state,
+                                statuses=args.status, categories=args.category)
+    print(json.dumps(summary, indent=2))
+    if args.metrics:
+        PROFILER.export(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+"""Mergeable summaries behind the dashboard's approximate query mode.
+
+The exact path still touches per-order data: the cube only keeps
+``days_difference`` inside the +/-20 day window, so delay percentiles need
+the rows. Summaries are built once, when the master file is exported, and
+are keyed by *stratum*, a ``(customer_state, delivery_status,
+product_category_en)`` combination. That makes every sidebar filter a set of
+strata, and a query merges the selected strata's summaries:
+
+- Counters per stratum and ``purchase_month`` (orders, late, super-late,
+  reviewed, review-score sum). They are exact and merge by addition, so late
+  rates and monthly trends match the exact mode.
+- A KLL quantile sketch of ``days_difference`` per stratum. Sketches merge by
+  pooling their weighted items. This gives p50/p90/p99 delay per state and
+  category with a rank-error bound. Every compaction adds at most +/-2^h to a
+  rank, with zero mean, so each sketch tracks the variance of its rank error.
+  Variances add when sketches merge, and the reported bound is 2.576 standard
+  deviations (99%).
+- A uniform sample of ``SAMPLE_SIZE`` delays per stratum, or
+  ``SAMPLE_FRACTION`` of the stratum if that is more. A fixed size alone left
+  the busiest strata thinly sampled, so a narrow selection made of a few of
+  them got intervals wider than the bins. The delay histogram is the
+  stratified estimate: each stratum's sample is weighted by ``n / m``. Each
+  bin carries its standard error, with the finite-population correction, so
+  small strata (fully sampled) add no error, and a smoothed share, so a bin
+  a stratum's sample missed still gets some.
+
+The summaries of a master file live next to it in a ``.summaries``
+directory::
+
+    python -m veridi_auditor.sketch --data veridi_master_clean.feather
+    python -m veridi_auditor.pipeline ... --export veridi_master_clean.feather --summaries
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor.cube import DAYS_WINDOW
+from veridi_auditor.storage import MASTER_COLUMNAR, read_master
+
+STRATA = ['customer_state', 'delivery_status', 'product_category_en']
+
+KLL_K = 200
+SAMPLE_SIZE = 64
+SAMPLE_FRACTION = 0.1
+QUANTILES = [0.5, 0.9, 0.99]
+CONFIDENCE_Z = 2.576  # rank-error bounds (99%)
+HISTOGRAM_Z = 1.96    # histogram intervals (95%)
+
+SUMMARY_COLUMNS = ['customer_state', 'delivery_status', 'product_category_en', 'purchase_month',
+                   'days_difference', 'is_late', 'review_score']
+
+TABLES = ['strata', 'counters', 'quantiles', 'samples']
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang & Liberty) over a stream of numbers.
+
+    Level ``h`` holds items of weight ``2**h``. A level over its capacity is
+    sorted and every other item (random offset) is promoted. ``variance``
+    accumulates ``4**h`` per compaction at level ``h``.
+    """
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.variance = 0.0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - level - 1))))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.variance += other.variance
+        self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            full = [h for h, items in enumerate(self.levels) if len(items) > self._capacity(h)]
+            if not full:
+                return
+            h = full[0]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[h])
+            keep = items[:len(items) % 2]  # an odd item out stays behind
+            items = items[len(items) % 2:]
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[self._rng.integers(2)::2]])
+            self.levels[h] = keep
+            self.variance += 4.0 ** h
+
+    def items(self):
+        """``(values, weights)`` of every retained item."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h, dtype=np.int64)
+                                  for h, items in enumerate(self.levels)])
+        return values, weights
+
+    def quantile(self, q):
+        values, weights = self.items()
+        return weighted_quantiles(values, weights, np.zeros(len(values), np.intp), 1, [q])[0, 0]
+
+
+def weighted_quantiles(values, weights, groups, n_groups, qs):
+    """``(n_groups, len(qs))`` quantiles of weighted items per group (NaN if empty).
+
+    The ``q`` quantile is the smallest value whose cumulative weight reaches
+    ``q`` of the group's total.
+    """
+    order = np.lexsort((values, groups))
+    values, weights, groups = values[order], weights[order], groups[order]
+    cum = np.cumsum(weights, dtype=float)
+    totals = np.bincount(groups, weights=weights, minlength=n_groups)
+    before = np.cumsum(totals) - totals
+    result = np.full((n_groups, len(qs)), np.nan)
+    present = totals > 0
+    for j, q in enumerate(qs):
+        target = before + np.clip(q, 1e-12, 1.0) * totals
+        idx = np.minimum(np.searchsorted(cum, target - 1e-9 * totals, side='left'), len(values) - 1)
+        result[present, j] = values[idx[present]]
+    return result
+
+
+def summaries_path(master_path=MASTER_COLUMNAR):
+    """Directory holding the summaries of the master file at ``master_path``."""
+    return os.path.splitext(master_path.rstrip('/'))[0] + '.summaries'
+
+
+def _strata_ids(df):
+    grouped = df.groupby(STRATA, observed=True, dropna=False, sort=True)
+    return grouped.ngroup().to_numpy(), grouped.size().reset_index(name='n_orders')
+
+
+def build_summaries(df, k=KLL_K, sample_size=SAMPLE_SIZE, sample_fraction=SAMPLE_FRACTION, seed=0):
+    """Summaries of a master DataFrame (needs ``SUMMARY_COLUMNS``)."""
+    stratum, strata = _strata_ids(df)
+    days = df['days_difference'].to_numpy(dtype=float)
+    super_late = (df['delivery_status'] == 'Super Late').to_numpy()
+
+    counters = df.assign(stratum=stratum, n_super_late=super_late,
+                         review_score=df['review_score'].astype(float)) \
+        .groupby(['stratum', 'purchase_month'], observed=True, dropna=False, sort=True).agg(
+            n_orders=('days_difference', 'size'),
+            n_late=('is_late', 'sum'),
+            n_super_late=('n_super_late', 'sum'),
+            n_reviewed=('review_score', 'count'),
+            review_sum=('review_score', 'sum'),
+        ).reset_index()
+
+    rows = np.argsort(stratum, kind='stable')
+    bounds = np.r_[0, np.cumsum(strata['n_orders'].to_numpy())]
+    values, weights, owners, variance = [], [], [], np.zeros(len(strata))
+    for s in range(len(strata)):
+        sketch = KLLSketch(k, seed=[seed, s]).update(days[rows[bounds[s]:bounds[s + 1]]])
+        v, w = sketch.items()
+        values.append(v)
+        weights.append(w)
+        owners.append(np.full(len(v), s, dtype=np.int32))
+        variance[s] = sketch.variance
+    strata['kll_variance'] = variance
+    quantiles = pd.DataFrame({'stratum': np.concatenate(owners), 'value': np.concatenate(values),
+                              'weight': np.concatenate(weights)})
+
+    # Uniform sample without replacement per stratum: random keys, keep the
+    # smallest ``sample_size`` (or ``sample_fraction`` of the stratum, if
+    # more) of each stratum.
+    n_orders = strata['n_orders'].to_numpy()
+    n_sampled = np.minimum(n_orders, np.maximum(sample_size, np.ceil(sample_fraction * n_orders))).astype(np.int64)
+    keys = np.random.default_rng(seed).random(len(df))
+    order = np.lexsort((keys, stratum))
+    rank = np.arange(len(df)) - bounds[stratum[order]]
+    picked = order[rank < n_sampled[stratum[order]]]
+    samples = pd.DataFrame({'stratum': stratum[picked].astype(np.int32), 'days_difference': days[picked]})
+    strata['n_sampled'] = n_sampled
+
+    return Summaries(strata, counters, quantiles, samples,
+                     {'k': k, 'sample_size': sample_size, 'sample_fraction': sample_fraction, 'seed': seed})
+
+
+class Summaries:
+    """Per-stratum counters, quantile sketches and samples for one master file."""
+
+    def __init__(self, strata, counters, quantiles, samples, meta):
+        self.strata = strata
+        self.counters = counters
+        self.quantiles = quantiles
+        self.samples = samples
+        self.meta = meta
+
+    @classmethod
+    def build(cls, path=MASTER_COLUMNAR, **kwargs):
+        """Summaries of the master file at ``path``."""
+        return build_summaries(read_master(path, columns=SUMMARY_COLUMNS), **kwargs)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in TABLES:
+            getattr(self, name).to_parquet(os.path.join(path, f'{name}.parquet'), index=False)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+    @classmethod
+    def load(cls, path):
+        tables = [pd.read_parquet(os.path.join(path, f'{name}.parquet')) for name in TABLES]
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(*tables, meta)
+
+    @property
+    def n_orders(self):
+        return int(self.strata['n_orders'].sum())
+
+    @property
+    def nbytes(self):
+        return int(sum(getattr(self, name).memory_usage(deep=True).sum() for name in TABLES))
+
+    def options(self, dimension):
+        """Sorted values a filter dimension can take."""
+        return sorted(self.strata[dimension].dropna().unique().tolist())
+
+    def select(self, states=None, statuses=None, categories=None):
+        """The ``SketchAudit`` of the strata matching every given selection (``None`` = all)."""
+        mask = np.ones(len(self.strata), dtype=bool)
+        for dim, values in zip(STRATA, (states, statuses, categories)):
+            if values is not None:
+                mask &= self.strata[dim].isin(values).to_numpy()
+        return SketchAudit(self, mask)
+
+
+class SketchAudit:
+    """Approximate answers for the strata selected by one filter set.
+
+    Mirrors the grouped ``Audit`` metrics (same columns) and adds delay
+    percentiles with their error bounds.
+    """
+
+    def __init__(self, summaries, mask):
+        self.summaries = summaries
+        self.mask = mask
+
+    @property
+    def empty(self):
+        return not self.mask.any()
+
+    def _codes(self, dim):
+        """Per-stratum group codes for ``dim`` and the group labels (None: one group)."""
+        if dim is None:
+            return np.zeros(len(self.mask), dtype=np.intp), pd.Index(['all'])
+        codes, labels = pd.factorize(self.summaries.strata[dim], sort=True)
+        return codes, pd.Index(labels, name=dim)
+
+    def delay_quantiles(self, dim=None, qs=QUANTILES):
+        """p50/p90/p99 ``days_difference`` per value of ``dim`` (or overall).
+
+        ``rank_error`` is the 99% bound on the normalized rank of each
+        quantile, so the true p90 lies between the sketch's ``p(0.9 - e)``
+        and ``p(0.9 + e)``.
+        """
+        codes, labels = self._codes(dim)
+        q = self.summaries.quantiles
+        stratum = q['stratum'].to_numpy()
+        selected = self.mask[stratum] & (codes[stratum] >= 0)
+        groups = codes[stratum[selected]]
+        values = weighted_quantiles(q['value'].to_numpy()[selected], q['weight'].to_numpy()[selected],
+                                    groups, len(labels), qs)
+        strata = self.summaries.strata
+        chosen = self.mask & (codes >= 0)
+        n = np.bincount(codes[chosen], weights=strata['n_orders'].to_numpy()[chosen], minlength=len(labels))
+        var = np.bincount(codes[chosen], weights=strata['kll_variance'].to_numpy()[chosen], minlength=len(labels))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rank_error = CONFIDENCE_Z * np.sqrt(var) / n
+        result = pd.DataFrame(values, columns=[f'p{round(q * 100):d}' for q in qs], index=labels)
+        result['rank_error'] = rank_error
+        result = result[n > 0]
+        return result.reset_index() if dim is not None else result.reset_index(drop=True)
+
+    def _late_rates(self, dim):
+        strata = self.summaries.strata
+        chosen = self.mask & strata[dim].notna().to_numpy()
+        sums = strata.loc[chosen, [dim]].join(self._counter_sums(chosen)) \
+            .groupby(dim, observed=True)[['n_late', 'n_orders']].sum()
+        rates = pd.DataFrame({
+            'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+            'total_orders': sums['n_orders'],
+        }).reset_index()
+        return rates.merge(self.delay_quantiles(dim), on=dim, how='left')
+
+    def _counter_sums(self, chosen):
+        """Counter totals per selected stratum, indexed by stratum id."""
+        c = self.summaries.counters
+        return c[chosen[c['stratum'].to_numpy()]].groupby('stratum')[
+            ['n_orders', 'n_late', 'n_super_late', 'n_reviewed', 'review_sum']].sum()
+
+    def state_late_rates(self):
+        """Late rate, volume and delay percentiles per state, highest late rate first."""
+        return self._late_rates('customer_state') \
+            .sort_values('late_rate', ascending=False).reset_index(drop=True)
+
+    def category_late_rates(self, top_n=15, min_orders=20):
+        """The ``top_n`` categories by late rate among those with ``min_orders`` orders."""
+        rates = self._late_rates('product_category_en')
+        rates = rates[rates['total_orders'] >= min_orders]
+        return rates.sort_values('late_rate', ascending=False).head(top_n).reset_index(drop=True)
+
+    def monthly_trends(self, min_orders=50):
+        """Late rate, mean score and volume per month (exact: from the counters)."""
+        c = self.summaries.counters
+        sums = c[self.mask[c['stratum'].to_numpy()]].dropna(subset=['purchase_month']) \
+            .groupby('purchase_month', observed=True)[['n_late', 'n_orders', 'n_reviewed', 'review_sum']].sum()
+        trends = pd.DataFrame({
+            'late_rate': sums['n_late'] / sums['n_orders'] * 100,
+            'avg_score': sums['review_sum'] / sums['n_reviewed'],
+            'order_count': sums['n_orders'],
+        }).reset_index()
+        return trends[trends['order_count'] > min_orders].sort_values('purchase_month').reset_index(drop=True)
+
+    def delay_histogram(self):
+        """Estimated orders per day inside the +/-20 day window, with standard errors."""
+        strata = self.summaries.strata
+        samples = self.summaries.samples
+        chosen = np.flatnonzero(self.mask)
+        local = np.full(len(self.mask), -1)
+        local[chosen] = np.arange(len(chosen))
+        days = samples['days_difference'].to_numpy()
+        owner = local[samples['stratum'].to_numpy()]
+        keep = (owner >= 0) & (np.abs(days) <= DAYS_WINDOW)
+        n_bins = 2 * DAYS_WINDOW + 1
+        counts = np.bincount(owner[keep] * n_bins + (days[keep] + DAYS_WINDOW).astype(np.intp),
+                             minlength=len(chosen) * n_bins).reshape(len(chosen), n_bins)
+        population = strata['n_orders'].to_numpy(dtype=float)[chosen][:, None]
+        sampled = strata['n_sampled'].to_numpy(dtype=float)[chosen][:, None]
+        share = counts / sampled
+        # The variance uses the share smoothed towards 1/2 (add one hit and one
+        # miss): a bin a stratum's sample happened to miss would otherwise get
+        # no error at all from that stratum.
+        smoothed = (counts + 1) / (sampled + 2)
+        variance = population ** 2 * (1 - sampled / population) * smoothed * (1 - smoothed) \
+            / np.maximum(sampled - 1, 1)
+        return pd.DataFrame({
+            'days_difference': np.arange(-DAYS_WINDOW, DAYS_WINDOW + 1),
+            'count': (population * share).sum(axis=0),
+            'count_se': np.sqrt(variance.sum(axis=0)),
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the approximate-mode summaries of a master file.")
+    parser.add_argument('--data', default=MASTER_COLUMNAR, help='columnar master file (default: %(default)s)')
+    parser.add_argument('--output', help='summaries directory (default: next to --data)')
+    parser.add_argument('--k', type=int, default=KLL_K, help='KLL sketch size (default: %(default)s)')
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE,
+                        help='delays sampled per stratum at least (default: %(default)s)')
+    parser.add_argument('--sample-fraction', type=float, default=SAMPLE_FRACTION,
+                        help='share of larger strata sampled (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    summaries = Summaries.build(args.data, k=args.k, sample_size=args.sample_size,
+                                sample_fraction=args.sample_fraction)
+    output = args.output or summaries_path(args.data)
+    summaries.save(output)
+    print(json.dumps({'output': output, 'orders': summaries.n_orders, 'strata': len(summaries.strata),
+                      'sketch_items': len(summaries.quantiles), 'samples': len(summaries.samples),
+                      'bytes': summaries.nbytes}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
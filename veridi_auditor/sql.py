@@ -0,0 +1,361 @@
+"""SQL query backend: filters and group-bys pushed into an embedded database.
+
+``AuditEngine`` loads the master table into memory and answers from the
+aggregate cube. ``SQLEngine`` offers the same interface (``options``,
+``select``, ``version``, ``memory_report``) but leaves the data where it is.
+Each metric runs as one ``GROUP BY`` over the master file, and only the
+grouped rows (a few hundred at most) come back to Python.
+
+- ``duckdb`` (used when the package is installed) scans the master file in
+  place: Parquet files and partitioned stores with ``read_parquet``, CSV
+  exports with ``read_csv``, and the Feather copy as a streamed Arrow
+  dataset. Scans are streamed, so the master may be larger than memory.
+- ``sqlite`` is the fallback. The filter and group columns are copied once,
+  batch by batch, into ``<master>.sqlite`` next to the master file, and the
+  copy is rebuilt whenever the master file is newer. Queries then run
+  against that file on disk.
+
+``SQLAudit`` shares the post-processing of ``engine.Audit``: rates, cutoffs,
+ordering, the +/-20 day bins. Its group sums are exact integer counts and
+sums, so every metric matches the in-memory path exactly. app.py picks the
+backend from the ``VERIDI_BACKEND`` environment variable (``memory``,
+``duckdb`` or ``sqlite``).
+
+    python -m veridi_auditor.sql --backend duckdb --state SP --status Late
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from veridi_auditor import cube as cube_ops
+from veridi_auditor.engine import TOP_N, Audit, write_report
+from veridi_auditor.profiling import PROFILER
+from veridi_auditor.storage import (CATEGORY_COLUMNS, LATE_STATUSES, MASTER_COLUMNAR, MASTER_CSV,
+                                    ORDERED_CATEGORIES)
+
+try:
+    import duckdb
+except ImportError:  # optional: the SQLite fallback needs only the standard library
+    duckdb = None
+
+BACKENDS = ['duckdb', 'sqlite']
+SQLITE_SUFFIX = '.sqlite'
+SQLITE_BATCH_ROWS = 250_000
+
+# Columns the SQL backend reads, with their SQLite types.
+COLUMNS = {
+    'customer_state': 'TEXT',
+    'delivery_status': 'TEXT',
+    'product_category_en': 'TEXT',
+    'purchase_month': 'TEXT',
+    'review_score': 'REAL',
+    'days_difference': 'INTEGER',
+}
+GROUP_DIMENSIONS = cube_ops.DIMENSIONS[:-1]
+
+_LATE = ', '.join(f"'{status}'" for status in LATE_STATUSES)
+MEASURES = {
+    'n_orders': 'COUNT(*)',
+    'n_late': f"SUM(CASE WHEN delivery_status IN ({_LATE}) THEN 1 ELSE 0 END)",
+    'n_reviewed': 'COUNT(review_score)',
+    'review_sum': 'SUM(review_score)',
+    'days_sum': 'SUM(days_difference)',
+}
+
+
+def default_backend():
+    return 'duckdb' if duckdb is not None else 'sqlite'
+
+
+def _literal(text):
+    """``text`` as a quoted SQL string literal (a view definition cannot bind parameters)."""
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _source_files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                      for name in names if name.endswith('.parquet'))
+    return [path]
+
+
+def _arrow_dataset(path):
+    """The master file (or partitioned store) as a lazily scanned Arrow dataset."""
+    if os.path.isdir(path):
+        return ds.dataset(path, format='parquet', partitioning='hive')
+    if path.endswith('.parquet'):
+        return ds.dataset(path, format='parquet')
+    if path.endswith('.csv'):
+        return ds.dataset(path, format='csv')
+    return ds.dataset(path, format='ipc')
+
+
+def sqlite_path(path):
+    """Where the SQLite copy of the master file at ``path`` lives."""
+    return os.path.splitext(path.rstrip(os.sep))[0] + SQLITE_SUFFIX
+
+
+def build_sqlite(path, output=None):
+    """Copy the ``COLUMNS`` of the master at ``path`` into a SQLite file, batch by batch."""
+    output = output or sqlite_path(path)
+    tmp_path = f"{output}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        with PROFILER.stage('build_sqlite') as stats, sqlite3.connect(tmp_path) as con:
+            con.execute(f"CREATE TABLE master ({', '.join(f'{c} {t}' for c, t in COLUMNS.items())})")
+            insert = f"INSERT INTO master VALUES ({', '.join('?' * len(COLUMNS))})"
+            stats['rows'] = 0
+            for batch in _arrow_dataset(path).to_batches(columns=list(COLUMNS), batch_size=SQLITE_BATCH_ROWS):
+                con.executemany(insert, zip(*(batch.column(c).to_pylist() for c in COLUMNS)))
+                stats['rows'] += batch.num_rows
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output
+
+
+class SQLAudit(Audit):
+    """``Audit`` metrics for one filter selection, computed by SQL group-bys.
+
+    Only the data access differs: ``_sums`` and the +/-20 day bins are single
+    queries, and every metric built on them is inherited from ``Audit``.
+    """
+
+    def __init__(self, engine, where, params, filters=None):
+        # No cells or selection bitmap; weighted attribution and the city drill-down are in-memory only.
+        super().__init__(None, None, filters=filters)
+        self.engine = engine
+        self.where = where
+        self.params = params
+        self._totals = None
+
+    @property
+    def scanned(self):
+        """Master rows matching the filters."""
+        return int(self.totals()['n_orders'])
+
+    @property
+    def empty(self):
+        return self.scanned == 0
+
+    @property
+    def nbytes(self):
+        """Nothing is held per selection: results come back as small frames."""
+        return 0
+
+    def _query(self, select, group=(), extra=None):
+        conditions = self.where + ([extra] if extra else [])
+        sql = f"SELECT {select} FROM master"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        if group:
+            sql += f" GROUP BY {', '.join(group)}"
+        return self.engine.query(sql, self.params)
+
+    def totals(self):
+        """Whole-selection sums of every measure, plus those of the rows delivered late."""
+        if self._totals is None:
+            columns = {name: f"COALESCE({expr}, 0)" for name, expr in MEASURES.items()}
+            columns['positive_days_sum'] = "COALESCE(SUM(CASE WHEN days_difference > 0 THEN days_difference END), 0)"
+            columns['positive_orders'] = "COUNT(CASE WHEN days_difference > 0 THEN 1 END)"
+            frame = self._query(', '.join(f'{expr} AS {name}' for name, expr in columns.items()))
+            self._totals = {name: np.float64(frame[name].iloc[0]) for name in columns}
+        return self._totals
+
+    def _sums(self, dim, measures, by=None):
+        keys = [dim] + ([by] if by is not None else [])
+        frame = self._query(', '.join(keys + [f'{MEASURES[m]} AS {m}' for m in measures]), group=keys,
+                            extra=' AND '.join(f'{key} IS NOT NULL' for key in keys))
+        labels = self.engine.labels
+        positions = [labels[key].get_indexer(frame[key].to_numpy()) for key in keys]
+        order = np.lexsort(positions[::-1])
+        if by is None:
+            index = labels[dim][positions[0][order]]
+        else:
+            index = pd.MultiIndex.from_arrays([labels[key][pos[order]] for key, pos in zip(keys, positions)])
+        return pd.DataFrame({m: frame[m].to_numpy(dtype=float)[order] for m in measures}, index=index)
+
+    def _day_bins(self):
+        window = cube_ops.DAYS_WINDOW
+        measures = ['n_orders', 'n_reviewed', 'review_sum']
+        frame = self._query(', '.join(['days_difference'] + [f'{MEASURES[m]} AS {m}' for m in measures]),
+                            group=['days_difference'], extra=f'days_difference BETWEEN {-window} AND {window}')
+        return cube_ops.bin_days(frame['days_difference'].to_numpy(dtype=np.int64),
+                                 {m: frame[m].to_numpy(dtype=float) for m in measures})
+
+    def kpis(self):
+        """Headline numbers plus the late rate across the whole selection."""
+        totals = self.totals()
+        total = totals['n_orders']
+        by_status = self._sums('delivery_status', ['n_orders'])['n_orders']
+        late = by_status.get('Late', 0)
+        super_late = by_status.get('Super Late', 0)
+        reviewed = totals['n_reviewed']
+        return {
+            'total_orders': int(total),
+            'late_orders': int(late),
+            'super_late_orders': int(super_late),
+            'pct_late': late / total * 100 if total > 0 else 0,
+            'pct_super_late': super_late / total * 100 if total > 0 else 0,
+            'avg_review': totals['review_sum'] / reviewed if reviewed > 0 else np.nan,
+            'avg_days_late': (totals['positive_days_sum'] / totals['positive_orders']
+                              if totals['positive_orders'] > 0 else 0),
+            'national_late_rate': totals['n_late'] / total * 100 if total > 0 else np.nan,
+        }
+
+    def delay_histogram(self):
+        return cube_ops.histogram_from_bins(self._day_bins())
+
+    def sentiment_decay(self):
+        return cube_ops.decay_from_bins(self._day_bins())
+
+
+class SQLEngine:
+    """The ``AuditEngine`` interface over an embedded DuckDB or SQLite database.
+
+    ``path`` is the master file (Feather, Parquet or a partitioned store);
+    when it is missing, ``csv_path`` is scanned instead. Raises
+    ``FileNotFoundError`` if neither exists. One connection is shared by
+    every thread, and queries on it are serialised.
+    """
+
+    attribution = None
+    geo = None
+
+    def __init__(self, path=MASTER_COLUMNAR, csv_path=MASTER_CSV, backend=None):
+        self.backend = backend or default_backend()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"unknown backend {self.backend!r} (expected one of {BACKENDS})")
+        if self.backend == 'duckdb' and duckdb is None:
+            raise ImportError("the duckdb backend needs the duckdb package (pip install duckdb)")
+        if not os.path.exists(path):
+            if not os.path.exists(csv_path):
+                raise FileNotFoundError(f"neither {path} nor {csv_path} exists")
+            path = csv_path
+        self.path = str(path)
+        self._lock = threading.Lock()
+        with PROFILER.stage(f'connect_{self.backend}'):
+            self._con = self._connect_duckdb() if self.backend == 'duckdb' else self._connect_sqlite()
+        self.labels = {dim: self._labels(dim) for dim in GROUP_DIMENSIONS}
+        self._options = {dim: sorted(self.labels[dim].tolist()) for dim in cube_ops.FILTER_DIMENSIONS}
+        self._version = None
+
+    def _connect_duckdb(self):
+        con = duckdb.connect()
+        columns = ', '.join(COLUMNS)
+        if os.path.isdir(self.path):
+            source = f"read_parquet({_literal(os.path.join(self.path, '**', '*.parquet'))}, hive_partitioning = true)"
+        elif self.path.endswith('.parquet'):
+            source = f"read_parquet({_literal(self.path)})"
+        elif self.path.endswith('.csv'):
+            source = f"read_csv({_literal(self.path)})"
+        else:
+            con.register('master_arrow', _arrow_dataset(self.path))
+            source = 'master_arrow'
+        con.execute(f"CREATE VIEW master AS SELECT {columns} FROM {source}")
+        return con
+
+    def _connect_sqlite(self):
+        database = sqlite_path(self.path)
+        newest = max(os.path.getmtime(f) for f in _source_files(self.path))
+        if not os.path.exists(database) or os.path.getmtime(database) < newest:
+            build_sqlite(self.path, database)
+        return sqlite3.connect(f'file:{database}?mode=ro', uri=True, check_same_thread=False)
+
+    def query(self, sql, params=()):
+        """Run ``sql`` and return its (small) result as a DataFrame."""
+        with self._lock:
+            cursor = self._con.execute(sql, list(params))
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return pd.DataFrame.from_records(rows, columns=names)
+
+    def _labels(self, dim):
+        """Values of ``dim`` in the order ``CellArrays.labels`` has them."""
+        values = self.query(f"SELECT DISTINCT {dim} FROM master WHERE {dim} IS NOT NULL")[dim].tolist()
+        if dim in ORDERED_CATEGORIES:
+            categories = ORDERED_CATEGORIES[dim]
+            return pd.CategoricalIndex([c for c in categories if c in values], categories=categories,
+                                       ordered=True, name=dim)
+        if dim in CATEGORY_COLUMNS:
+            categories = sorted(values)
+            return pd.CategoricalIndex(categories, categories=categories, name=dim)
+        return pd.Index(sorted(float(v) for v in values), dtype=float, name=dim)
+
+    @property
+    def version(self):
+        """Hash of the source files' sizes and modification times."""
+        if self._version is None:
+            signature = [(f, os.path.getsize(f), os.stat(f).st_mtime_ns) for f in _source_files(self.path)]
+            self._version = hashlib.sha256(repr((self.backend, signature)).encode()).hexdigest()[:16]
+        return self._version
+
+    def options(self, dimension):
+        """Sorted values a filter dimension can take (computed once per engine)."""
+        return list(self._options[dimension])
+
+    def select(self, states=None, statuses=None, categories=None):
+        """The ``SQLAudit`` of orders matching every given selection (``None`` = all)."""
+        selections = {'customer_state': states, 'delivery_status': statuses,
+                      'product_category_en': categories}
+        where, params = [], []
+        for dim, values in selections.items():
+            if values is None:
+                continue
+            if len(values) == 0:
+                where.append('1 = 0')
+                continue
+            where.append(f"{dim} IN ({', '.join('?' * len(values))})")
+            params += [str(value) for value in values]
+        return SQLAudit(self, where, params,
+                        filters={'states': states, 'statuses': statuses, 'categories': categories})
+
+    def memory_report(self):
+        """Memory the database holds for all sessions (the data stays on disk)."""
+        if self.backend == 'duckdb':
+            used = int(self.query("SELECT COALESCE(SUM(memory_usage_bytes), 0) AS bytes FROM duckdb_memory()")
+                       ['bytes'].iloc[0])
+            rows = [{'column': '(duckdb buffers)', 'dtype': 'in memory', 'bytes': used}]
+        else:
+            page_size = int(self.query("PRAGMA page_size").iloc[0, 0])
+            cache_pages = int(self.query("PRAGMA cache_size").iloc[0, 0])
+            cache = -cache_pages * 1024 if cache_pages < 0 else cache_pages * page_size
+            rows = [{'column': '(sqlite page cache)', 'dtype': 'upper bound', 'bytes': cache}]
+        labels = sum(index.memory_usage(deep=True) for index in self.labels.values())
+        rows.append({'column': '(labels)', 'dtype': 'group values', 'bytes': int(labels)})
+        rows.append({'column': 'total', 'dtype': '', 'bytes': sum(row['bytes'] for row in rows)})
+        report = pd.DataFrame(rows)
+        report['bytes_per_row'] = np.nan
+        return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute the Veridi delivery audit with SQL group-bys.")
+    parser.add_argument('--data', default=MASTER_COLUMNAR,
+                        help='columnar master file or partitioned store (default: %(default)s)')
+    parser.add_argument('--csv', default=MASTER_CSV, help='CSV export to scan if --data is missing')
+    parser.add_argument('--backend', choices=BACKENDS, default=default_backend())
+    parser.add_argument('--state', action='append', help='customer state to include (repeatable; default: all)')
+    parser.add_argument('--status', action='append', help='delivery status to include (repeatable; default: all)')
+    parser.add_argument('--category', action='append', help='product category to include (repeatable; default: all)')
+    parser.add_argument('--top-n', type=int, default=TOP_N, help='categories to rank (default: %(default)s)')
+    parser.add_argument('--format', choices=['json', 'parquet'], default='json')
+    parser.add_argument('--output', help='JSON file or Parquet directory (default: JSON to stdout)')
+    args = parser.parse_args(argv)
+
+    engine = SQLEngine(args.data, csv_path=args.csv, backend=args.backend)
+    audit = engine.select(states=args.state, statuses=args.status, categories=args.category)
+    write_report(audit.report(top_n=args.top_n), args.output, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Typed columnar storage for the Veridi master dataset.
+
+The notebook exports ``veridi_master_clean.csv``. Re-parsing that text file and
+inferring three datetime columns on every Streamlit cold start is the slowest
+part of the first paint, so the same table is also kept as an uncompressed
+Arrow IPC (Feather v2) file with:
+
+- dictionary-encoded low-cardinality strings (state, city, status, category,
+  month), with ``delivery_status`` as an ordered On Time < Late < Super Late
+  category
+- native timestamps instead of ISO strings
+- ``review_score`` as int8, ``days_difference`` as int16, ``is_late`` as bool
+
+Uncompressed Feather files can be memory-mapped and read with column
+projection, so the dashboard only touches the bytes of the columns it plots.
+Parquet is supported as well (chosen by file extension) for interchange.
+"""
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+MASTER_CSV = "veridi_master_clean.csv"
+MASTER_COLUMNAR = "veridi_master_clean.feather"
+
+DATETIME_COLUMNS = [
+    'order_purchase_timestamp',
+    'order_estimated_delivery_date',
+    'order_delivered_customer_date',
+]
+
+CATEGORY_COLUMNS = [
+    'order_status',
+    'customer_state',
+    'customer_city',
+    'delivery_status',
+    'product_category_en',
+    'purchase_month',
+]
+
+DELIVERY_STATUSES = ['On Time', 'Late', 'Super Late']
+LATE_STATUSES = ['Late', 'Super Late']
+
+# Categories with a meaningful order rather than alphabetical.
+ORDERED_CATEGORIES = {
+    'delivery_status': DELIVERY_STATUSES,
+}
+
+INTEGER_COLUMNS = {
+    'days_difference': pa.int16(),
+    'review_score': pa.int8(),
+}
+
+# Column layout of the notebook's export (``columns_to_export``).
+MASTER_COLUMNS = [
+    'order_id', 'order_status', 'customer_state', 'customer_city',
+    'order_purchase_timestamp', 'order_estimated_delivery_date',
+    'order_delivered_customer_date', 'days_difference',
+    'delivery_status', 'is_late', 'review_score', 'product_category_en', 'purchase_month',
+]
+
+# Columns app.py actually reads; everything else stays on disk.
+DASHBOARD_COLUMNS = [
+    'order_id', 'customer_state', 'customer_city', 'days_difference', 'delivery_status', 'is_late',
+    'review_score', 'product_category_en', 'purchase_month',
+]
+
+
+def _dictionary_array(name, col):
+    """Dictionary-encode a column with sorted (or already ordered) categories."""
+    if name in ORDERED_CATEGORIES:
+        cat = pd.Categorical(col, categories=ORDERED_CATEGORIES[name], ordered=True)
+    elif isinstance(col.dtype, pd.CategoricalDtype) and col.cat.ordered:
+        cat = col.array
+    else:
+        categories = sorted(col.dropna().unique().tolist())
+        cat = pd.Categorical(col, categories=categories)
+    return pa.array(cat)
+
+
+def to_master_table(df):
+    """Convert a master DataFrame into the typed Arrow table written to disk."""
+    arrays = []
+    for name in df.columns:
+        col = df[name]
+        if name in CATEGORY_COLUMNS:
+            arrays.append(_dictionary_array(name, col))
+        elif name in DATETIME_COLUMNS:
+            arrays.append(pa.array(pd.to_datetime(col), from_pandas=True))
+        elif name in INTEGER_COLUMNS:
+            arrays.append(pa.array(col, type=INTEGER_COLUMNS[name], from_pandas=True))
+        else:
+            arrays.append(pa.array(col, from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def write_master(df, path=MASTER_COLUMNAR):
+    """Write the master table to ``path`` (Feather or Parquet by extension).
+
+    The file is written next to its destination and moved into place so a
+    concurrently starting dashboard never memory-maps a half-written file.
+    """
+    table = to_master_table(df)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        if str(path).endswith(".parquet"):
+            pq.write_table(table, tmp_path)
+        else:
+            # Compression would force a decode on read and defeat memory mapping.
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def read_master_table(path=MASTER_COLUMNAR, columns=None):
+    """Read the columnar master file as an Arrow table, projecting ``columns``.
+
+    ``path`` may also be a directory of Parquet files partitioned Hive-style
+    (``purchase_month=2017-10/...``), as written by ``veridi_auditor.pipeline``.
+    """
+    if os.path.isdir(path):
+        partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+        dataset = ds.dataset(path, format='parquet', partitioning=partitioning)
+        # Each partition sizes its dictionary indices to its own values (int8 in
+        # one month, int16 in a busier one); read them all with int32 indices.
+        schema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type, f.type.ordered))
+                            if pa.types.is_dictionary(f.type) else f for f in dataset.schema])
+        return ds.dataset(path, format='parquet', partitioning=partitioning, schema=schema).to_table(columns=columns)
+    if str(path).endswith(".parquet"):
+        return pq.read_table(path, columns=columns, memory_map=True)
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+def read_master(path=MASTER_COLUMNAR, columns=None):
+    """Read the columnar master file (or partitioned store) into pandas.
+
+    Dictionary columns come back as ``category`` with sorted categories.
+    ``review_score`` comes back as int8 when every order has a review and as
+    float (NaN for missing reviews) otherwise, which is what the CSV path
+    produces too.
+    """
+    df = read_master_table(path, columns=columns).to_pandas()
+    for name in df.columns:
+        col = df[name]
+        # Partitions carry their own dictionaries; unify them in sorted order.
+        if isinstance(col.dtype, pd.CategoricalDtype) and not col.cat.ordered:
+            df[name] = col.cat.reorder_categories(sorted(col.cat.categories))
+    return df
+
+
+def read_master_csv(path=MASTER_CSV, columns=None):
+    """Legacy text path: parse the CSV export and its datetime columns."""
+    df = pd.read_csv(path, usecols=columns)
+    for name in DATETIME_COLUMNS:
+        if name in df.columns:
+            df[name] = pd.to_datetime(df[name])
+    return df
+
+
+def backfill_derived(df):
+    """Add ``is_late`` to master tables exported before it was persisted."""
+    if 'is_late' not in df.columns and 'delivery_status' in df.columns:
+        df.insert(df.columns.get_loc('delivery_status') + 1, 'is_late',
+                  df['delivery_status'].isin(LATE_STATUSES))
+    return df
+
+
+def _column_names(path):
+    if os.path.isdir(path):
+        return MASTER_COLUMNS  # written by the pipeline with the current layout
+    if str(path).endswith(".parquet"):
+        return pq.read_schema(path).names
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def _needs_rewrite(columnar_path, csv_path):
+    """Whether the columnar copy is missing, older than the CSV or outdated."""
+    if not os.path.exists(columnar_path):
+        return True
+    if os.path.exists(csv_path) and os.path.getmtime(columnar_path) < os.path.getmtime(csv_path):
+        return True
+    return not set(MASTER_COLUMNS) <= set(_column_names(columnar_path))
+
+
+def load_master(columns=None, csv_path=MASTER_CSV, columnar_path=MASTER_COLUMNAR):
+    """Load the master dataset, preferring the columnar copy.
+
+    If the columnar file is missing or older than the CSV export, the CSV is
+    parsed once and converted so later cold starts take the fast path; a
+    columnar file from before ``is_late`` was persisted is upgraded the same
+    way. When the conversion cannot be written (e.g. a read-only deploy) the
+    parsed data is still returned. Raises ``FileNotFoundError`` if neither
+    file exists.
+    """
+    if not _needs_rewrite(columnar_path, csv_path):
+        return read_master(columnar_path, columns=columns)
+
+    if os.path.exists(csv_path):
+        df = read_master_csv(csv_path)
+    else:
+        df = read_master(columnar_path)
+    df = backfill_derived(df)
+    try:
+        write_master(df, columnar_path)
+    except OSError:
+        pass
+    else:
+        # Go through the file just written so both paths return identical dtypes.
+        return read_master(columnar_path, columns=columns)
+    return df[columns] if columns is not None else df
@@ -0,0 +1,397 @@
+"""Rolling late-rate metrics over live order events.
+
+The Trends tab's monthly figures come from the batch master table. For
+near-real-time numbers, ``RollingAggregator`` consumes two kinds of JSON
+events, one per line::
+
+    {"event": "order_delivered", "order_id": "...", "customer_state": "SP",
+     "product_category_en": "toys",
+     "order_delivered_customer_date": "2018-03-02 10:11:00",
+     "order_estimated_delivery_date": "2018-03-01 00:00:00"}
+    {"event": "review_created", "order_id": "...", "review_score": 4,
+     "review_creation_date": "2018-03-04 09:00:00"}
+
+Each event is one O(1) update of order, late, super-late, reviewed and
+review-score counters for its day, week and month. The update is applied
+overall, per ``customer_state`` and per ``product_category_en``. Deliveries
+are classified like the batch ETL (``pipeline.classify_delay``) and counted
+in the period they were delivered. Reviews are counted in the period they
+were created, under the state and category of their order.
+
+Memory is bounded on both sides:
+
+- Only the newest ``RETAIN`` periods of each granularity are kept. Events older
+  than the window are counted in ``expired`` and dropped.
+- Only the ``max_orders`` most recently delivered orders are remembered for
+  joining reviews. Reviews of forgotten or unknown orders count overall only.
+
+``snapshot`` reads the current windows without replaying any history, so the
+dashboard can poll it on every refresh. ``StreamMonitor`` feeds a source into an
+aggregator on a background thread. The sources are ``read_events`` (a JSONL
+file, optionally tailed as it grows) and ``socket_events`` (newline-delimited
+JSON over TCP).
+
+    python -m veridi_auditor.stream --events veridi_events.jsonl --by customer_state --last 7
+"""
+
+import argparse
+import heapq
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+
+from veridi_auditor.pipeline import LATE_AFTER_DAYS, SUPER_LATE_AFTER_DAYS
+
+EVENTS_JSONL = 'veridi_events.jsonl'
+
+# Periods kept per granularity.
+RETAIN = {'day': 90, 'week': 52, 'month': 24}
+
+# Delivered orders remembered so later reviews can be attributed to them.
+MAX_ORDERS = 200_000
+
+GROUP_DIMENSIONS = ['customer_state', 'product_category_en']
+
+COUNTERS = ['n_orders', 'n_late', 'n_super_late', 'n_reviewed', 'review_sum']
+
+# Group key of the overall counters.
+ALL = (None, None)
+
+_ORDINAL = {
+    'day': lambda d: d.toordinal(),
+    'week': lambda d: (d.toordinal() - 1) // 7,  # weeks start on Monday
+    'month': lambda d: d.year * 12 + d.month - 1,
+}
+
+_PERIOD_START = {
+    'day': date.fromordinal,
+    'week': lambda o: date.fromordinal(o * 7 + 1),
+    'month': lambda o: date(o // 12, o % 12 + 1, 1),
+}
+
+
+def _day(timestamp):
+    """Calendar day of an ISO timestamp string (time of day ignored)."""
+    return date.fromisoformat(timestamp[:10])
+
+
+class RollingAggregator:
+    """Bounded day/week/month windows of delivery and review counters."""
+
+    def __init__(self, retain=RETAIN, max_orders=MAX_ORDERS,
+                 late_after=LATE_AFTER_DAYS, super_late_after=SUPER_LATE_AFTER_DAYS):
+        self.retain = dict(retain)
+        self.max_orders = max_orders
+        self.late_after = late_after
+        self.super_late_after = super_late_after
+        # granularity -> period ordinal -> group key -> counters
+        self._windows = {g: {} for g in self.retain}
+        self._heaps = {g: [] for g in self.retain}
+        self._newest = dict.fromkeys(self.retain)
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+        self.events = 0
+        self.duplicates = 0
+        self.unmatched_reviews = 0
+        self.ignored = 0
+        self.malformed = 0
+        self.expired = dict.fromkeys(self.retain, 0)
+
+    @property
+    def version(self):
+        """Number of events applied; changes whenever a snapshot could."""
+        return self.events
+
+    def apply(self, event):
+        """Fold one event into the windows.
+
+        Unknown event types are counted in ``ignored``. Anything that is not
+        an event object (``None`` for an unparseable line, see
+        ``read_events``) or lacks a field it needs is counted in
+        ``malformed``; neither stops the feed.
+        """
+        with self._lock:
+            if not isinstance(event, dict):
+                self.malformed += 1
+                return
+            kind = event.get('event')
+            try:
+                if kind == 'order_delivered':
+                    self._delivered(event)
+                elif kind == 'review_created':
+                    self._reviewed(event)
+                else:
+                    self.ignored += 1
+                    return
+            except (KeyError, TypeError, ValueError):
+                self.malformed += 1
+                return
+            self.events += 1
+
+    def consume(self, events, max_events=None):
+        """Apply events from an iterable; returns how many were read."""
+        n = 0
+        for event in events:
+            self.apply(event)
+            n += 1
+            if max_events is not None and n >= max_events:
+                break
+        return n
+
+    def _delivered(self, event):
+        # Every field is read before anything is counted, so a bad event changes nothing.
+        order_id = event['order_id']
+        delivered = _day(event['order_delivered_customer_date'])
+        days = (delivered - _day(event['order_estimated_delivery_date'])).days
+        if order_id in self._orders:
+            self.duplicates += 1
+            return
+        late = days > self.late_after
+        super_late = days > self.super_late_after
+        groups = (ALL, ('customer_state', event.get('customer_state')),
+                  ('product_category_en', event.get('product_category_en')))
+        self._orders[order_id] = groups
+        if len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+        self._add(delivered, groups, 0, 1, late, super_late)
+
+    def _reviewed(self, event):
+        score = event.get('review_score')
+        if score is None:
+            self.ignored += 1
+            return
+        created, score = _day(event['review_creation_date']), float(score)
+        groups = self._orders.get(event.get('order_id'))
+        if groups is None:
+            self.unmatched_reviews += 1
+            groups = (ALL,)
+        self._add(created, groups, 3, 1, score)
+
+    def _add(self, day, groups, first, *deltas):
+        """Add ``deltas`` to counters ``first, first + 1, ...`` of each group."""
+        for granularity, retain in self.retain.items():
+            cells = self._period(granularity, _ORDINAL[granularity](day), retain)
+            if cells is None:
+                self.expired[granularity] += 1
+                continue
+            for key in groups:
+                if key[0] is not None and key[1] is None:
+                    continue
+                counts = cells.get(key)
+                if counts is None:
+                    counts = cells[key] = [0, 0, 0, 0, 0.0]
+                for i, delta in enumerate(deltas, first):
+                    counts[i] += delta
+
+    def _period(self, granularity, ordinal, retain):
+        """Counters of one period, opening it (and evicting old ones) if new."""
+        window = self._windows[granularity]
+        cells = window.get(ordinal)
+        if cells is not None:
+            return cells
+        newest = self._newest[granularity]
+        if newest is not None and ordinal <= newest - retain:
+            return None
+        cells = window[ordinal] = {}
+        heap = self._heaps[granularity]
+        heapq.heappush(heap, ordinal)
+        if newest is None or ordinal > newest:
+            self._newest[granularity] = ordinal
+            while heap[0] <= ordinal - retain:
+                del window[heapq.heappop(heap)]
+        return cells
+
+    def snapshot(self, granularity='day', by=None, last=None):
+        """Rates per period (and per ``by`` value), oldest period first.
+
+        ``by`` is None for the overall numbers or one of ``GROUP_DIMENSIONS``;
+        ``last`` keeps only the newest ``last`` periods. Rates are percentages
+        of delivered orders and are NaN for periods with reviews but no
+        deliveries.
+        """
+        with self._lock:
+            window = self._windows[granularity]
+            ordinals = sorted(window)[-last:] if last else sorted(window)
+            rows = [(ordinal, value, *counts)
+                    for ordinal in ordinals
+                    for (dim, value), counts in window[ordinal].items() if dim == by]
+        snap = pd.DataFrame(rows, columns=['ordinal', 'group', *COUNTERS])
+        orders = snap['n_orders'].where(snap['n_orders'] > 0)
+        snap = pd.DataFrame({
+            'period': pd.to_datetime([_PERIOD_START[granularity](o) for o in snap['ordinal']]),
+            by or 'group': snap['group'],
+            'n_orders': snap['n_orders'],
+            'late_rate': snap['n_late'] / orders * 100,
+            'super_late_rate': snap['n_super_late'] / orders * 100,
+            'avg_review': snap['review_sum'] / snap['n_reviewed'].where(snap['n_reviewed'] > 0),
+            'n_reviewed': snap['n_reviewed'],
+        })
+        if by is None:
+            snap = snap.drop(columns='group')
+        return snap.sort_values([c for c in ('period', by) if c]).reset_index(drop=True)
+
+    def stats(self):
+        """Event counters and the periods currently held per granularity."""
+        with self._lock:
+            return {'events': self.events, 'duplicates': self.duplicates,
+                    'unmatched_reviews': self.unmatched_reviews, 'ignored': self.ignored,
+                    'malformed': self.malformed,
+                    'expired': dict(self.expired), 'orders_remembered': len(self._orders),
+                    'periods': {g: len(w) for g, w in self._windows.items()}}
+
+
+# --- Sources -----------------------------------------------------------------
+
+def _parse(line):
+    """The JSON value of one line, or None when it is not valid JSON."""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def read_events(path, follow=False, stop=None, poll_interval=0.5):
+    """Events from a JSONL file; with ``follow``, keep reading lines appended to it.
+
+    A trailing line without a newline is only parsed once it is complete
+    (or, when not following, at end of file). A line that is not valid JSON
+    comes out as None, which ``RollingAggregator.apply`` counts as
+    malformed. ``stop`` is a ``threading.Event`` that ends a followed read.
+    """
+    pending = ''
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if not pending.endswith('\n'):
+                    continue
+                if pending.strip():
+                    yield _parse(pending)
+                pending = ''
+                continue
+            if not follow or (stop is not None and stop.is_set()):
+                if pending.strip() and not follow:
+                    yield _parse(pending)
+                return
+            time.sleep(poll_interval)
+
+
+def socket_events(address, stop=None, poll_interval=0.5):
+    """Events sent as newline-delimited JSON by the server at ``(host, port)`` (None for bad lines)."""
+    with socket.create_connection(address) as sock:
+        sock.settimeout(poll_interval)
+        buffer = b''
+        while stop is None or not stop.is_set():
+            try:
+                chunk = sock.recv(1 << 16)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            lines = (buffer + chunk).split(b'\n')
+            buffer = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield _parse(line)
+        if buffer.strip():
+            yield _parse(buffer)
+
+
+def write_events(events, path, mode='a'):
+    """Append events to a JSONL file (what a producer feeding ``read_events`` does)."""
+    with open(path, mode) as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+class StreamMonitor:
+    """Feeds an event source into a ``RollingAggregator`` on a daemon thread.
+
+    ``source`` is called with the monitor's stop ``threading.Event`` and
+    returns an iterable of events. Bad lines and events are counted by the
+    aggregator and skipped. If the source itself raises, the error is kept in
+    ``error`` and the thread ends; the aggregator keeps what it has.
+    """
+
+    def __init__(self, source, aggregator=None):
+        self.aggregator = aggregator or RollingAggregator()
+        self._source = source
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    @classmethod
+    def tail(cls, path, aggregator=None, poll_interval=0.5):
+        """Monitor following a JSONL event file."""
+        return cls(lambda stop: read_events(path, follow=True, stop=stop, poll_interval=poll_interval),
+                   aggregator)
+
+    @classmethod
+    def connect(cls, address, aggregator=None, poll_interval=0.5):
+        """Monitor reading a newline-delimited JSON socket."""
+        return cls(lambda stop: socket_events(address, stop=stop, poll_interval=poll_interval), aggregator)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='veridi-stream', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for event in self._source(self._stop):
+                if self._stop.is_set():
+                    break
+                self.aggregator.apply(event)
+        except Exception as exc:  # reported through ``error``
+            self.error = exc
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling late-rate metrics over order events.")
+    parser.add_argument('--events', default=EVENTS_JSONL, help='JSONL event file (default: %(default)s)')
+    parser.add_argument('--follow', action='store_true', help='keep reading events appended to the file')
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='seconds between printed snapshots with --follow (default: %(default)s)')
+    parser.add_argument('--granularity', choices=list(RETAIN), default='day')
+    parser.add_argument('--by', choices=GROUP_DIMENSIONS, help='break the numbers down by this dimension')
+    parser.add_argument('--last', type=int, default=7, help='periods to print (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    def show(aggregator):
+        print(aggregator.snapshot(args.granularity, by=args.by, last=args.last).to_string(index=False))
+        print(aggregator.stats())
+
+    if not args.follow:
+        aggregator = RollingAggregator()
+        aggregator.consume(read_events(args.events))
+        show(aggregator)
+        return
+
+    monitor = StreamMonitor.tail(args.events).start()
+    try:
+        while monitor.running:
+            time.sleep(args.interval)
+            show(monitor.aggregator)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop(timeout=1)
+
+
+if __name__ == '__main__':
+    main()
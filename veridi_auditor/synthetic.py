@@ -0,0 +1,377 @@
+"""Synthetic, Olist-shaped data for benchmarks.
+
+The real Olist export has a single fixed size (~96k delivered orders), which is
+not enough to see how the dashboard scales. ``make_master`` produces a table
+with the same columns as ``veridi_master_clean.csv`` and roughly the same
+skew: SP-heavy state mix, a long tail of categories, ~93% on-time deliveries
+and review scores that fall off with delay. ``make_sources`` derives the six
+raw Olist tables the notebook reads from such a master table, so the ETL can be
+exercised at any scale. ``write_sources`` writes those tables as the Olist
+CSVs chunk by chunk, so sources for tens of millions of orders never have to
+fit in memory at once:
+
+    python -m veridi_auditor.synthetic --orders 10000000 --sources data/
+    python -m veridi_auditor.synthetic --orders 1000000 --master veridi_master_clean.feather
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from veridi_auditor.storage import write_master
+
+# Approximate share of Olist customers per state.
+STATE_WEIGHTS = {
+    'SP': 41.9, 'RJ': 12.9, 'MG': 11.7, 'RS': 5.5, 'PR': 5.1, 'SC': 3.7,
+    'BA': 3.4, 'DF': 2.2, 'ES': 2.0, 'GO': 2.0, 'PE': 1.7, 'CE': 1.3,
+    'PA': 1.0, 'MT': 0.9, 'MA': 0.8, 'MS': 0.7, 'PB': 0.5, 'PI': 0.5,
+    'RN': 0.5, 'AL': 0.4, 'SE': 0.3, 'TO': 0.3, 'RO': 0.3, 'AM': 0.15,
+    'AC': 0.08, 'AP': 0.07, 'RR': 0.05,
+}
+
+# Olist English category names, most popular first.
+CATEGORIES = [
+    'bed_bath_table', 'health_beauty', 'sports_leisure', 'furniture_decor',
+    'computers_accessories', 'housewares', 'watches_gifts', 'telephony',
+    'garden_tools', 'auto', 'toys', 'cool_stuff', 'perfumery', 'baby',
+    'electronics', 'stationery', 'fashion_bags_accessories', 'pet_shop',
+    'office_furniture', 'consoles_games', 'luggage_accessories',
+    'construction_tools_construction', 'home_appliances', 'musical_instruments',
+    'small_appliances', 'home_construction', 'books_general_interest', 'food',
+    'furniture_living_room', 'home_confort', 'drinks', 'audio',
+    'market_place', 'construction_tools_lights', 'air_conditioning',
+    'kitchen_dining_laundry_garden_furniture', 'food_drink',
+    'industry_commerce_and_business', 'books_technical', 'fixed_telephony',
+    'costruction_tools_garden', 'art', 'home_appliances_2',
+    'agro_industry_and_commerce', 'computers', 'signaling_and_security',
+    'construction_tools_safety', 'christmas_supplies', 'fashion_shoes',
+    'fashion_male_clothing', 'furniture_bedroom', 'costruction_tools_tools',
+    'tablets_printing_image', 'dvds_blu_ray', 'small_appliances_home_oven_and_coffee',
+    'cine_photo', 'music', 'fashion_underwear_beach', 'party_supplies',
+    'furniture_mattress_and_upholstery', 'fashion_sport', 'flowers',
+    'arts_and_craftmanship', 'diapers_and_hygiene', 'la_cuisine',
+    'books_imported', 'cds_dvds_musicals', 'fashion_childrens_clothes',
+    'home_comfort_2', 'security_and_services',
+]
+
+CITIES_PER_STATE = 200
+# The catalogue grows with the order count up to this many products (Olist
+# has ~33k products for ~99k orders; a 50M-order catalogue need not be 17M).
+MAX_PRODUCTS = 2_000_000
+FIRST_MONTH = pd.Timestamp('2016-09-01')
+N_MONTHS = 24
+
+_HEX = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def _hex_ids(rng, n):
+    """Random 32-character hex ids, like Olist's ``order_id``."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    chars = np.empty((n, 32), dtype=np.uint8)
+    chars[:, 0::2] = _HEX[raw >> 4]
+    chars[:, 1::2] = _HEX[raw & 0x0F]
+    return chars.view('S32').ravel().astype(str)
+
+
+def _zipf_choice(rng, n, k, a=1.1):
+    """Indices in ``[0, k)`` with a long-tailed (Zipf-like) distribution."""
+    weights = 1.0 / np.arange(1, k + 1) ** a
+    return rng.choice(k, size=n, p=weights / weights.sum())
+
+
+def make_master(n_orders, seed=0):
+    """Build a synthetic master table with ``n_orders`` delivered orders."""
+    rng = np.random.default_rng(seed)
+
+    states = np.array(list(STATE_WEIGHTS))
+    weights = np.array(list(STATE_WEIGHTS.values()))
+    state_idx = rng.choice(len(states), size=n_orders, p=weights / weights.sum())
+    city_idx = _zipf_choice(rng, n_orders, CITIES_PER_STATE)
+    customer_city = pd.Series(np.char.add(
+        np.char.add(np.char.lower(states[state_idx]), '_city_'),
+        city_idx.astype(str),
+    ))
+
+    # Order volume grows over the two years, as it did on Olist.
+    month_weights = np.linspace(0.2, 1.0, N_MONTHS)
+    month = rng.choice(N_MONTHS, size=n_orders, p=month_weights / month_weights.sum())
+    purchase = (FIRST_MONTH
+                + pd.to_timedelta(month * 30 + rng.integers(0, 30, n_orders), unit='D')
+                + pd.to_timedelta(rng.integers(0, 86_400, n_orders), unit='s'))
+    purchase = pd.DatetimeIndex(purchase)
+    estimated = purchase.floor('D') + pd.to_timedelta(rng.integers(10, 40, n_orders), unit='D')
+
+    # Mostly early deliveries with a fat late tail (~3% late, ~4% super late).
+    days_difference = np.rint(rng.normal(-12, 7, n_orders)).astype(np.int64)
+    late = rng.random(n_orders)
+    days_difference[late < 0.029] = rng.integers(1, 6, int((late < 0.029).sum()))
+    super_late = (late >= 0.029) & (late < 0.068)
+    days_difference[super_late] = 5 + rng.geometric(0.08, int(super_late.sum()))
+    delivered = (estimated + pd.to_timedelta(days_difference, unit='D')
+                 + pd.to_timedelta(rng.integers(0, 86_400, n_orders), unit='s'))
+
+    delivery_status = np.where(days_difference <= 0, 'On Time',
+                               np.where(days_difference <= 5, 'Late', 'Super Late'))
+
+    # Review scores: mostly 5 when on time, sliding towards 1 with delay.
+    base = np.select([days_difference <= 0, days_difference <= 5], [4.3, 3.0], 1.7)
+    review_score = np.clip(np.rint(base + rng.normal(0, 1.1, n_orders)), 1, 5)
+    review_score[rng.random(n_orders) < 0.008] = np.nan
+
+    category = np.array(CATEGORIES, dtype=object)[_zipf_choice(rng, n_orders, len(CATEGORIES))]
+    category[rng.random(n_orders) < 0.015] = None
+
+    return pd.DataFrame({
+        'order_id': _hex_ids(rng, n_orders),
+        'order_status': 'delivered',
+        'customer_state': states[state_idx],
+        'customer_city': customer_city,
+        'order_purchase_timestamp': purchase,
+        'order_estimated_delivery_date': estimated,
+        'order_delivered_customer_date': delivered,
+        'days_difference': days_difference,
+        'delivery_status': delivery_status,
+        'is_late': days_difference > 0,
+        'review_score': review_score,
+        'product_category_en': category,
+        'purchase_month': purchase.to_period('M').astype(str),
+    })
+
+
+# Portuguese source names for the most common categories; the rest get a
+# ``<english>_pt`` stand-in. Two Portuguese names have no English translation,
+# as in the real translation table.
+PORTUGUESE_NAMES = {
+    'bed_bath_table': 'cama_mesa_banho', 'health_beauty': 'beleza_saude',
+    'sports_leisure': 'esporte_lazer', 'furniture_decor': 'moveis_decoracao',
+    'computers_accessories': 'informatica_acessorios', 'housewares': 'utilidades_domesticas',
+    'watches_gifts': 'relogios_presentes', 'telephony': 'telefonia',
+    'garden_tools': 'ferramentas_jardim', 'auto': 'automotivo', 'toys': 'brinquedos',
+    'cool_stuff': 'cool_stuff', 'perfumery': 'perfumaria', 'baby': 'bebes',
+    'electronics': 'eletronicos', 'stationery': 'papelaria',
+}
+UNTRANSLATED = ['pc_gamer', 'portateis_cozinha_e_preparadores_de_alimentos']
+
+OTHER_STATUSES = ['shipped', 'canceled', 'unavailable', 'invoiced', 'processing']
+
+
+def _portuguese(category):
+    return PORTUGUESE_NAMES.get(category, f'{category}_pt')
+
+
+def make_products(n_products, seed=0):
+    """The product table: long-tailed categories, ~2% of products uncategorised."""
+    rng = np.random.default_rng([seed, 3])
+    product_cat = np.array([_portuguese(c) for c in CATEGORIES] + UNTRANSLATED, dtype=object)[
+        _zipf_choice(rng, n_products, len(CATEGORIES) + len(UNTRANSLATED))]
+    product_cat[rng.random(n_products) < 0.019] = None
+    return pd.DataFrame({
+        'product_id': _hex_ids(rng, n_products),
+        'product_category_name': product_cat,
+        'product_weight_g': rng.integers(50, 30_000, n_products),
+    })
+
+
+def n_products_for(n_orders):
+    return min(max(1_000, n_orders // 3), MAX_PRODUCTS)
+
+
+def make_sources(n_orders, seed=0, products=None):
+    """Build the six raw Olist tables the notebook reads, for ``n_orders`` orders.
+
+    Shapes follow the real export: ~97% of orders delivered, one customer row
+    per order, ~10% multi-item orders, ~1% of orders without a review and a
+    few with several, and ~2% of products without a category. Items are drawn
+    from ``products`` when given (``write_sources`` shares one catalogue
+    across chunks), else from a catalogue sized by ``n_products_for``.
+    """
+    rng = np.random.default_rng([seed, 1])  # independent of make_master's stream
+    master = make_master(n_orders, seed=seed)
+    order_id = master['order_id'].to_numpy()
+
+    # Customers: Olist issues one customer_id per order.
+    customer_id = _hex_ids(rng, n_orders)
+    customers = pd.DataFrame({
+        'customer_id': customer_id,
+        'customer_unique_id': _hex_ids(rng, n_orders),
+        'customer_zip_code_prefix': rng.integers(1000, 99999, n_orders),
+        'customer_city': master['customer_city'],
+        'customer_state': master['customer_state'],
+    })
+
+    # Orders: a small share never reaches the customer.
+    purchase = master['order_purchase_timestamp']
+    approved = purchase + pd.to_timedelta(rng.integers(600, 86_400, n_orders), unit='s')
+    delivered = master['order_delivered_customer_date'].copy()
+    carrier = (approved + (delivered - approved) * rng.uniform(0.1, 0.5, n_orders)).dt.floor('s')
+    status = np.full(n_orders, 'delivered', dtype=object)
+    undelivered = rng.random(n_orders) < 0.03
+    status[undelivered] = rng.choice(OTHER_STATUSES, int(undelivered.sum()))
+    delivered[undelivered] = pd.NaT
+    carrier[undelivered & (status != 'shipped')] = pd.NaT
+    orders = pd.DataFrame({
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'order_status': status,
+        'order_purchase_timestamp': purchase,
+        'order_approved_at': approved,
+        'order_delivered_carrier_date': carrier,
+        'order_delivered_customer_date': delivered,
+        'order_estimated_delivery_date': master['order_estimated_delivery_date'],
+    })
+
+    if products is None:
+        products = make_products(n_products_for(n_orders), seed=seed)
+    product_id = products['product_id'].to_numpy()
+    n_products = len(product_id)
+    translation = pd.DataFrame({
+        'product_category_name': [_portuguese(c) for c in CATEGORIES],
+        'product_category_name_english': CATEGORIES,
+    })
+
+    # Items: ~10% of orders have 2-4 items; popular products sell more.
+    n_items = 1 + (rng.random(n_orders) < 0.10) * rng.integers(1, 4, n_orders)
+    item_order = np.repeat(np.arange(n_orders), n_items)
+    item_seq = np.arange(len(item_order)) - np.repeat(np.cumsum(n_items) - n_items, n_items) + 1
+    items = pd.DataFrame({
+        'order_id': order_id[item_order],
+        'order_item_id': item_seq,
+        'product_id': product_id[_zipf_choice(rng, len(item_order), n_products, a=0.9)],
+        'seller_id': _hex_ids(rng, len(item_order)),
+        'shipping_limit_date': approved.to_numpy()[item_order] + np.timedelta64(6, 'D'),
+        'price': np.round(rng.lognormal(4.3, 0.9, len(item_order)), 2),
+        'freight_value': np.round(rng.lognormal(2.8, 0.5, len(item_order)), 2),
+    })
+
+    # Reviews: written after delivery (or the estimate); ~1% of orders have none
+    # and ~1% have an older second review that the dedup must discard.
+    score = master['review_score'].fillna(5).astype(int).to_numpy()
+    reviewed = rng.random(n_orders) >= 0.01
+    anchor = delivered.fillna(master['order_estimated_delivery_date']).dt.floor('D')
+    created = anchor + pd.to_timedelta(rng.integers(0, 10, n_orders), unit='D')
+    extra = reviewed & (rng.random(n_orders) < 0.01)
+    review_order = np.r_[np.flatnonzero(reviewed), np.flatnonzero(extra)]
+    review_created = np.r_[created.to_numpy()[reviewed],
+                           created.to_numpy()[extra] - np.timedelta64(3, 'D')]
+    review_score = np.r_[score[reviewed], rng.integers(1, 6, int(extra.sum()))]
+    review_created = pd.DatetimeIndex(review_created)
+    reviews = pd.DataFrame({
+        'review_id': _hex_ids(rng, len(review_order)),
+        'order_id': order_id[review_order],
+        'review_score': review_score,
+        'review_comment_title': None,
+        'review_comment_message': None,
+        'review_creation_date': review_created,
+        'review_answer_timestamp': review_created + pd.to_timedelta(
+            rng.integers(3_600, 5 * 86_400, len(review_order)), unit='s'),
+    }).sort_values('review_creation_date', kind='stable').reset_index(drop=True)
+
+    return {
+        'orders': orders,
+        'customers': customers,
+        'reviews': reviews,
+        'items': items,
+        'products': products,
+        'translation': translation,
+    }
+
+
+def _iso(timestamps):
+    return np.datetime_as_string(pd.DatetimeIndex(timestamps).to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+
+
+def make_events(n_orders, seed=0):
+    """Order-delivered and review-created events (see ``veridi_auditor.stream``).
+
+    One delivery per order of ``make_master(n_orders, seed)`` and, for each
+    reviewed order, a review 0-5 days later, all in event-time order.
+    """
+    rng = np.random.default_rng([seed, 2])
+    master = make_master(n_orders, seed=seed)
+    delivered = master['order_delivered_customer_date']
+    reviewed = master['review_score'].notna().to_numpy()
+    review_at = delivered[reviewed] + pd.to_timedelta(rng.integers(0, 5 * 86_400, int(reviewed.sum())), unit='s')
+
+    order_id = master['order_id'].tolist()
+    states = master['customer_state'].tolist()
+    categories = [c if isinstance(c, str) else None for c in master['product_category_en'].tolist()]
+    scores = master['review_score'].tolist()
+    deliveries = [
+        {'event': 'order_delivered', 'order_id': oid, 'customer_state': state,
+         'product_category_en': cat, 'order_delivered_customer_date': at,
+         'order_estimated_delivery_date': estimate}
+        for oid, state, cat, at, estimate in zip(
+            order_id, states, categories, _iso(delivered),
+            _iso(master['order_estimated_delivery_date']))
+    ]
+    reviews = [
+        {'event': 'review_created', 'order_id': order_id[i], 'review_score': int(scores[i]),
+         'review_creation_date': at}
+        for i, at in zip(np.flatnonzero(reviewed).tolist(), _iso(review_at))
+    ]
+    times = np.r_[delivered.to_numpy(), review_at.to_numpy()]
+    events = deliveries + reviews
+    return [events[i] for i in np.argsort(times, kind='stable')]
+
+
+# --- Writing sources ---------------------------------------------------------
+
+SOURCE_FILES = {
+    'orders': 'olist_orders_dataset.csv',
+    'reviews': 'olist_order_reviews_dataset.csv',
+    'items': 'olist_order_items_dataset.csv',
+    'customers': 'olist_customers_dataset.csv',
+    'products': 'olist_products_dataset.csv',
+    'translation': 'product_category_name_translation.csv',
+}
+CHUNK_ORDERS = 1_000_000
+
+
+def _chunk_seed(seed, chunk):
+    return int(np.random.SeedSequence([seed, chunk]).generate_state(1)[0])
+
+
+def write_sources(source_dir, n_orders, seed=0, chunk_orders=CHUNK_ORDERS):
+    """Write the six Olist CSVs for ``n_orders`` orders into ``source_dir``.
+
+    Orders, customers, items and reviews are generated and appended
+    ``chunk_orders`` at a time against one shared product catalogue, so peak
+    memory depends on the chunk size, not on ``n_orders``. The output is
+    reproducible for a given ``seed`` and ``chunk_orders``. Returns the paths
+    by table name.
+    """
+    os.makedirs(source_dir, exist_ok=True)
+    paths = {name: os.path.join(source_dir, filename) for name, filename in SOURCE_FILES.items()}
+    products = make_products(n_products_for(n_orders), seed=seed)
+    products.to_csv(paths['products'], index=False)
+    for chunk, start in enumerate(range(0, n_orders, chunk_orders)):
+        tables = make_sources(min(chunk_orders, n_orders - start), seed=_chunk_seed(seed, chunk), products=products)
+        if chunk == 0:
+            tables['translation'].to_csv(paths['translation'], index=False)
+        for name in ('orders', 'customers', 'items', 'reviews'):
+            tables[name].to_csv(paths[name], index=False, mode='w' if chunk == 0 else 'a', header=chunk == 0)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Olist-shaped data.")
+    parser.add_argument('--orders', type=int, required=True, help='number of orders to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sources', help='directory to write the six raw Olist CSVs to')
+    parser.add_argument('--chunk-orders', type=int, default=CHUNK_ORDERS,
+                        help='orders generated per chunk of --sources (default: %(default)s)')
+    parser.add_argument('--master', help='columnar master file to write (.feather or .parquet; built in memory)')
+    args = parser.parse_args(argv)
+    if not args.sources and not args.master:
+        parser.error("give --sources and/or --master")
+
+    if args.sources:
+        write_sources(args.sources, args.orders, seed=args.seed, chunk_orders=args.chunk_orders)
+    if args.master:
+        write_master(make_master(args.orders, seed=args.seed), args.master)
+
+
+if __name__ == '__main__':
+    main()
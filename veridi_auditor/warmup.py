@@ -0,0 +1,191 @@
+"""Background warm-up of the figure cache for likely filter combinations.
+
+After a deploy or a data refresh, the first sessions paid to build every
+figure of every tab. ``Warmer`` builds those figures ahead of time on a small
+thread pool. It starts with the default sidebar state, then does each single
+state, each single delivery status and each of the busiest categories, with
+the other filters left at their defaults. The figures go into the
+dashboard's own ``FigureCache`` under the keys app.py looks up
+(``figures.figure_key``). The next rerun with any of those filters is then a
+hit.
+
+``Warmer.ensure(engine)`` is cheap and meant to be called on every rerun. It
+starts a pass the first time it sees the engine's dataset version. When the
+version changes, it abandons the pass in progress and starts a new one.
+Passes build the exact query mode with each figure's default parameters.
+The work runs in the pool's threads, so serving never waits for it. The
+builds still share the GIL with reruns, so the default is one worker.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from veridi_auditor.figures import DEFAULT_PARAMS, FIGURES, build_figure, figure_key
+from veridi_auditor.profiling import PROFILER
+
+DEFAULT_CATEGORIES = 20
+TOP_CATEGORIES = 10
+WORKERS = 1
+
+# Every figure, with the parameters the dashboard first shows it with. The
+# city drill-down depends on the state opened in it and is cheap on demand.
+WARM_FIGURES = {name: DEFAULT_PARAMS.get(name, {}) for name in FIGURES if name != 'city_late_rate'}
+
+
+def default_filters(engine):
+    """The sidebar's initial selection: every state and status, the first categories."""
+    return {'states': engine.options('customer_state'),
+            'statuses': engine.options('delivery_status'),
+            'categories': engine.options('product_category_en')[:DEFAULT_CATEGORIES]}
+
+
+def combinations(engine, single_states=True, single_statuses=True, top_categories=TOP_CATEGORIES, extra=()):
+    """Labelled filter selections to warm, most likely first.
+
+    The default selection comes first. Each of the others starts from the
+    defaults and narrows one filter: to every single state, every single
+    status, and each of the ``top_categories`` categories with the most
+    orders. ``extra`` holds further ``(label, selection)`` pairs; filters a
+    selection leaves out keep their defaults.
+    """
+    default = default_filters(engine)
+    selections = [('default', default)]
+    if single_states:
+        selections += [(f'state={s}', {**default, 'states': [s]}) for s in default['states']]
+    if single_statuses:
+        selections += [(f'status={s}', {**default, 'statuses': [s]}) for s in default['statuses']]
+    if top_categories:
+        categories = engine.options('product_category_en')
+        volume = engine.select().category_late_rates(top_n=len(categories), min_orders=0)
+        busiest = volume.nlargest(top_categories, 'total_orders')['product_category_en']
+        selections += [(f'category={c}', {**default, 'categories': [c]}) for c in busiest]
+    selections += [(label, {**default, **selection}) for label, selection in extra]
+    return selections
+
+
+class Warmer:
+    """Fills ``figure_cache`` for each dataset version it is shown.
+
+    ``figures`` maps the figure names to warm to their build parameters
+    (default: ``WARM_FIGURES``). The other keyword arguments go to
+    ``combinations``.
+    """
+
+    def __init__(self, figure_cache, figures=None, workers=WORKERS, **options):
+        self.figure_cache = figure_cache
+        self.figures = dict(WARM_FIGURES if figures is None else figures)
+        self.options = options
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmup')
+        self._lock = threading.Lock()
+        self._pass = None
+
+    def ensure(self, engine):
+        """Start a pass over ``engine`` unless its version is already warm or warming.
+
+        Returns whether a pass was started. Never waits for the work.
+        """
+        version = engine.version
+        with self._lock:
+            if self._pass is not None and self._pass['version'] == version:
+                return False
+            self._pass = state = {'version': version, 'started': time.time(), 'total': None, 'done': 0,
+                                  'built': 0, 'seconds': None, 'errors': [], 'timings': [],
+                                  '_start': time.perf_counter(), '_finished': threading.Event()}
+        self._pool.submit(self._plan, engine, state)
+        return True
+
+    def _current(self, state):
+        return self._pass is state
+
+    def _finish(self, state):
+        state['seconds'] = time.perf_counter() - state['_start']
+        state['_finished'].set()
+
+    def _plan(self, engine, state):
+        try:
+            with PROFILER.stage('warmup_plan'):
+                selections = combinations(engine, **self.options)
+        except Exception as exc:  # keep serving; the error shows in progress()
+            with self._lock:
+                state['errors'].append(f'planning: {exc}')
+                state['total'] = 0
+                self._finish(state)
+            return
+        with self._lock:
+            state['total'] = len(selections)
+            if not selections:
+                self._finish(state)
+        for label, selection in selections:
+            self._pool.submit(self._warm, engine, state, label, selection)
+
+    def _warm(self, engine, state, label, selection):
+        if not self._current(state):  # superseded by a newer dataset version
+            return
+        start = time.perf_counter()
+        built, error = 0, None
+        try:
+            with PROFILER.stage('warmup') as stats:
+                audit = engine.select(**selection)
+                stats['rows'] = audit.scanned
+                if not audit.empty:  # the dashboard stops before any chart
+                    for name, params in self.figures.items():
+                        key = figure_key(name, state['version'], **selection, **params)
+
+                        def build():
+                            with PROFILER.stage(f'figure:{name}'):
+                                return build_figure(name, audit, **params)
+                        built += self.figure_cache.prime(key, build)
+        except Exception as exc:  # one failed combination does not stop the pass
+            error = f'{label}: {exc}'
+        seconds = time.perf_counter() - start
+        with self._lock:
+            state['done'] += 1
+            state['built'] += built
+            state['timings'].append({'selection': label, 'seconds': seconds, 'figures': built})
+            if error is not None:
+                state['errors'].append(error)
+            if state['done'] == state['total']:
+                self._finish(state)
+
+    def progress(self):
+        """The latest pass: combinations done of ``total``, figures built, seconds so far.
+
+        ``total`` is None while the combinations are still being listed;
+        ``None`` is returned before the first pass.
+        """
+        with self._lock:
+            state = self._pass
+            if state is None:
+                return None
+            running = state['seconds'] is None
+            return {
+                'version': state['version'],
+                'started': state['started'],
+                'running': running,
+                'total': state['total'],
+                'done': state['done'],
+                'built': state['built'],
+                'seconds': time.perf_counter() - state['_start'] if running else state['seconds'],
+                'errors': list(state['errors']),
+            }
+
+    def timings(self):
+        """Seconds and figures built per combination of the latest pass, in completion order."""
+        with self._lock:
+            rows = list(self._pass['timings']) if self._pass is not None else []
+        return pd.DataFrame(rows, columns=['selection', 'seconds', 'figures'])
+
+    def wait(self, timeout=None):
+        """Block until the latest pass finishes; False on timeout."""
+        with self._lock:
+            state = self._pass
+        return state is None or state['_finished'].wait(timeout)
+
+    def shutdown(self):
+        """Abandon the current pass and stop the worker threads."""
+        with self._lock:
+            self._pass = None
+        self._pool.shutdown(wait=False, cancel_futures=True)